@@ -1,15 +1,131 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
 import csv
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import http_cache
+from player_parser import BACKENDS, DEFAULT_BACKEND, parse_profile
+
+# ====== 設定 ======
+BASE_URL = "https://baseball.yahoo.co.jp"   # スタブサーバで試すときは --base-url で差し替え
+START_ID, END_ID = 980000, 2500000
+MAX_WORKERS = 8          # 同時リクエスト数
+RATE_PER_HOST = 5.0      # 1ホストあたりの毎秒リクエスト数（トークン補充速度）
+BURST = 10               # トークンバケットの容量
+MAX_RETRIES = 3          # 429/5xx・通信エラー時の再試行回数
+BACKOFF_BASE = 1.0       # 再試行の待ち時間（秒）: BACKOFF_BASE * 2**n + ゆらぎ
+RETRY_STATUS = {429, 500, 502, 503, 504}
+TIMEOUT = 10
+PARSER_BACKEND = DEFAULT_BACKEND  # "stream" / "lxml" / "selectolax" / "bs4"（player_parser.py）
+OUTPUT_CSV = "players_data.csv"
+CHECKPOINT_FILE = Path("players_checkpoint.json")
+CSV_BATCH = 100          # この行数ごとに CSV を flush
+CHECKPOINT_EVERY = 1000  # この ID 数ごとにチェックポイントを保存
+ID_INDEX_FILE = Path("player_ids.json")  # 見つかった有効 ID と調査済み区間
+PROBE_STRIDE = 500       # 帯域探索の試し打ち間隔
+BAND_RADIUS = 50         # 当たりの前後を密に調べる幅
+# ===================
+
+# Yahoo! のチーム ID（巨人, ヤクルト, DeNA, 中日, 阪神, 広島, 西武, 日本ハム, ロッテ, オリックス, ソフトバンク, 楽天）
+YAHOO_TEAM_IDS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 11, 12, 376]
+ROSTER_KINDS = ["p", "b"]  # 投手 / 野手
+PLAYER_LINK = re.compile(r"/npb/player/(\d+)/")
+
+HEADER = [
+    "Player ID", "Name", "Name (Kana)", "Position", "Uniform Number", "Birth Place", "Born Date",
+    "Height", "Weight", "Blood Type", "Pitching", "Batting", "Draft Year", "Draft Rank",
+    "Pro Year", "Career", "Koshien Flag", "Major Title"
+]
+
+class TokenBucket:
+    """毎秒 rate 個補充・最大 capacity 個のトークンバケット（スレッドセーフ）"""
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class HostRateLimiter:
+    """ホストごとに TokenBucket を持つレート制限"""
+    def __init__(self, rate: float = RATE_PER_HOST, capacity: int = BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets: dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
 
-def get_player_details(soup):
+    def acquire(self, url: str):
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        bucket.acquire()
+
+def make_session(pool_size: int = MAX_WORKERS) -> requests.Session:
+    """keep-alive の接続をワーカー数ぶんプールするセッション"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_with_retry(session, url, limiter=None, retries=MAX_RETRIES):
+    """
+    http_cache 経由で GET（キャッシュが新しければ通信しない）。実際に通信するときだけ
+    レート制限を守り、429/5xx と通信エラーは指数バックオフで再試行
+    """
+    before_request = (lambda: limiter.acquire(url)) if limiter else None
+    for attempt in range(retries + 1):
+        try:
+            res = http_cache.get(url, session=session, before_request=before_request, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(BACKOFF_BASE * 2 ** attempt + random.uniform(0, BACKOFF_BASE))
+            continue
+        if res.status_code in RETRY_STATUS and attempt < retries:
+            retry_after = res.headers.get("Retry-After", "")
+            wait = float(retry_after) if retry_after.isdigit() else BACKOFF_BASE * 2 ** attempt
+            time.sleep(wait + random.uniform(0, BACKOFF_BASE))
+            continue
+        res.raise_for_status()
+        return res
+
+def get_player_details(profile):
+    """player_parser.parse_profile の結果を CSV の17項目に整形する"""
     try:
-        p_name = soup.select_one("h1:nth-child(4)").text if soup.select_one("h1:nth-child(4)") else ""
-        p_name_kana = soup.select_one("rt").text.replace("（", "").replace("）", "").replace("'", "''") if soup.select_one("rt") else p_name
-        p_position = soup.select_one(".bb-profile__position").text
-        p_uni_number = soup.select_one(".bb-profile__number").text
+        p_name = profile["name"]
+        p_name_kana = profile["kana"].replace("（", "").replace("）", "").replace("'", "''") if profile["kana"] else p_name
+        p_position = profile["position"]
+        p_uni_number = profile["number"]
 
-        others = [item.text for item in soup.select(".bb-profile__text")]
+        others = profile["texts"]
 
         birth_place, born_date, height, weight, blood_type, pitch_bat = others[:6]
         pitching = pitch_bat[0]
@@ -19,7 +135,7 @@ def get_player_details(soup):
         height = height.replace("cm", "")
         weight = weight.replace("kg", "")
 
-        profile_titles = [item.text for item in soup.select(".bb-profile__title")]
+        profile_titles = profile["titles"]
 
         draft_year, draft_rank, pro_year, career_, major_title = "", "", "", "", ""
         if len(profile_titles) == 10:
@@ -48,44 +164,283 @@ def get_player_details(soup):
         print(f"Error extracting player details: {e}")
         return ["" for _ in range(17)]  # Return empty strings for each field on failure
 
-def get_player_data(player_id):
+def get_player_data(player_id, session=None, limiter=None, base_url=BASE_URL):
     try:
-        player_url = f"https://baseball.yahoo.co.jp/npb/player/{player_id}/top"
-        res = requests.get(player_url)
-        res.raise_for_status()
-        soup = BeautifulSoup(res.text, "html.parser")
-        return [player_id] + list(get_player_details(soup))
+        player_url = f"{base_url}/npb/player/{player_id}/top"
+        if session is None:
+            res = http_cache.get(player_url, timeout=TIMEOUT)
+            res.raise_for_status()
+        else:
+            res = fetch_with_retry(session, player_url, limiter)
     except requests.RequestException as e:
         print(f"Network error for player ID {player_id}: {e}")
         return None  # Return None if there's an error
+    try:
+        profile = parse_profile(res.text, PARSER_BACKEND)
+    except Exception as e:  # 壊れたページ1件でスイープ全体（crawl の fut.result()）を止めない
+        print(f"Parse error for player ID {player_id}: {e}")
+        return None
+    return [player_id] + list(get_player_details(profile))
+
+def crawl(player_ids, workers=MAX_WORKERS, rate=RATE_PER_HOST, base_url=BASE_URL):
+    """
+    get_player_data をスレッドプールで並列実行し、(player_id, 結果) を ID 順に yield する。
+    実行中のタスクは workers*4 件までに抑えるので、ID 範囲が大きくてもメモリは一定。
+    """
+    session = make_session(workers)
+    limiter = HostRateLimiter(rate, BURST)
+    window = workers * 4
+    pending = deque()
+    ids = iter(player_ids)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for player_id in ids:
+            pending.append((player_id, ex.submit(get_player_data, player_id, session, limiter, base_url)))
+            if len(pending) >= window:
+                pid, fut = pending.popleft()
+                yield pid, fut.result()
+        while pending:
+            pid, fut = pending.popleft()
+            yield pid, fut.result()
+    session.close()
+
+class CsvStreamWriter:
+    """
+    行を受け取ったそばから CSV に追記し、batch_size 行ごとに flush+fsync する。
+    保持するのは未 flush の行だけなので、件数が増えてもメモリは一定。
+    """
+    def __init__(self, filename=OUTPUT_CSV, batch_size=CSV_BATCH, append=False):
+        self.filename = Path(filename)
+        self.batch_size = batch_size
+        self.buffer = []
+        self.count = 0
+        new_file = not (append and self.filename.exists())
+        self.f = open(self.filename, "w" if new_file else "a", newline="", encoding="utf8")
+        self.writer = csv.writer(self.f)
+        if new_file:
+            self.writer.writerow(HEADER)
+            self.flush()
+
+    def write(self, row):
+        self.buffer.append(row)
+        self.count += 1
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        """バッファを書き出してディスクに同期し、ファイル末尾のオフセットを返す"""
+        self.writer.writerows(self.buffer)
+        self.buffer.clear()
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+def load_checkpoint(path=CHECKPOINT_FILE) -> dict | None:
+    path = Path(path)
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+    return None
+
+def save_checkpoint(data: dict, path=CHECKPOINT_FILE):
+    """一時ファイルに書いてから置き換える（途中で落ちても壊れない）"""
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def id_source_fingerprint(player_ids) -> str:
+    """ID の一覧を表す文字列。range は範囲そのもの、リスト（--discover）は ID 全体のハッシュ"""
+    if isinstance(player_ids, range):
+        return f"range:{player_ids.start}:{player_ids.stop}:{player_ids.step}"
+    digest = hashlib.sha1(",".join(map(str, player_ids)).encode("ascii")).hexdigest()
+    return f"ids:{digest}"
+
+def run_sweep(player_ids, workers=MAX_WORKERS, rate=RATE_PER_HOST, base_url=BASE_URL,
+              output=OUTPUT_CSV, resume=False, checkpoint_every=CHECKPOINT_EVERY) -> int:
+    """
+    昇順の player_ids（range でもリストでも可）を取得して CSV に追記していく。
+    checkpoint_every 件ごとに「次に取得する ID」と CSV のオフセットを保存し、
+    resume=True ならそこから再開する。チェックポイントが別の ID 一覧・別の出力先のものや、
+    記録したオフセットが CSV より長いときは、ID の取りこぼしや CSV の破損を避けるため再開を断る（ValueError）。
+    resume=False なら始める時点でチェックポイントを書き直す（前の実行のものは使わせない）。
+    """
+    if not len(player_ids):
+        return 0
+    sweep = {"start": player_ids[0], "end": player_ids[-1] + 1, "count": len(player_ids),
+             "ids": id_source_fingerprint(player_ids), "output": str(Path(output).resolve())}
+    todo = player_ids
+    ckpt = load_checkpoint()
+    if resume and ckpt and any(ckpt.get(k) != v for k, v in sweep.items()):
+        raise ValueError(f"チェックポイント {CHECKPOINT_FILE} は別の ID 一覧（{ckpt.get('ids', '不明')}）"
+                         f"または別の出力先（{ckpt.get('output', '不明')}）のものです。"
+                         "同じ引数で再開するか、--resume を外して最初から取得してください")
+    if resume and ckpt and Path(output).exists():
+        size = Path(output).stat().st_size
+        if ckpt["csv_offset"] > size:
+            raise ValueError(f"チェックポイントの位置（{ckpt['csv_offset']} バイト）が {output}（{size} バイト）より後ろです。"
+                             "--resume を外して最初から取得してください")
+        next_id = ckpt["next_id"]
+        todo = player_ids[bisect_left(player_ids, next_id):]
+        # チェックポイント後に書かれた行は再取得するので切り捨てる
+        with open(output, "r+b") as f:
+            f.truncate(ckpt["csv_offset"])
+        print(f"Resuming from player ID {next_id}")
+        writer = CsvStreamWriter(output, append=True)
+    else:
+        writer = CsvStreamWriter(output)
+        # 最初のチェックポイントより前に落ちても、前の実行のチェックポイントで再開しないように
+        save_checkpoint({**sweep, "next_id": player_ids[0], "csv_offset": writer.flush()})
+
+    saved = 0
+    try:
+        for done, (player_id, player_data) in enumerate(crawl(todo, workers, rate, base_url), 1):
+            if player_data and player_data[1]:  # Check if player_data is valid and has a name
+                print(f"Adding data for player ID {player_id}")
+                writer.write(player_data)
+                saved += 1
+            if done % checkpoint_every == 0:
+                offset = writer.flush()
+                save_checkpoint({**sweep, "next_id": player_id + 1, "csv_offset": offset})
+        offset = writer.flush()
+        save_checkpoint({**sweep, "next_id": sweep["end"], "csv_offset": offset})
+    finally:
+        writer.close()
+    return saved
+
+# ====== ID 探索（総当たりの代わりに有効な ID だけを集める） ======
+class PlayerIdIndex:
+    """
+    有効な選手 ID と「調査済み ID 区間」を JSON に保存するインデックス。
+    次回以降は調査済み区間を飛ばして差分だけ探索する。
+    """
+    def __init__(self, path=ID_INDEX_FILE):
+        self.path = Path(path)
+        self.ids: set[int] = set()
+        self.scanned: list[list[int]] = []  # 昇順・重複なしの [開始, 終了) 区間
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.ids = set(data.get("ids", []))
+            self.scanned = data.get("scanned", [])
+
+    def save(self):
+        tmp = self.path.with_suffix(".tmp")
+        data = {"ids": sorted(self.ids), "scanned": self.scanned}
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def is_scanned(self, player_id: int) -> bool:
+        i = bisect_right(self.scanned, [player_id, float("inf")]) - 1
+        return i >= 0 and self.scanned[i][0] <= player_id < self.scanned[i][1]
+
+    def mark_scanned(self, player_ids):
+        intervals = self.scanned + [[i, i + 1] for i in player_ids]
+        intervals.sort()
+        merged = []
+        for a, b in intervals:
+            if merged and a <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], b)
+            else:
+                merged.append([a, b])
+        self.scanned = merged
+
+    def ids_in(self, start, end) -> list[int]:
+        return sorted(i for i in self.ids if start <= i < end)
+
+def harvest_roster_ids(base_url=BASE_URL, rate=RATE_PER_HOST) -> set[int]:
+    """12球団の一軍・二軍登録選手一覧ページから選手 ID を集める"""
+    session = make_session(1)
+    limiter = HostRateLimiter(rate, BURST)
+    found = set()
+    for team_id in YAHOO_TEAM_IDS:
+        for kind in ROSTER_KINDS:
+            url = f"{base_url}/npb/teams/{team_id}/memberlist?kind={kind}"
+            try:
+                res = fetch_with_retry(session, url, limiter)
+            except requests.RequestException as e:
+                print(f"Roster fetch failed ({url}): {e}")
+                continue
+            found.update(int(m) for m in PLAYER_LINK.findall(res.text))
+    session.close()
+    return found
+
+def probe_bands(index: PlayerIdIndex, start, end, stride=PROBE_STRIDE, radius=BAND_RADIUS,
+                workers=MAX_WORKERS, rate=RATE_PER_HOST, base_url=BASE_URL):
+    """
+    stride おきに試し打ちし、当たった ID の前後 radius を密に調べる。
+    密な区間で新たに当たりが出れば、その周辺へさらに広げていく。
+    """
+    def hits_of(ids):
+        hits = [pid for pid, data in crawl(ids, workers, rate, base_url) if data and data[1]]
+        index.ids.update(hits)
+        index.mark_scanned(ids)
+        index.save()
+        return hits
+
+    probes = [i for i in range(start, end, stride) if not index.is_scanned(i)]
+    # 既知の ID（名簿由来を含む）の周辺も密な探索の起点にする
+    frontier = hits_of(probes) + index.ids_in(start, end)
+    while frontier:
+        window = sorted({
+            i for h in frontier for i in range(max(start, h - radius), min(end, h + radius + 1))
+            if not index.is_scanned(i)
+        })
+        frontier = hits_of(window) if window else []
+
+def discover_ids(start, end, probe=False, workers=MAX_WORKERS, rate=RATE_PER_HOST,
+                 base_url=BASE_URL) -> list[int]:
+    """名簿ページ（＋任意で帯域探索）で ID インデックスを更新し、範囲内の有効 ID を返す"""
+    index = PlayerIdIndex()
+    before = len(index.ids)
+    index.ids.update(harvest_roster_ids(base_url, rate))
+    index.save()
+    if probe:
+        probe_bands(index, start, end, workers=workers, rate=rate, base_url=base_url)
+    print(f"ID index: {len(index.ids)} IDs (+{len(index.ids) - before})")
+    return index.ids_in(start, end)
 
 def save_to_csv(player_data_list):
     try:
-        filename = "players_data.csv"
-        with open(filename, "w", newline="", encoding='utf8') as f:
-            writer = csv.writer(f)
-            # Write the header
-            writer.writerow([
-                "Player ID", "Name", "Name (Kana)", "Position", "Uniform Number", "Birth Place", "Born Date",
-                "Height", "Weight", "Blood Type", "Pitching", "Batting", "Draft Year", "Draft Rank",
-                "Pro Year", "Career", "Koshien Flag", "Major Title"
-            ])
-            # Write player data
-            for player_data in player_data_list:
-                writer.writerow(player_data)
+        writer = CsvStreamWriter(OUTPUT_CSV)
+        for player_data in player_data_list:
+            writer.write(player_data)
+        writer.close()
     except Exception as e:
         print(f"Error saving data to CSV: {e}")
 
+def parse_args():
+    ap = argparse.ArgumentParser(description="Yahoo!プロ野球の選手プロフィールを収集してCSVに保存")
+    ap.add_argument("--start", type=int, default=START_ID)
+    ap.add_argument("--end", type=int, default=END_ID, help="この ID は含まない")
+    ap.add_argument("--workers", type=int, default=MAX_WORKERS, help="同時リクエスト数")
+    ap.add_argument("--rate", type=float, default=RATE_PER_HOST, help="1ホストあたりの毎秒リクエスト数")
+    ap.add_argument("--base-url", default=BASE_URL, help="取得先（ローカルのスタブサーバ等）")
+    ap.add_argument("--output", default=OUTPUT_CSV)
+    ap.add_argument("--parser", choices=sorted(BACKENDS), default=PARSER_BACKEND, help="HTML パーサ")
+    ap.add_argument("--resume", action="store_true", help="チェックポイントから再開")
+    ap.add_argument("--discover", action="store_true",
+                    help="名簿ページから ID インデックスを更新し、既知の ID だけを取得")
+    ap.add_argument("--probe", action="store_true",
+                    help="--discover 時に ID 帯域の試し打ち探索も行う")
+    return ap.parse_args()
+
 if __name__ == "__main__":
-    player_data_list = []
-    for player_id in range(980000, 2500000):
-        player_data = get_player_data(player_id)
-        if player_data and player_data[1]:  # Check if player_data is valid and has a name
-            print(f"Adding data for player ID {player_id}")
-            player_data_list.append(player_data)
-
-    if player_data_list:
-        save_to_csv(player_data_list)
-        print("Data saved to players_data.csv")
+    args = parse_args()
+    PARSER_BACKEND = args.parser
+    if args.discover:
+        player_ids = discover_ids(args.start, args.end, args.probe, args.workers, args.rate, args.base_url)
+    else:
+        player_ids = range(args.start, args.end)
+    try:
+        saved = run_sweep(player_ids, args.workers, args.rate, args.base_url, args.output, args.resume)
+    except ValueError as e:
+        raise SystemExit(e)
+    if saved:
+        print(f"Data saved to {args.output}")
     else:
         print("No valid player data found.")
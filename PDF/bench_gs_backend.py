@@ -0,0 +1,73 @@
+# bench_gs_backend.py
+# compress_pdfs の圧縮バックエンド（1ファイル1プロセス / 常駐 gs / pikepdf）を
+# 小さいPDFをたくさん圧縮するときの速さで比べる。元のPDFは毎回作り直すので何度でも実行できる。
+# python bench_gs_backend.py --files 300 --jobs 4
+
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from reportlab.pdfgen import canvas
+
+import compress_pdfs as cp
+
+def make_pdfs(folder: Path, n: int, pages: int):
+    """取扱説明書くらいの文字だけのPDFを n 件作る"""
+    folder.mkdir(parents=True, exist_ok=True)
+    first = folder / "sample_0.pdf"
+    c = canvas.Canvas(str(first))
+    for p in range(pages):
+        for row in range(40):
+            c.drawString(60, 780 - row * 18, f"page {p} line {row} " + "lorem ipsum " * 6)
+        c.showPage()
+    c.save()
+    for i in range(1, n):
+        shutil.copyfile(first, folder / f"sample_{i}.pdf")
+    return sorted(folder.glob("*.pdf"))
+
+def run(name: str, pdfs: list[Path], jobs: int, preset: str):
+    engine = cp.make_backend(name, jobs, roots=[pdfs[0].parent])
+    if engine is None:
+        return None
+    cp.GS_SLOTS = threading.BoundedSemaphore(jobs)
+    before = sum(p.stat().st_size for p in pdfs)
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as ex:
+            list(ex.map(lambda p: cp.compress_in_place(engine, p, preset), pdfs))
+    finally:
+        engine.close()
+    elapsed = time.perf_counter() - t0
+    after = sum(p.stat().st_size for p in pdfs)
+    return elapsed, before, after
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--pages", type=int, default=4)
+    ap.add_argument("--jobs", type=int, default=4)
+    ap.add_argument("--backends", nargs="+", default=["subprocess", "server", "pikepdf"])
+    args = ap.parse_args()
+
+    print(f"{args.files} 件 × {args.pages} ページ / {args.jobs} 並列")
+    print(f"{'backend':<12}{'秒':>8}{'files/s':>10}{'サイズ':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.backends:
+            pdfs = make_pdfs(Path(tmp) / name, args.files, args.pages)
+            try:
+                res = run(name, pdfs, args.jobs, "/ebook")
+            except RuntimeError as e:
+                print(f"{name:<12}スキップ（{e}）")
+                continue
+            if res is None:
+                print(f"{name:<12}スキップ（Ghostscript が見つかりません）")
+                continue
+            elapsed, before, after = res
+            print(f"{name:<12}{elapsed:8.2f}{args.files / elapsed:10.1f}{after / before:10.0%}")
+
+if __name__ == "__main__":
+    main()
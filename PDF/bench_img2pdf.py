@@ -0,0 +1,101 @@
+# bench_img2pdf.py
+# 画像を纏めてPDF化_複数フォルダ用 の変換を、生成した写真風 JPEG のフォルダで計測する。
+#   legacy      : 並列化前の方法（1プロセスで A4 のビットマップを作り、reportlab が可逆圧縮で埋め込む）
+#   raster      : 全ページを 300dpi の A4 画像に描き直して JPEG にする（JPEG_PASSTHROUGH = False）
+#   passthrough : JPEG を decode せずにそのまま埋め込み、置き場所だけ指定する（JPEG_PASSTHROUGH）
+# 4枚に1枚は EXIF で縦向き（Orientation=6）にしてある。
+# 各方式は別プロセスで動かし、ピークメモリ（maxrss）も比べる。raster / passthrough は
+# ページごとにディスクへ書くので、--images を増やしても legacy と違ってメモリはほぼ増えない。
+# python bench_img2pdf.py --images 40 --size 4000x3000 --workers 4
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+from pypdf import PdfReader
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+import 画像を纏めてPDF化_複数フォルダ用 as img
+
+def make_photos(folder: Path, count: int, size: tuple[int, int]):
+    """なだらかな色の変化にノイズを混ぜた、スマホ写真くらいの大きさの JPEG を作る"""
+    folder.mkdir(parents=True, exist_ok=True)
+    w, h = size
+    for i in range(count):
+        base = Image.merge("RGB", [Image.linear_gradient("L").resize((w, h)),
+                                   Image.radial_gradient("L").resize((w, h)),
+                                   Image.linear_gradient("L").rotate(90 + i).resize((w, h))])
+        noise = Image.effect_noise((w, h), 20 + i % 10).convert("RGB")
+        photo = Image.blend(base, noise, 0.15)
+        exif = Image.Exif()
+        if i % 4 == 3:
+            exif[0x0112] = 6
+        photo.save(folder / f"IMG_{i + 1:04d}.jpg", "JPEG", quality=88, exif=exif)
+
+def legacy_convert(src: Path, out: Path, dpi=300) -> int:
+    c = canvas.Canvas(str(out), pagesize=img.A4_PT)
+    for path in img.list_images(src):
+        page_img = img.fit_to_a4(img.load_fitted(path, img.a4_pixels(dpi)).convert("RGB"), dpi=dpi)
+        c.drawImage(ImageReader(page_img), 0, 0, width=img.A4_PT[0], height=img.A4_PT[1])
+        c.showPage()
+    c.save()
+    return len(img.list_images(src))
+
+def run_mode(mode: str, src: Path, out: Path, workers: int):
+    """子プロセス側: 1方式を実行して結果を JSON で出す"""
+    t0 = time.perf_counter()
+    if mode == "legacy":
+        ok, skipped = legacy_convert(src, out), []
+    else:
+        ok, skipped = img.convert_folders([(src, out)], dpi=300, workers=workers,
+                                          passthrough=(mode == "passthrough"))[0]
+    elapsed = time.perf_counter() - t0
+    # 書き込みは親プロセス、画像の処理は子プロセス。それぞれのピークを出す（Linux は KB 単位）
+    # 確認の PdfReader はファイル全体を読むので、その前に測る
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    pages = len(PdfReader(str(out)).pages)
+    assert pages == ok == len(img.list_images(src)), (pages, ok, skipped)
+    print(json.dumps({"sec": elapsed, "pages": pages, "bytes": out.stat().st_size,
+                      "rss_mb": rss, "worker_rss_mb": worker_rss}))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", type=int, default=40)
+    ap.add_argument("--size", default="4000x3000", help="横x縦")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--modes", nargs="+", default=["legacy", "raster", "passthrough"])
+    ap.add_argument("--child", nargs=3, metavar=("MODE", "SRC", "OUT"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        mode, src, out = args.child
+        run_mode(mode, Path(src), Path(out), args.workers)
+        return
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "photos"
+        t0 = time.perf_counter()
+        make_photos(src, args.images, size)
+        src_mb = sum(p.stat().st_size for p in src.iterdir()) / 1024 / 1024
+        print(f"{args.images} 枚の JPEG を生成: {src_mb:.1f} MB ({time.perf_counter() - t0:.1f} 秒)")
+        print(f"{'mode':<13}{'秒':>8}{'ページ':>8}{'PDF MB':>10}{'枚/秒':>8}{'ピークMB':>10}{'子MB':>8}")
+        for mode in args.modes:
+            out = subprocess.run(
+                [sys.executable, __file__, "--workers", str(args.workers),
+                 "--child", mode, str(src), str(Path(tmp) / f"{mode}.pdf")],
+                check=True, capture_output=True, text=True).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{mode:<13}{r['sec']:8.2f}{r['pages']:8d}{r['bytes'] / 1024 / 1024:10.1f}"
+                  f"{r['pages'] / r['sec']:8.1f}{r['rss_mb']:10.0f}{r['worker_rss_mb']:8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# bench_merge.py
+# 分割→結合の往復で、結合後のサイズと時間を比べる。
+# 元PDFは bench_split.make_pdf（全ページが画像20枚のリソース辞書を共有するスキャン風PDF）。
+#   分割: legacy（各パートに全画像が入る従来の分割）/ stream（split_every_50_pages.split_pdf）
+#   結合: pypdf（従来の merge_with_writer）/ dedup（pdf_stream_writer.merge_dedup）
+# python bench_merge.py --pages 2000
+
+import argparse
+import contextlib
+import io
+import re
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from pypdf import PdfReader, PdfWriter
+
+import split_every_50_pages as sp
+from bench_split import legacy_split, make_pdf
+from pdf_stream_writer import merge_dedup
+
+def pypdf_merge(input_paths, output_path):
+    """置き換える前の merge_with_writer"""
+    writer = PdfWriter()
+    for ip in input_paths:
+        for page in PdfReader(str(ip)).pages:
+            writer.add_page(page)
+    with open(output_path, "wb") as f:
+        writer.write(f)
+
+def split(kind: str, src: Path, folder: Path) -> list[Path]:
+    folder.mkdir()
+    pdf = folder / "scan.pdf"
+    shutil.copyfile(src, pdf)
+    if kind == "legacy":
+        legacy_split(pdf, sp.CHUNK)
+        pdf.unlink()
+    else:
+        sp.DELETE_ORIGINAL = True
+        with contextlib.redirect_stdout(io.StringIO()):  # 「作成: ...」の行は出さない
+            sp.split_pdf(pdf, sp.CHUNK, 1)
+    return sorted(folder.glob("scan-*.pdf"), key=lambda p: int(re.search(r"-(\d+)-\d+\.pdf$", p.name).group(1)))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=2000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src = tmp / "source.pdf"
+        make_pdf(src, args.pages)
+        mb = lambda n: n / 1024 / 1024
+        print(f"元PDF: {args.pages} ページ / {mb(src.stat().st_size):.1f} MB")
+        print(f"{'分割':<8}{'パート計MB':>11}{'結合':>8}{'秒':>8}{'結合後MB':>10}{'ページ':>8}")
+        for kind in ("legacy", "stream"):
+            parts = split(kind, src, tmp / kind)
+            parts_mb = mb(sum(p.stat().st_size for p in parts))
+            for name, merge in (("pypdf", pypdf_merge), ("dedup", merge_dedup)):
+                out = tmp / f"{kind}_{name}.pdf"
+                t0 = time.perf_counter()
+                merge(parts, out)
+                elapsed = time.perf_counter() - t0
+                pages = len(PdfReader(str(out)).pages)
+                print(f"{kind:<8}{parts_mb:11.1f}{name:>8}{elapsed:8.2f}{mb(out.stat().st_size):10.1f}{pages:8d}")
+
+if __name__ == "__main__":
+    main()
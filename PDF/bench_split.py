@@ -0,0 +1,125 @@
+# bench_split.py
+# split_every_50_pages の分割を、生成した 5,000 ページのスキャン風PDFで計測する。
+# 全ページが1つのリソース辞書（画像20枚＋フォント）を共有する、スキャナ出力によくある形にしてある。
+#   legacy   : 置き換える前の方法（1つの PdfReader から CHUNK ごとに PdfWriter を作る）
+#   stream   : split_pdf（パートごとに読み直し、使うリソースだけ入れる）
+#   parallel : split_pdf を --workers プロセスで
+# 各方式は別プロセスで動かし、ピークメモリ（maxrss）も比べる。
+# python bench_split.py --pages 5000 --workers 4
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (DecodedStreamObject, DictionaryObject, FloatObject,
+                           NameObject, NumberObject, RectangleObject)
+
+import split_every_50_pages as sp
+
+IMAGES = 20
+
+def make_pdf(path: Path, pages: int):
+    """pages ページのPDFを作る。画像 i は pages/IMAGES ページ続けて使う"""
+    writer = PdfWriter()
+    xobjects = DictionaryObject()
+    for i in range(IMAGES):
+        buf = io.BytesIO()
+        Image.effect_noise((600, 800), 40 + i).convert("RGB").save(buf, "JPEG", quality=85)
+        img = DecodedStreamObject()
+        img.set_data(buf.getvalue())
+        img.update({
+            NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(600), NameObject("/Height"): NumberObject(800),
+            NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+            NameObject("/BitsPerComponent"): NumberObject(8), NameObject("/Filter"): NameObject("/DCTDecode"),
+        })
+        xobjects[NameObject(f"/Im{i}")] = writer._add_object(img)
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"), NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    resources = writer._add_object(DictionaryObject({
+        NameObject("/XObject"): writer._add_object(xobjects),
+        NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+    }))
+    per_image = max(1, pages // IMAGES)
+    for p in range(pages):
+        page = writer.add_blank_page(595, 842)
+        content = DecodedStreamObject()
+        im = min(p // per_image, IMAGES - 1)
+        content.set_data(f"q 495 0 0 660 50 120 cm /Im{im} Do Q BT /F1 12 Tf 50 60 Td (page {p + 1}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = resources
+        page[NameObject("/MediaBox")] = RectangleObject([FloatObject(0), FloatObject(0), FloatObject(595), FloatObject(842)])
+    with open(path, "wb") as f:
+        writer.write(f)
+
+def legacy_split(pdf_path: Path, chunk: int):
+    reader = PdfReader(str(pdf_path))
+    n = len(reader.pages)
+    for start in range(0, n, chunk):
+        end = min(start + chunk, n)
+        writer = PdfWriter()
+        for i in range(start, end):
+            writer.add_page(reader.pages[i])
+        with open(pdf_path.parent / f"{pdf_path.stem}-{start+1}-{end}.pdf", "wb") as f:
+            writer.write(f)
+
+def run_mode(mode: str, src: Path, workdir: Path, workers: int):
+    """子プロセス側: 1方式を実行して結果を JSON で出す"""
+    workdir.mkdir(parents=True, exist_ok=True)
+    pdf = workdir / "scan.pdf"
+    pdf.write_bytes(src.read_bytes())
+    sp.DELETE_ORIGINAL = True
+    t0 = time.perf_counter()
+    if mode == "legacy":
+        legacy_split(pdf, sp.CHUNK)
+        pdf.unlink()
+    else:
+        sp.split_pdf(pdf, sp.CHUNK, workers if mode == "parallel" else 1)
+    elapsed = time.perf_counter() - t0
+    parts = list(workdir.glob("scan-*.pdf"))
+    # 子プロセスのピークメモリも足す（parallel 用）。Linux は KB 単位
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(json.dumps({"sec": elapsed, "parts": len(parts), "bytes": sum(p.stat().st_size for p in parts),
+                      "rss_mb": rss / 1024}))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=5000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--modes", nargs="+", default=["legacy", "stream", "parallel"])
+    ap.add_argument("--child", nargs=3, metavar=("MODE", "SRC", "WORKDIR"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        mode, src, workdir = args.child
+        run_mode(mode, Path(src), Path(workdir), args.workers)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "source.pdf"
+        t0 = time.perf_counter()
+        make_pdf(src, args.pages)
+        print(f"{args.pages} ページのPDFを生成: {src.stat().st_size / 1024 / 1024:.1f} MB "
+              f"({time.perf_counter() - t0:.1f} 秒)")
+        print(f"{'mode':<10}{'秒':>8}{'パート':>8}{'合計MB':>10}{'ピークMB':>10}")
+        for mode in args.modes:
+            out = subprocess.run(
+                [sys.executable, __file__, "--workers", str(args.workers),
+                 "--child", mode, str(src), str(Path(tmp) / mode)],
+                check=True, capture_output=True, text=True).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{mode:<10}{r['sec']:8.2f}{r['parts']:8d}{r['bytes'] / 1024 / 1024:10.1f}{r['rss_mb']:10.0f}")
+
+if __name__ == "__main__":
+    main()
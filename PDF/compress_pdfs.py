@@ -3,20 +3,61 @@
 # 1) OCR済PDFを Ghostscript で同じフォルダに上書き圧縮（/ebook 既定）
 # 2) ファイル名「メーカー_型番.pdf」からメーカーを日本語統一・型番は英字だけ大文字化
 # 3) target_root/メーカー/「メーカー_型番.pdf」に自動移動（既存は上書き）
-# python compress_pdfs.py
+# 4) Ghostscript は1プロセス1コアなので、複数ファイルを並列に圧縮（--jobs、既定はCPU数）
+# 5) 圧縮済みの記録（内容のハッシュ＋プリセット）を台帳に残し、次回以降は圧縮せずスキップ。
+#    MIN_GAIN 未満しか小さくならないときは元ファイルを残す
+# 6) --strategy auto（既定）: PDFごとに画像の量と解像度を調べて候補設定を決め、
+#    候補を並列に試して画質チェック（PSNR）に通る最小のものを採用。文字主体のPDFは圧縮しない
+# 7) --backend: subprocess（1ファイルごとに gs を起動。既定）/ server（試験的・指定したときだけ。常駐 gs に
+#    標準入力でジョブを流す。-dSAFER で入力フォルダだけ許可。SAFER で出力先を切り替えられない gs なら
+#    subprocess に戻す。ジョブが SERVER_JOB_TIMEOUT を過ぎる・gs が落ちたときはその gs を止めて起動し直し、
+#    そのファイルは subprocess でやり直す）/
+#    pikepdf（プロセス内。画像は縮小せず、ストリームの再圧縮と未使用リソースの削除だけ）
+# python compress_pdfs.py [--jobs N] [--force] [--strategy auto|fixed] [--backend server] [--report report.csv]
 
+import argparse
+import binascii
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import queue
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import shutil
 import sys
 import unicodedata
 
+# pikepdf があればプロセス内バックエンドを使える
+PIKEPDF_OK = False
+try:
+    import pikepdf
+    PIKEPDF_OK = True
+except Exception:
+    pass
+
 # ====== 設定 ======
 #in_dir     = Path("/Users/shogo/PDF/python入門")   # 圧縮したいPDFがある場所
 in_dir     = Path("/Users/shogo/Downloads") 
 #target_root = Path("/Users/shogo/PDF/python入門")  # メーカー別フォルダの親
 target_root = Path("/Users/shogo/PDF/取扱説明書")
 quality    = "ebook"  # "ebook"（推奨:スマホ/タブレット）/ "printer"（高画質）
+LEDGER_FILE = target_root / ".compress_ledger.json"  # 圧縮済み台帳
+MIN_GAIN   = 0.05     # これ未満の縮小率なら圧縮結果を捨てて元ファイルを残す
+strategy   = "auto"   # "auto"（PDFごとに設定を選ぶ）/ "fixed"（quality を全ファイルに適用）
+backend    = "subprocess"  # "subprocess" / "server"（常駐 gs・試験的）/ "pikepdf"（プロセス内・無劣化）
+SERVER_JOB_TIMEOUT = 600   # 常駐 gs の1ジョブの上限（秒）。過ぎたら gs を止めて subprocess でやり直す
+# --- auto 用 ---
+SAMPLE_PAGES    = 8                # 解析で見るページ数（均等に抜き出す）
+TEXT_ONLY_RATIO = 0.15             # 画像がファイルサイズのこの割合未満なら文字主体とみなす
+CANDIDATE_DPI   = [200, 150, 110]  # 画像の縮小先の候補（元の解像度より低いものだけ試す）
+MIN_PSNR        = 32.0             # 画質チェックの合格ライン（dB）
+CHECK_DPI       = 40               # 画質チェック用に描画する解像度
 # ===================
 
 # メーカー統一表記（日本語）
@@ -68,30 +109,447 @@ def find_gs_executable():
             return exe
     return None
 
-def compress_in_place(gs: str, pdf_path: Path, preset: str = "/ebook"):
+def make_backend(name: str, jobs: int, roots=()):
+    """
+    --backend の名前から圧縮バックエンドを作る（gs が要るものは見つからなければ None）。
+    roots は常駐 gs に読み書きを許すフォルダ（入力PDFと一時ファイルの置き場所）
+    """
+    if name == "pikepdf":
+        if not PIKEPDF_OK:
+            raise RuntimeError("pikepdf がありません。`pip install pikepdf` で導入してください。")
+        return PikepdfBackend()
+    gs = find_gs_executable()
+    if not gs:
+        return None
+    if name != "server":
+        return SubprocessBackend(gs)
+    engine = GsServerBackend(gs, jobs, roots)
+    if not engine.probe():
+        engine.close()
+        print("常駐 gs が -dSAFER のまま出力先を切り替えられないため、subprocess で圧縮します", file=sys.stderr)
+        return SubprocessBackend(gs)
+    return engine
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class Ledger:
     """
-    Ghostscriptで一時ファイルに出力→元ファイルを上書き置換
+    「内容のハッシュ:プリセット」→ 処理結果 の台帳（JSON）。
+    圧縮後のファイルのハッシュも登録するので、出力を再投入してもスキップされる。
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        if path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                self.entries = {}
+
+    def get(self, digest: str, preset: str) -> dict | None:
+        return self.entries.get(f"{digest}:{preset}")
+
+    def record(self, digests, preset, name, in_size, out_size, kept):
+        entry = {"name": name, "in_size": in_size, "out_size": out_size, "kept": kept,
+                 "at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        for d in digests:
+            self.entries[f"{d}:{preset}"] = entry
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+# 同時に動く Ghostscript の数の上限（main で --jobs に合わせて作り直す）
+GS_SLOTS = threading.BoundedSemaphore(os.cpu_count() or 1)
+
+def run_gs(gs: str, args: list[str], capture: bool = False) -> bytes:
+    with GS_SLOTS:
+        res = subprocess.run([gs, "-dNOPAUSE", "-dQUIET", "-dBATCH", *args],
+                             check=True, stdout=subprocess.PIPE if capture else None)
+    return res.stdout or b""
+
+def pdfwrite_args(preset: str, dpi: int | None = None) -> list[str]:
+    args = ["-sDEVICE=pdfwrite", "-dCompatibilityLevel=1.6", f"-dPDFSETTINGS={preset}"]
+    if dpi:
+        args += [
+            "-dDownsampleColorImages=true", "-dDownsampleGrayImages=true",
+            f"-dColorImageResolution={dpi}", f"-dGrayImageResolution={dpi}",
+            f"-dMonoImageResolution={max(dpi * 2, 300)}",
+            "-dColorImageDownsampleThreshold=1.0", "-dGrayImageDownsampleThreshold=1.0",
+        ]
+    return args
+
+# ====== 圧縮バックエンド ======
+# どれも pdfwrite(args, src, dst) で src を Ghostscript の引数 args 相当の設定で dst に書き出す。
+# exe があるもの（gs を使うもの）は auto の画質チェックにも使える
+class SubprocessBackend:
+    """1ファイルごとに gs を起動する（従来の動作）"""
+    def __init__(self, exe: str):
+        self.exe = exe
+
+    def pdfwrite(self, args: list[str], src: Path, dst: Path):
+        run_gs(self.exe, [*args, f"-sOutputFile={str(dst)}", str(src)])
+
+    def close(self):
+        pass
+
+def _ps_string(path: Path) -> str:
+    """パスを PostScript の16進文字列にする（括弧・バックスラッシュ・日本語のエスケープが不要）"""
+    return "<" + binascii.hexlify(str(path).encode("utf-8")).decode("ascii") + ">"
+
+def _distiller_params(args: list[str]) -> str:
+    """-dPDFSETTINGS=/ebook や -dColorImageResolution=150 を setdistillerparams の PostScript にする"""
+    ps = [".distillersettings /default get setdistillerparams"]  # 前のジョブの設定を残さない
+    extra = []
+    for a in args:
+        if not a.startswith("-d") or "=" not in a:
+            continue
+        key, value = a[2:].split("=", 1)
+        if key == "PDFSETTINGS":
+            ps.append(f".distillersettings {value} get setdistillerparams")
+        else:
+            extra.append(f"/{key} {value}")
+    if extra:
+        ps.append(f"<< {' '.join(extra)} >> setdistillerparams")
+    return "\n".join(ps)
+
+class GsServerError(subprocess.CalledProcessError):
+    """常駐 gs が落ちた・時間内に終わらなかった（入力PDFのエラーではない）"""
+
+class GsWorker:
+    """
+    常駐する gs 1プロセス。標準入力から PostScript を読ませ、ジョブごとに
+    OutputFile を切り替えて入力PDFを run する。起動とフォント初期化は最初の1回だけ。
+    入力は信用できないPDFなので -dSAFER で動かし、roots の中の読み込みと
+    一時ファイル（*.tmp_*）への書き込みだけを許す。
+    標準出力は読み取りスレッドが行ごとに self.lines へ流し、ジョブの完了待ちには期限を付ける。
+    """
+    def __init__(self, exe: str, roots=()):
+        self.exe = exe
+        self.roots = [Path(r).resolve() for r in roots]
+        self.proc = None
+        self.lines = None
+        self.seq = 0
+
+    def _start(self):
+        permits = [f"--permit-file-write={os.devnull}"]
+        for root in self.roots:
+            permits += [f"--permit-file-read={root}{os.sep}",
+                        f"--permit-file-write={root}{os.sep}*.tmp_*"]
+        self.proc = subprocess.Popen(
+            [self.exe, "-q", "-dNOPAUSE", "-dSAFER", *permits, "-sDEVICE=pdfwrite",
+             f"-sOutputFile={os.devnull}", "-"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding="utf-8", errors="replace", bufsize=1)
+        # プロセスごとに別のキュー（止めた gs の出力が次の gs のジョブに混ざらない）
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self.proc.stdout, self.lines), daemon=True).start()
+
+    @staticmethod
+    def _read(stdout, lines: queue.Queue):
+        for line in stdout:
+            lines.put(line)
+        lines.put(None)  # gs が終了した
+
+    def run(self, args: list[str], src: Path, dst: Path):
+        # 許可リストは絶対パスで照合されるので、ジョブのパスもそろえる
+        self._job(args, f"{_ps_string(src.resolve())} run", dst.resolve(), src)
+
+    def _job(self, args: list[str], body: str, dst: Path, src, timeout: float | None = None):
+        deadline = time.monotonic() + (timeout or SERVER_JOB_TIMEOUT)
+        if self.proc is None or self.proc.poll() is not None:
+            self._start()
+        self.seq += 1
+        done = f"%%JOB{self.seq}"
+        # 出力先を devnull に戻した時点で dst が閉じられて書き終わる。
+        # エラーは stopped で受けて、gs 自体は次のジョブに備えて残す
+        job = f"""
+{{
+{_distiller_params(args)}
+<< /OutputFile {_ps_string(dst)} >> setpagedevice
+{body}
+}} stopped
+{{ << /OutputFile {_ps_string(Path(os.devnull))} >> setpagedevice }} stopped pop
+{{ ({done} error\n) }} {{ ({done} ok\n) }} ifelse print flush
+clear cleardictstack
+"""
+        try:
+            self.proc.stdin.write(job)
+            self.proc.stdin.flush()
+            while True:
+                line = self.lines.get(timeout=max(deadline - time.monotonic(), 0))
+                if line is None:
+                    break
+                if line.startswith(done):
+                    if line.split()[1] != "ok":
+                        raise subprocess.CalledProcessError(1, [self.exe, str(src)])
+                    return
+        except (BrokenPipeError, OSError):
+            pass
+        except queue.Empty:
+            # 期限切れ。固まった gs は止めて、次のジョブで起動し直す
+            self.kill()
+            raise GsServerError(1, [self.exe, str(src)], stderr="timeout")
+        # ここに来るのは gs が落ちたとき。次のジョブで起動し直す
+        self.kill()
+        raise GsServerError(1, [self.exe, str(src)])
+
+    def kill(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=10)
+            except Exception:
+                self.proc.kill()
+            self.proc = None
+
+class GsServerBackend:
+    """
+    GsWorker を jobs 個用意して、空いているものにジョブを回す。
+    常駐 gs が落ちた・固まったジョブは SubprocessBackend でやり直す
+    """
+    def __init__(self, exe: str, jobs: int, roots=()):
+        self.exe = exe
+        self.roots = [Path(r) for r in roots]
+        self.fallback = SubprocessBackend(exe)
+        self.workers = [GsWorker(exe, roots) for _ in range(max(1, jobs))]
+        self.idle = queue.Queue()
+        for w in self.workers:
+            self.idle.put(w)
+
+    def probe(self) -> bool:
+        """
+        -dSAFER のままジョブごとに OutputFile を切り替えられるかを、白紙1ページで確かめる。
+        gs の版によっては SAFER で出力先の変更が拒否されるので、そのときは False
+        """
+        if not self.roots:
+            return False
+        dst = self.roots[0].resolve() / ".tmp_probe.pdf"
+        try:
+            self.workers[0]._job(pdfwrite_args("/ebook"), "showpage", dst, "probe", timeout=30)
+            return dst.exists() and dst.stat().st_size > 0
+        except subprocess.CalledProcessError:
+            return False
+        finally:
+            dst.unlink(missing_ok=True)
+
+    def pdfwrite(self, args: list[str], src: Path, dst: Path):
+        worker = self.idle.get()
+        try:
+            worker.run(args, src, dst)
+        except GsServerError as e:
+            reason = "時間切れ" if e.stderr == "timeout" else "gs が終了"
+            print(f"常駐 gs で失敗（{reason}）: {src.name} を subprocess でやり直します", file=sys.stderr)
+            dst.unlink(missing_ok=True)
+            self.fallback.pdfwrite(args, src, dst)
+        finally:
+            self.idle.put(worker)
+
+    def close(self):
+        for w in self.workers:
+            w.close()
+
+class PikepdfBackend:
+    """
+    プロセス内で pikepdf（qpdf）を使う。Ghostscript の引数は使わず、
+    ストリームの再圧縮・オブジェクトストリーム化・未使用リソースの削除だけ行う（画質は変わらない）
+    """
+    exe = None
+
+    def pdfwrite(self, args: list[str], src: Path, dst: Path):
+        with pikepdf.open(src) as pdf:
+            pdf.remove_unreferenced_resources()
+            pdf.save(dst, compress_streams=True, recompress_flate=True,
+                     object_stream_mode=pikepdf.ObjectStreamMode.generate)
+
+    def close(self):
+        pass
+
+def compress_in_place(backend, pdf_path: Path, preset: str = "/ebook", min_gain: float = 0.0):
+    """
+    Ghostscriptで一時ファイルに出力→元ファイルを上書き置換。
+    縮小率が min_gain 未満なら置換せず元ファイルを残す。
+    戻り値: (元のサイズ, 圧縮後のサイズ, 置換したか)
     """
     tmp_out = pdf_path.with_suffix(".tmp_gs.pdf")
     if tmp_out.exists():
         tmp_out.unlink()
 
-    cmd = [
-        gs,
-        "-sDEVICE=pdfwrite",
-        "-dCompatibilityLevel=1.6",
-        f"-dPDFSETTINGS={preset}",
-        "-dNOPAUSE",
-        "-dQUIET",
-        "-dBATCH",
-        f"-sOutputFile={str(tmp_out)}",
-        str(pdf_path),
-    ]
-    subprocess.run(cmd, check=True)
-
-    # 上書き（古いの削除→リネーム）
-    pdf_path.unlink(missing_ok=True)
-    tmp_out.rename(pdf_path)
+    try:
+        backend.pdfwrite(pdfwrite_args(preset), pdf_path, tmp_out)
+    except BaseException:
+        tmp_out.unlink(missing_ok=True)
+        raise
+
+    return _replace_if_smaller(pdf_path, tmp_out, min_gain)
+
+def _replace_if_smaller(pdf_path: Path, tmp_out: Path, min_gain: float):
+    in_size = pdf_path.stat().st_size
+    out_size = tmp_out.stat().st_size
+    if out_size > in_size * (1 - min_gain):
+        tmp_out.unlink()
+        return in_size, out_size, False
+
+    # 上書き（同じフォルダ内の置き換えなので一瞬で入れ替わる）
+    os.replace(tmp_out, pdf_path)
+    return in_size, out_size, True
+
+# ====== 自動選択 ======
+def stored_size(obj) -> int:
+    """ストリームを PDF に書き出したときのバイト数（圧縮されたまま。デコードしない）"""
+    buf = io.BytesIO()
+    obj.write_to_stream(buf)
+    return buf.tell()
+
+def analyze_pdf(pdf_path: Path) -> dict:
+    """
+    数ページを抜き出して、画像ストリームの合計サイズと解像度（概算）を調べる。
+    解像度はページ内で一番大きい画像がページ幅いっぱいに置かれているとみなした値。
+    """
+    from pypdf import PdfReader
+    reader = PdfReader(str(pdf_path))
+    n = len(reader.pages)
+    step = max(1, n // SAMPLE_PAGES)
+    sampled = list(range(0, n, step))[:SAMPLE_PAGES]
+    image_bytes, max_dpi, best_page, best_pixels = 0, 0.0, 0, 0
+    for i in sampled:
+        page = reader.pages[i]
+        pw = float(page.mediabox.width) / 72 or 1
+        ph = float(page.mediabox.height) / 72 or 1
+        resources = page.get("/Resources")
+        xobjects = resources.get_object().get("/XObject") if resources else None
+        for ref in (xobjects.get_object().values() if xobjects else []):
+            xo = ref.get_object()
+            if xo.get("/Subtype") != "/Image":
+                continue
+            w, h = int(xo.get("/Width", 0)), int(xo.get("/Height", 0))
+            image_bytes += stored_size(xo)
+            max_dpi = max(max_dpi, min(w / pw, h / ph))
+            if w * h > best_pixels:
+                best_pixels, best_page = w * h, i
+    # 抜き出したページの割合から全体の画像量を推定
+    est_image_bytes = image_bytes * n / max(len(sampled), 1)
+    return {
+        "pages": n,
+        "image_ratio": est_image_bytes / max(pdf_path.stat().st_size, 1),
+        "dpi": max_dpi,
+        "check_page": best_page + 1,
+    }
+
+def choose_candidates(info: dict, base_preset: str) -> list[tuple[str, list[str]]]:
+    """解析結果から試す設定を決める: [(名前, pdfwrite の引数), ...]。空なら圧縮しない"""
+    if info["image_ratio"] < TEXT_ONLY_RATIO:
+        return []
+    cands = [(base_preset.strip("/"), pdfwrite_args(base_preset))]
+    for dpi in CANDIDATE_DPI:
+        if dpi < info["dpi"] * 0.9:
+            cands.append((f"{dpi}dpi", pdfwrite_args(base_preset, dpi)))
+    return cands
+
+def render_gray(gs: str, pdf: Path, page: int) -> tuple[int, int, bytes]:
+    """1ページをグレースケールで描画して (幅, 高さ, 画素) を返す"""
+    data = run_gs(gs, ["-sDEVICE=pgmraw", f"-r{CHECK_DPI}", f"-dFirstPage={page}", f"-dLastPage={page}",
+                       "-sOutputFile=-", str(pdf)], capture=True)
+    tokens, pos = [], 0
+    while len(tokens) < 4:  # P5 幅 高さ 最大値（# 行はコメント）
+        end = data.index(b"\n", pos)
+        line = data[pos:end].split(b"#")[0]
+        tokens += line.split()
+        pos = end + 1
+    w, h = int(tokens[1]), int(tokens[2])
+    return w, h, data[pos:pos + w * h]
+
+def psnr(a: tuple[int, int, bytes], b: tuple[int, int, bytes]) -> float:
+    if a[:2] != b[:2] or not a[2]:
+        return 0.0
+    se = sum((x - y) * (x - y) for x, y in zip(a[2], b[2]))
+    if se == 0:
+        return float("inf")
+    mse = se / len(a[2])
+    return 10 * math.log10(255 * 255 / mse)
+
+def compress_adaptive(backend, pdf_path: Path, base_preset: str = "/ebook", min_gain: float = 0.0):
+    """
+    候補設定を並列に試し、画質チェックに通った中で一番小さい結果で置き換える。
+    戻り値: (元のサイズ, 採用したサイズ, 置換したか, 採用した設定名)
+    """
+    gs = backend.exe
+    if gs is None:  # 画質チェックの描画ができないバックエンドは固定設定で
+        in_size, out_size, replaced = compress_in_place(backend, pdf_path, base_preset, min_gain)
+        return in_size, out_size, replaced, "pikepdf"
+    in_size = pdf_path.stat().st_size
+    try:
+        info = analyze_pdf(pdf_path)
+    except Exception:
+        info = {"image_ratio": 1.0, "dpi": 0, "check_page": 1}  # 解析できなければ既定の preset だけ試す
+    cands = choose_candidates(info, base_preset)
+    if not cands:
+        return in_size, in_size, False, "text-only"
+
+    # 候補の出力は in_dir に置くので、失敗・不合格・例外のどれでも最後に必ず消す
+    # （残ると次回の *.pdf に入力として拾われる）
+    outs = {label: pdf_path.with_suffix(f".tmp_{label}.pdf") for label, _ in cands}
+
+    def attempt(label, args, reference):
+        out = outs[label]
+        backend.pdfwrite(args, pdf_path, out)
+        score = psnr(reference, render_gray(gs, out, info["check_page"]))
+        return label, out, out.stat().st_size, score
+
+    try:
+        reference = render_gray(gs, pdf_path, info["check_page"])
+        results = []
+        with ThreadPoolExecutor(max_workers=len(cands)) as ex:
+            for fut in [ex.submit(attempt, label, args, reference) for label, args in cands]:
+                try:
+                    results.append(fut.result())
+                except subprocess.CalledProcessError:
+                    pass
+        passed = [r for r in results if r[3] >= MIN_PSNR]
+        if not passed:
+            return in_size, in_size, False, "no-candidate"
+        best = min(passed, key=lambda r: r[2])
+        _, out_size, replaced = _replace_if_smaller(pdf_path, best[1], min_gain)
+        return in_size, out_size, replaced, f"{best[0]} ({best[3]:.1f}dB)"
+    finally:
+        for out in outs.values():
+            out.unlink(missing_ok=True)
+
+def ledger_key(backend, preset: str, mode: str) -> str:
+    """台帳で「同じ設定で圧縮済み」とみなす単位（pikepdf は画像を縮小しないので別扱い）"""
+    if isinstance(backend, PikepdfBackend):
+        return "pikepdf"
+    return preset if mode == "fixed" else f"auto{preset}"
+
+def process_pdf(backend, pdf: Path, preset: str, ledger: Ledger, force: bool = False, mode: str = "fixed"):
+    """
+    台帳にあれば何もしない（None を返す）。なければ圧縮して
+    (元のハッシュ, 圧縮後のハッシュ, 元のサイズ, 圧縮後のサイズ, 置換したか, 設定名) を返す
+    """
+    key = ledger_key(backend, preset, mode)
+    digest = file_sha256(pdf)
+    if not force and ledger.get(digest, key):
+        return None
+    if mode == "fixed":
+        in_size, out_size, replaced = compress_in_place(backend, pdf, preset, MIN_GAIN)
+        label = key.strip("/")
+    else:
+        in_size, out_size, replaced, label = compress_adaptive(backend, pdf, preset, MIN_GAIN)
+    out_digest = file_sha256(pdf) if replaced else digest
+    return digest, out_digest, in_size, out_size, replaced, label
 
 def move_to_brand_folder(src_pdf: Path):
     """
@@ -124,38 +582,123 @@ def move_to_brand_folder(src_pdf: Path):
     shutil.move(str(src_pdf), str(dst))
     return True, f"{dst}"
 
+def parse_args():
+    ap = argparse.ArgumentParser(description="PDFをGhostscriptで圧縮してメーカー別フォルダへ移動")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                    help="同時に動かす Ghostscript の数（既定: CPU数）")
+    ap.add_argument("--force", action="store_true", help="台帳を無視して圧縮し直す")
+    ap.add_argument("--strategy", choices=["auto", "fixed"], default=strategy,
+                    help="auto: PDFごとに設定を選ぶ / fixed: quality の preset を全ファイルに適用")
+    ap.add_argument("--backend", choices=["subprocess", "server", "pikepdf"], default=backend,
+                    help="subprocess: 1ファイル1プロセス / server: 常駐 gs / pikepdf: プロセス内（画像は縮小しない）")
+    ap.add_argument("--report", type=Path, help="ファイルごとの削減量を書き出すCSV")
+    return ap.parse_args()
+
 def main():
+    args = parse_args()
     # 前提チェック
     if not in_dir.exists():
         print(f"入力フォルダが見つかりません: {in_dir}", file=sys.stderr)
         sys.exit(1)
     target_root.mkdir(parents=True, exist_ok=True)
 
-    gs = find_gs_executable()
-    if not gs:
+    jobs = max(1, args.jobs)
+    try:
+        engine = make_backend(args.backend, jobs, roots=[in_dir])
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if engine is None:
         print("Ghostscript が見つかりません。macなら `brew install ghostscript` 等で導入してください。", file=sys.stderr)
         sys.exit(1)
 
     quality_map = {"screen": "/screen", "ebook": "/ebook", "printer": "/printer", "prepress": "/prepress"}
     preset = quality_map.get(quality.lower(), "/ebook")
 
-    pdfs = list(in_dir.glob("*.pdf"))
+    # 前回中断したときの一時ファイル（*.tmp_gs.pdf / *.tmp_<候補>.pdf）は入力にしない
+    pdfs = [p for p in in_dir.glob("*.pdf") if ".tmp_" not in p.name]
     if not pdfs:
         print("入力フォルダにPDFがありません。")
         return
 
-    for i, pdf in enumerate(pdfs, 1):
+    global GS_SLOTS
+    ledger = Ledger(LEDGER_FILE)
+    GS_SLOTS = threading.BoundedSemaphore(jobs)
+    report = []
+    print(f"{len(pdfs)} 件を {jobs} 並列で圧縮します")
+    started = time.perf_counter()
+    done_bytes = saved_bytes = skipped = compressed = 0  # done_bytes / compressed は実際に圧縮した分だけ（速度用）
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        # Ghostscript は別プロセスなので、スレッドは終了待ちをするだけ
+        futures = {ex.submit(process_pdf, engine, pdf, preset, ledger, args.force, args.strategy): pdf
+                   for pdf in pdfs}
         try:
-            # 1) 同じフォルダで良圧縮（上書き）
-            compress_in_place(gs, pdf, preset)
-            # 2) メーカー別に移動（英語→日本語・型番は英字大文字）
-            ok, msg = move_to_brand_folder(pdf)
-            status = "OK" if ok else "SKIP"
-            print(f"[{i}/{len(pdfs)}] {status}: {pdf.name} -> {msg}")
-        except subprocess.CalledProcessError as e:
-            print(f"[{i}/{len(pdfs)}] 失敗（Ghostscript）: {pdf.name} ({e})", file=sys.stderr)
-        except Exception as e:
-            print(f"[{i}/{len(pdfs)}] 失敗: {pdf.name} ({e})", file=sys.stderr)
+            for i, fut in enumerate(as_completed(futures), 1):
+                pdf = futures[fut]
+                try:
+                    # 1) 同じフォルダで良圧縮（上書き）。台帳にあればスキップ
+                    result = fut.result()
+                    if result is None:
+                        skipped += 1
+                        note = "圧縮済み"
+                    else:
+                        digest, out_digest, in_size, out_size, replaced, label = result
+                        done_bytes += in_size
+                        compressed += 1
+                        key = ledger_key(engine, preset, args.strategy)
+                        ledger.record({digest, out_digest}, key, pdf.name, in_size, out_size,
+                                      "compressed" if replaced else "original")
+                        ledger.save()  # 1件ごとに保存（中断しても終わった分は次回スキップ）
+                        saved = in_size - out_size if replaced else 0
+                        saved_bytes += saved
+                        report.append([pdf.name, label, in_size, out_size if replaced else in_size, saved])
+                        if replaced:
+                            note = f"{label}: {in_size / 1024:.0f}KB→{out_size / 1024:.0f}KB"
+                        else:
+                            note = f"{label}: 効果小のため元のまま（{out_size / max(in_size, 1):.0%}）"
+                    # 2) メーカー別に移動（英語→日本語・型番は英字大文字）
+                    #    移動はメインスレッドで1件ずつ行うので、同名の移動先が競合しない
+                    ok, msg = move_to_brand_folder(pdf)
+                    status = "OK" if ok else "SKIP"
+                    elapsed = max(time.perf_counter() - started, 1e-9)
+                    rate = f"{done_bytes / 1024 / 1024 / elapsed:.1f} MB/s, {compressed / elapsed:.2f} files/s"
+                    print(f"[{i}/{len(pdfs)}] {status}: {pdf.name} -> {msg} [{note}] ({rate})")
+                except subprocess.CalledProcessError as e:
+                    print(f"[{i}/{len(pdfs)}] 失敗（Ghostscript）: {pdf.name} ({e})", file=sys.stderr)
+                except Exception as e:
+                    print(f"[{i}/{len(pdfs)}] 失敗: {pdf.name} ({e})", file=sys.stderr)
+        except KeyboardInterrupt:
+            # 待っている分は捨てて止める（動いている gs の終了だけ待つ）
+            print("中断しました。残りは次回の実行で処理します", file=sys.stderr)
+            ex.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            ledger.save()
+            engine.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"完了: {len(pdfs)} 件（圧縮済みスキップ {skipped} 件）/ 圧縮 {compressed} 件 {done_bytes / 1024 / 1024:.1f} MB / "
+          f"{elapsed:.1f} 秒 ({done_bytes / 1024 / 1024 / max(elapsed, 1e-9):.1f} MB/s, "
+          f"{compressed / max(elapsed, 1e-9):.2f} files/s) / 削減 {saved_bytes / 1024 / 1024:.1f} MB")
+    write_report(report, args.report)
+
+def write_report(rows, path: Path | None):
+    """ファイルごとの削減量（と合計）を表示し、path があれば CSV に保存"""
+    if not rows:
+        return
+    total_in = sum(r[2] for r in rows)
+    total_out = sum(r[3] for r in rows)
+    print("\n--- 削減レポート ---")
+    for name, label, in_size, out_size, saved in sorted(rows, key=lambda r: -r[4]):
+        print(f"{saved / 1024:10.0f} KB  {out_size / max(in_size, 1):5.0%}  {label:<20} {name}")
+    print(f"合計: {total_in / 1024 / 1024:.1f} MB → {total_out / 1024 / 1024:.1f} MB "
+          f"（{(total_in - total_out) / 1024 / 1024:.1f} MB 削減）")
+    if path:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["file", "strategy", "in_bytes", "out_bytes", "saved_bytes"])
+            w.writerows(rows)
+            w.writerow(["TOTAL", "", total_in, total_out, total_in - total_out])
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
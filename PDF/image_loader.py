@@ -0,0 +1,102 @@
+# image_loader.py
+# 縮小して使う画像を、必要な大きさに近い解像度で直接読み込む（同じフォルダの 画像を纏めてPDF化_* 用）。
+#  - JPEG: draft() で DCT の段階で 1/2・1/4・1/8 に縮めて decode（最終サイズより小さくはしない）
+#  - HEIC: 十分な大きさのサムネイルが入っていればそれを decode（pillow-heif があるとき）
+#  - EXIF の回転は反映済みで返す（縦向きのスマホ写真も表示どおりの向き）
+# 仕上げの LANCZOS 縮小は呼び出し側で行う。
+# JPEG を decode せずに PDF へそのまま埋め込むときの判定と置き場所の計算もここに置く。
+# 例:
+#   from image_loader import load_fitted
+#   im = load_fitted(path, (2481, 3507))  # A4 300dpi に収める用
+#   info = jpeg_passthrough_info(path)    # そのまま埋め込めるなら (幅, 高さ, 向き, モード)
+
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+# --- HEICをPillowで開けるように登録 ---
+HEIF_OK = False
+try:
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+    HEIF_OK = True
+except Exception:
+    # pillow-heif未導入でも他拡張子は動く。HEICに当たったらエラーにする。
+    pass
+
+ORIENTATION = 0x0112
+SWAPPED = {5, 6, 7, 8}  # 90度回転（縦横が入れ替わる）向き
+
+def _stored_size(im: Image.Image, size: tuple[int, int]) -> tuple[int, int]:
+    """表示上の大きさ size を、ファイルに保存されている向きでの大きさにする"""
+    try:
+        orientation = im.getexif().get(ORIENTATION, 1)
+    except Exception:
+        orientation = 1
+    return (size[1], size[0]) if orientation in SWAPPED else size
+
+def _reduce(im: Image.Image, need: tuple[int, int]) -> Image.Image:
+    """表示上 need（横,縦）以上あれば足りるところまで、decode する大きさを下げる"""
+    stored_need = _stored_size(im, need)
+    if im.format == "JPEG":
+        im.draft(im.mode, stored_need)
+    elif HEIF_OK and im.format == "HEIF":
+        try:
+            im = pillow_heif.thumbnail(im, min_box=max(stored_need))
+        except Exception:
+            pass  # サムネイルが使えない版・ファイルは普通に読む
+    return im
+
+def load_fitted(path: str | Path, box: tuple[int, int], transpose: bool = True) -> Image.Image:
+    """box（横,縦）に縦横比を保って収めるのに足りる解像度で読み込む（拡大が必要なら元のまま）"""
+    im = Image.open(path)
+    w, h = _stored_size(im, im.size)
+    ratio = min(box[0] / w, box[1] / h)
+    if ratio < 1:
+        im = _reduce(im, (max(1, int(w * ratio)), max(1, int(h * ratio))))
+    im.load()
+    return ImageOps.exif_transpose(im) if transpose else im
+
+# --- JPEG をそのまま PDF に埋め込む用 ---
+# PDF の画像は 1×1 の正方形に描かれ、cm 行列で置き場所が決まる。
+# EXIF の向きごとの (横方向 x, y, 縦方向 x, y, 左下の x, y)。表示枠の幅・高さを 1 とした座標
+UNIT_PLACEMENT = {
+    1: (1, 0, 0, 1, 0, 0),
+    2: (-1, 0, 0, 1, 1, 0),     # 左右反転
+    3: (-1, 0, 0, -1, 1, 1),    # 180度
+    4: (1, 0, 0, -1, 0, 1),     # 上下反転
+    5: (0, -1, -1, 0, 1, 1),
+    6: (0, -1, 1, 0, 0, 1),     # 時計回りに90度
+    7: (0, 1, 1, 0, 0, 0),
+    8: (0, 1, -1, 0, 1, 0),     # 反時計回りに90度
+}
+
+def jpeg_passthrough_info(path: str | Path) -> tuple[int, int, int, str] | None:
+    """
+    decode せずに埋め込める JPEG（RGB・グレー）なら (保存上の幅, 高さ, EXIF の向き, モード) を返す。
+    CMYK（Adobe の色反転があり、そのままでは色が変わることがある）や JPEG 以外は None。
+    ヘッダーだけ読む。
+    """
+    try:
+        with Image.open(path) as im:
+            if im.format != "JPEG" or im.mode not in ("RGB", "L"):
+                return None
+            try:
+                orientation = im.getexif().get(ORIENTATION, 1)
+            except Exception:
+                orientation = 1
+            return im.width, im.height, orientation if orientation in UNIT_PLACEMENT else 1, im.mode
+    except Exception:
+        return None
+
+def placement_matrix(size: tuple[int, int], orientation: int,
+                     box: tuple[float, float, float, float]) -> tuple[float, ...]:
+    """保存上の大きさ size の画像を、表示どおりの向きで box（x, y, 幅, 高さ。y は上向き）の中央に
+    縦横比を保って収める cm 行列"""
+    w, h = (size[1], size[0]) if orientation in SWAPPED else size
+    bx, by, bw, bh = box
+    ratio = min(bw / w, bh / h)
+    dw, dh = w * ratio, h * ratio
+    x0, y0 = bx + (bw - dw) / 2, by + (bh - dh) / 2
+    a, b, c, d, e, f = UNIT_PLACEMENT[orientation]
+    return a * dw, b * dh, c * dw, d * dh, x0 + e * dw, y0 + f * dh
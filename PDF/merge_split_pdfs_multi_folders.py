@@ -1,16 +1,22 @@
 # merge_split_pdfs_multi_folders_no_merger_recursive.py
 # サブフォルダもまとめて処理したいときは RECURSIVE=True（既定がTrue）。
+# フォルダは os.scandir で1回だけ辿り、見つけたグループから順に複数プロセスで結合する（MERGE_WORKERS）。
+# 結合は pdf_stream_writer.merge_dedup（パートごとに重複しているフォント・画像を1つにまとめ、
+# 再圧縮せずに書き出す）。MERGE_ENGINE = "pypdf" で従来の PdfWriter に戻せる。
 
-import re, json
+import os, re, json
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
-from tkinter import Tk, filedialog, messagebox
 from pypdf import PdfReader, PdfWriter
+from pdf_stream_writer import merge_dedup
 
 HISTORY_FILE = Path("last_folders.json")
 HISTORY_MAX = 10
 OVERWRITE_OUTPUT = True
 DELETE_PARTS = True
 RECURSIVE = True  # ★ Trueでサブフォルダも全部処理
+MERGE_WORKERS = os.cpu_count() or 1  # 同時に結合するグループ数（1なら順番に）
+MERGE_ENGINE = "dedup"  # "dedup"（重複をまとめて逐次書き出し）/ "pypdf"（従来）
 PART_PATTERN = re.compile(r"^(?P<base>.+)-(?P<start>\d+)-(?P<end>\d+)\.pdf$", re.IGNORECASE)
 
 def load_history() -> list[str]:
@@ -36,6 +42,7 @@ def save_history(paths: list[Path]):
     HISTORY_FILE.write_text(json.dumps({"last_folders": merged}, ensure_ascii=False, indent=2), encoding="utf-8")
 
 def choose_folders() -> list[Path]:
+    from tkinter import Tk, filedialog, messagebox  # GUIを使うときだけ読み込む（pdf_batch.py からは使わない）
     chosen: list[Path] = []
     history = load_history()
     init_dir = history[0] if history else "/"
@@ -59,19 +66,64 @@ def choose_folders() -> list[Path]:
     save_history(chosen)
     return chosen
 
-def find_part_groups(folder: Path) -> dict[str, list[tuple[int,int,Path]]]:
-    """このフォルダ直下の分割PDFを base ごとにグループ化"""
-    groups: dict[str, list[tuple[int,int,Path]]] = {}
-    for p in folder.glob("*.pdf"):
-        m = PART_PATTERN.match(p.name)
-        if not m:
+def iter_part_groups(root: Path, recursive: bool = RECURSIVE):
+    """
+    root 以下を os.scandir で1回だけ辿り、分割PDFのグループを見つけたそばから
+    (フォルダ, base, [(start, end, path), ...]) で返す。フォルダ一覧を先に作らないので大きな木でもすぐ始まる
+    """
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        groups: dict[str, list[tuple[int,int,Path]]] = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(Path(entry.path))
+                        continue
+                    m = PART_PATTERN.match(entry.name)
+                    if m:
+                        groups.setdefault(m.group("base"), []).append(
+                            (int(m.group("start")), int(m.group("end")), Path(entry.path)))
+        except OSError as e:
+            print(f"[警告] 読めないフォルダ: {folder} ({e})")
             continue
-        base = m.group("base")
-        start = int(m.group("start")); end = int(m.group("end"))
-        groups.setdefault(base, []).append((start, end, p))
-    return groups
+        for base, parts in groups.items():
+            yield folder, base, parts
+
+def run_merges(groups, workers: int = MERGE_WORKERS, **options) -> list[dict]:
+    """
+    グループを受け取った順にプロセスプールへ流し、merge_group の結果を終わった順に返す。先読みは workers*2 件まで。
+    options（overwrite / delete_parts / engine）は子プロセスでも同じになるよう毎回渡す
+    """
+    options = {"overwrite": OVERWRITE_OUTPUT, "delete_parts": DELETE_PARTS, "engine": MERGE_ENGINE, **options}
+    if workers <= 1:
+        return [merge_group(base, parts, folder, **options) for folder, base, parts in groups]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending = {}
+        def collect(done):
+            for fut in done:
+                folder, base = pending.pop(fut)
+                if fut.exception() is not None:
+                    print(f"結合失敗: {folder} / {base} ({fut.exception()})")
+                    results.append({"folder": str(folder), "base": base, "status": "failed",
+                                    "output": None, "parts": [], "error": str(fut.exception())})
+                else:
+                    results.append(fut.result())
+        for folder, base, parts in groups:
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[ex.submit(merge_group, base, parts, folder, **options)] = (folder, base)
+        collect(wait(pending).done)
+    return results
 
-def merge_with_writer(input_paths: list[Path], output_path: Path):
+def merge_with_writer(input_paths: list[Path], output_path: Path, engine: str | None = None):
+    if (engine or MERGE_ENGINE) == "dedup":
+        merge_dedup(input_paths, output_path)
+        return
     writer = PdfWriter()
     for ip in input_paths:
         r = PdfReader(str(ip))
@@ -83,43 +135,46 @@ def merge_with_writer(input_paths: list[Path], output_path: Path):
     with open(output_path, "wb") as f:
         writer.write(f)
 
-def merge_group(base: str, parts: list[tuple[int,int,Path]], folder: Path):
+def merge_group(base: str, parts: list[tuple[int,int,Path]], folder: Path,
+                overwrite: bool = OVERWRITE_OUTPUT, delete_parts: bool = DELETE_PARTS, engine: str | None = None) -> dict:
+    """
+    1グループを結合する。結果を辞書で返す:
+    {"folder", "base", "status": merged/skipped/failed, "output", "parts": [元のパート], "error", "warnings"}
+    """
     parts_sorted = sorted(parts, key=lambda t: t[0])
+    result = {"folder": str(folder), "base": base, "status": "skipped", "output": None,
+              "parts": [str(p) for _,_,p in parts_sorted], "error": None, "warnings": []}
     for i in range(1, len(parts_sorted)):
         if parts_sorted[i][0] != parts_sorted[i-1][1] + 1:
-            print(f"警告: {folder} の {base} に隙間/重複の可能性 "
-                  f"({parts_sorted[i-1][1]} -> {parts_sorted[i][0]})")
+            msg = f"隙間/重複の可能性 ({parts_sorted[i-1][1]} -> {parts_sorted[i][0]})"
+            result["warnings"].append(msg)
+            print(f"警告: {folder} の {base} に{msg}")
 
     out_path = folder / f"{base}.pdf"
     if out_path.exists():
-        if OVERWRITE_OUTPUT:
+        if overwrite:
             try: out_path.unlink()
             except Exception as e:
-                print(f"出力上書き失敗: {out_path} ({e})"); return
+                print(f"出力上書き失敗: {out_path} ({e})")
+                return {**result, "status": "failed", "error": f"出力上書き失敗: {e}"}
         else:
-            print(f"スキップ（既存）: {out_path}"); return
+            print(f"スキップ（既存）: {out_path}"); return result
 
     try:
-        merge_with_writer([p for _,_,p in parts_sorted], out_path)
+        merge_with_writer([p for _,_,p in parts_sorted], out_path, engine)
         print(f"[結合] {out_path}")
-        if DELETE_PARTS:
+        result.update(status="merged", output=str(out_path))
+        if delete_parts:
             for _,_,p in parts_sorted:
                 try: p.unlink(); print(f"  削除: {p.name}")
                 except Exception as e: print(f"  削除失敗: {p.name} ({e})")
     except Exception as e:
         print(f"結合失敗: {folder} / {base} ({e})")
+        result.update(status="failed", error=str(e))
         if out_path.exists():
             try: out_path.unlink()
             except Exception: pass
-
-def process_one_folder(folder: Path):
-    groups = find_part_groups(folder)
-    if not groups:
-        # 分割PDFが無ければ情報表示のみ
-        # print(f"[情報] 分割PDFなし: {folder}")
-        return
-    for base, parts in groups.items():
-        merge_group(base, parts, folder)
+    return result
 
 def main():
     try:
@@ -132,13 +187,8 @@ def main():
             print(f"[警告] 存在しないフォルダ: {root}")
             continue
         print(f"\n=== ({ri}/{len(roots)}) ルート: {root} ===")
-        if RECURSIVE:
-            # ルート自身＋全サブフォルダを処理
-            to_process = [root] + [p for p in root.rglob("*") if p.is_dir()]
-        else:
-            to_process = [root]
-        for folder in to_process:
-            process_one_folder(folder)
+        # ルート自身（RECURSIVE なら全サブフォルダも）を辿りながら結合
+        run_merges(iter_part_groups(root, RECURSIVE), MERGE_WORKERS)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
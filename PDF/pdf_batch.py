@@ -0,0 +1,209 @@
+# pdf_batch.py
+# PDFツールをダイアログなしで動かす入口（サーバーや一括ジョブ用）。tkinter は読み込まない。
+# 対象はフォルダ・ファイル・glob パターンをそのまま並べるか、--manifest で一覧ファイルを渡す
+# （1行1件のテキスト、# 以降はコメント / または文字列の JSON 配列）。
+# 結果は1件ごとの JSON レポートにまとめ、--report に書く（省略時は標準出力）。失敗があれば終了コード 1。
+# 例:
+#   python pdf_batch.py split "/data/scans/**/*.pdf" --max-mb 20 --report split.json
+#   python pdf_batch.py merge /data/scans --workers 8
+#   python pdf_batch.py img2pdf /data/photos/2024 --out /data/pdf          # 直下のサブフォルダごとに1PDF
+#   python pdf_batch.py img2pdf /data/photos/a /data/photos/b --out /data/pdf --folders  # フォルダごとに1PDF
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+def read_manifest(path: Path) -> list[str]:
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() == ".json":
+        data = json.loads(text)
+        return [str(x) for x in (data.get("inputs", []) if isinstance(data, dict) else data)]
+    lines = (line.split("#", 1)[0].strip() for line in text.splitlines())
+    return [line for line in lines if line]
+
+def expand(inputs: list[str], manifest: Path | None) -> list[Path]:
+    """glob パターンを展開し、重複を除いて指定順に並べる"""
+    items = list(inputs) + (read_manifest(manifest) if manifest else [])
+    paths: list[Path] = []
+    for item in items:
+        if glob.has_magic(item):
+            matches = sorted(glob.glob(item, recursive=True))
+            if not matches:
+                print(f"[警告] 一致なし: {item}", file=sys.stderr)
+            paths += [Path(m) for m in matches]
+        else:
+            paths.append(Path(item))
+    seen, unique = set(), []
+    for p in paths:
+        key = p.resolve()
+        if key not in seen:
+            seen.add(key)
+            unique.append(p)
+    return unique
+
+def timed(fn, *args, **kwargs) -> dict:
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    result["seconds"] = round(time.perf_counter() - t0, 3)
+    return result
+
+# --- split ---
+def run_split(args, targets: list[Path]) -> list[dict]:
+    import split_every_50_pages as sp
+    pdfs = []
+    for t in targets:
+        pdfs += sorted(t.glob("*.pdf")) if t.is_dir() else [t]
+    return [timed(sp.split_pdf, pdf, args.chunk, args.workers, args.max_mb, not args.keep_original)
+            for pdf in pdfs]
+
+# --- merge ---
+def run_merge(args, targets: list[Path]) -> list[dict]:
+    import merge_split_pdfs_multi_folders as mg
+    results = []
+    for root in targets:
+        if not root.is_dir():
+            results.append({"folder": str(root), "status": "failed", "error": "フォルダではない"})
+            continue
+        t0 = time.perf_counter()
+        results += mg.run_merges(mg.iter_part_groups(root, not args.no_recursive), args.workers,
+                                 overwrite=not args.no_overwrite, delete_parts=not args.keep_parts,
+                                 engine=args.engine)
+        print(f"{root}: {time.perf_counter() - t0:.1f} 秒", file=sys.stderr)
+    return results
+
+# --- img2pdf ---
+def run_img2pdf(args, targets: list[Path]) -> list[dict]:
+    import 画像を纏めてPDF化_複数フォルダ用 as img
+    if args.out is None:
+        raise SystemExit("img2pdf には --out（PDFの保存先フォルダ）が必要です")
+    folders = []
+    for t in targets:
+        if not t.is_dir():
+            folders.append(t)  # 下でエラーとして記録
+        elif args.folders:
+            folders.append(t)
+        else:
+            folders += sorted((p for p in t.iterdir() if p.is_dir()), key=lambda p: img.natural_key(p.name))
+
+    def failed(folder: Path, error: str) -> dict:
+        return {"input": str(folder), "status": "failed", "output": None, "images": 0,
+                "skipped": [], "error": error, "seconds": 0.0}
+
+    results: list[dict | None] = []
+    jobs, slots = [], []      # slots: jobs の各件が results のどこに入るか（入力順のまま出す）
+    taken: set[Path] = set()  # 同じ名前のフォルダ（/a/2024 と /b/2024）が同じPDFに書かないように
+    for folder in folders:
+        if folder.is_dir():
+            out_pdf = img.unique_path(args.out / f"{folder.name}.pdf", taken)
+            taken.add(out_pdf)
+            jobs.append((folder, out_pdf))
+            slots.append(len(results))
+            results.append(None)
+        else:
+            results.append(failed(folder, "フォルダではない"))
+    # 全フォルダの画像をまとめてプロセスプールに流す（画像を纏めてPDF化_複数フォルダ用.run_folder_jobs）。
+    # 失敗はフォルダごとに記録し、ほかのフォルダは続ける
+    try:
+        folder_jobs = img.run_folder_jobs(jobs, dpi=args.dpi, workers=args.workers,
+                                          passthrough=not args.raster)
+    except Exception as e:  # プロセスプール自体が動かないなど
+        for slot, (folder, _) in zip(slots, jobs):
+            results[slot] = failed(folder, str(e))
+        return results
+    for slot, (folder, out_pdf), fj in zip(slots, jobs, folder_jobs):
+        if fj.error:
+            results[slot] = {**failed(folder, fj.error), "images": fj.ok,
+                             "seconds": round(fj.seconds, 3)}
+            continue
+        results[slot] = {"input": str(folder), "status": "converted" if fj.ok else "skipped",
+                         "output": str(out_pdf) if fj.ok else None, "images": fj.ok,
+                         "skipped": [{"file": n, "error": e} for n, e in fj.skipped], "error": None,
+                         "seconds": round(fj.seconds, 3)}
+    return results
+
+COMMANDS = {"split": run_split, "merge": run_merge, "img2pdf": run_img2pdf}
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="PDFツールの一括実行（ダイアログなし）")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("inputs", nargs="*", help="フォルダ・ファイル・glob パターン（** 可）")
+        p.add_argument("--manifest", type=Path, help="対象の一覧（テキスト1行1件 / JSON 配列）")
+        p.add_argument("--report", default="-", help="JSON レポートの保存先（- で標準出力）")
+
+    p = sub.add_parser("split", help="PDFを分割（split_every_50_pages.py）")
+    common(p)
+    p.add_argument("--chunk", type=int, default=50, help="1パートのページ数")
+    p.add_argument("--max-mb", type=float, default=0, help=">0 ならこのサイズ以下を目安に分割")
+    p.add_argument("--workers", type=int, default=1, help="1ファイルのパートを書き出すプロセス数")
+    p.add_argument("--keep-original", action="store_true", help="分割後も元PDFを残す")
+
+    p = sub.add_parser("merge", help="分割PDFを結合（merge_split_pdfs_multi_folders.py）")
+    common(p)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--no-recursive", action="store_true", help="サブフォルダは見ない")
+    p.add_argument("--no-overwrite", action="store_true", help="結合先が既にあればスキップ")
+    p.add_argument("--keep-parts", action="store_true", help="結合後もパートを残す")
+    p.add_argument("--engine", choices=["dedup", "pypdf"], default="dedup")
+
+    p = sub.add_parser("img2pdf", help="画像フォルダをA4 PDFに（画像を纏めてPDF化_*）")
+    common(p)
+    p.add_argument("--out", type=Path, help="PDFの保存先フォルダ")
+    p.add_argument("--folders", action="store_true",
+                   help="指定フォルダ自体を1PDFにする（既定は直下のサブフォルダごと）")
+    p.add_argument("--dpi", type=int, default=300)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="画像を処理するプロセス数")
+    p.add_argument("--raster", action="store_true",
+                   help="JPEG もそのまま埋め込まず、A4 画像に描き直す（以前の方法）")
+    return ap.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # 結合・分割の各スクリプトはこのファイルと同じフォルダにある
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    targets = expand(args.inputs, args.manifest)
+    if not targets:
+        print("対象がありません。", file=sys.stderr)
+        return 2
+
+    started = datetime.now()
+    t0 = time.perf_counter()
+    # 各ツールの進行表示は標準エラーへ（標準出力はレポート用に空けておく）。
+    # 子プロセスの print も同じになるよう、ファイル記述子ごと付け替える
+    sys.stdout.flush()
+    saved = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        jobs = COMMANDS[args.command](args, targets)
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+    counts: dict[str, int] = {}
+    for job in jobs:
+        counts[job.get("status", "unknown")] = counts.get(job.get("status", "unknown"), 0) + 1
+    report = {
+        "command": args.command,
+        "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "started_at": started.isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - t0, 3),
+        "summary": counts,
+        "jobs": jobs,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report == "-":
+        print(text)
+    else:
+        Path(args.report).write_text(text, encoding="utf-8")
+        print(f"レポート: {args.report} {counts}", file=sys.stderr)
+    return 1 if counts.get("failed") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
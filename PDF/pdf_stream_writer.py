@@ -0,0 +1,314 @@
+# pdf_stream_writer.py
+# PDFを前から順にファイルへ書き出していく小さなライター。
+# オブジェクトは書いたそばからディスクに出し、メモリには番号→位置（xref 用）だけ残す。
+#  - StreamingPdfWriter: オブジェクト番号の払い出し・書き込み・最後に xref と trailer
+#  - merge_dedup: 分割PDFなどを結合する。各入力のオブジェクトを番号を付け替えてコピーし、
+#    内容が同じもの（パートごとに入っているフォント・画像など）は1つだけ書く。
+#    ストリームは圧縮されたまま写すので再圧縮はしない。入力のページ一覧にないページ
+#    （他のパートへのリンク先など）は写さず、参照は null にする
+#  - ImagePdfWriter: JPEG 1枚を1ページにして書く（画像フォルダ → PDF）。画像はページごとに
+#    ディスクへ出すので、何ページあってもメモリは一定
+#  - Progress: 書いたページ数と ページ/秒 の表示
+# 例:
+#   from pdf_stream_writer import merge_dedup
+#   merge_dedup([Path("a-1-50.pdf"), Path("a-51-100.pdf")], Path("a.pdf"))
+#   w = ImagePdfWriter(Path("photos.pdf"))
+#   w.add_jpeg_page(Path("IMG_0001.jpg"), (4032, 3024), "RGB", matrix)
+#   w.close()
+
+import hashlib
+import io
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from pypdf import PdfReader
+from pypdf.generic import (ArrayObject, DictionaryObject, EncodedStreamObject, IndirectObject,
+                           NameObject, StreamObject)
+
+class StreamingPdfWriter:
+    def __init__(self, path: Path, version: str = "1.7"):
+        self.f = open(path, "wb")
+        self.f.write(f"%PDF-{version}\n%\xe2\xe3\xcf\xd3\n".encode("latin-1"))
+        self.offsets: list[int | None] = [None]  # 番号 → ファイル内の位置（0番は欠番）
+
+    def reserve(self) -> int:
+        """中身より先に番号だけ決める（ページと親 /Pages のように互いを参照するとき用）"""
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def write(self, num: int, body: bytes):
+        self.offsets[num] = self.f.tell()
+        self.f.write(b"%d 0 obj\n" % num)
+        self.f.write(body)
+        self.f.write(b"\nendobj\n")
+
+    def add(self, body: bytes) -> int:
+        num = self.reserve()
+        self.write(num, body)
+        return num
+
+    def write_stream(self, num: int, entries: bytes, data: bytes | Path):
+        """ストリームを書く。data がファイルなら読み込まずに少しずつ写す"""
+        length = len(data) if isinstance(data, bytes) else Path(data).stat().st_size
+        self.offsets[num] = self.f.tell()
+        self.f.write(b"%d 0 obj\n<<%s /Length %d>>\nstream\n" % (num, entries, length))
+        if isinstance(data, bytes):
+            self.f.write(data)
+        else:
+            with open(data, "rb") as src:
+                shutil.copyfileobj(src, self.f, 1024 * 1024)
+        self.f.write(b"\nendstream\nendobj\n")
+
+    def close(self, root: int, info: int | None = None):
+        """xref と trailer を書いて閉じる。予約したまま書かなかった番号は null にする"""
+        for num, off in enumerate(self.offsets):
+            if num and off is None:
+                self.write(num, b"null")
+        xref = self.f.tell()
+        out = [b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets)]
+        out += [b"%010d 00000 n \n" % off for off in self.offsets[1:]]
+        trailer = b"/Size %d /Root %d 0 R" % (len(self.offsets), root)
+        if info is not None:
+            trailer += b" /Info %d 0 R" % info
+        out.append(b"trailer\n<< " + trailer + b" >>\nstartxref\n%d\n%%%%EOF\n" % xref)
+        self.f.write(b"".join(out))
+        self.f.close()
+
+def _primitive(obj) -> bytes:
+    buf = io.BytesIO()
+    obj.write_to_stream(buf)
+    return buf.getvalue()
+
+NULL = 0  # mapping でこの番号になったものは写さず null と書く（入力のページ以外の /Page）
+
+def _indirect_children(obj):
+    """obj の中（直接オブジェクトの入れ子を含む）にある間接参照を順に返す"""
+    stack = [obj]
+    while stack:
+        v = stack.pop()
+        if isinstance(v, IndirectObject):
+            yield v
+        elif isinstance(v, DictionaryObject):
+            stack.extend(v.raw_get(k) for k in reversed(list(v)))
+        elif isinstance(v, ArrayObject):
+            stack.extend(reversed(v))
+
+class DedupMerger:
+    """入力PDFを順に append() して close()。内容のハッシュが同じオブジェクトは最初の1つを使い回す"""
+    def __init__(self, output_path: Path):
+        self.out = StreamingPdfWriter(output_path)
+        self.pages_root = self.out.reserve()
+        self.kids: list[int] = []
+        self.seen: dict[bytes, int] = {}   # 内容のハッシュ → 書いた番号
+        self.info: int | None = None
+        self.written = self.reused = 0
+
+    def append(self, path: Path):
+        with open(path, "rb") as fh:
+            reader = PdfReader(fh)
+            if getattr(reader, "is_encrypted", False):
+                try:
+                    reader.decrypt("")
+                except Exception:
+                    raise RuntimeError(f"暗号化で結合不可: {path.name}")
+            self.mapping: dict[int, int] = {}  # この入力の番号 → 出力の番号
+            self.pinned: dict[int, int] = {}   # 循環参照のため先に番号を決めたもの（共有しない）
+            self.active: set[int] = set()
+            pages = list(reader.pages)
+            # ページ番号は先に決めておく（注釈の /P やリンク先から参照される）
+            for page in pages:
+                self.mapping[page.indirect_reference.idnum] = self.out.reserve()
+            for page in pages:
+                num = self.mapping[page.indirect_reference.idnum]
+                entries = [(k, page.raw_get(k)) for k in page if k != "/Parent"]
+                body = self._dict(entries)[:-2] + b"/Parent %d 0 R>>" % self.pages_root
+                self.out.write(num, body)
+                self.kids.append(num)
+            # 文書情報（タイトル等）は最初の入力のものを使う
+            info = reader.trailer.raw_get("/Info") if "/Info" in reader.trailer else None
+            if self.info is None and isinstance(info, IndirectObject):
+                self.info = self._ref(info) or None
+            reader.resolved_objects.clear()
+
+    def _ref(self, ref: IndirectObject) -> int:
+        """
+        ref を出力に写して番号を返す。参照先を先に書く（番号が内容のハッシュで決まる）ので
+        深さ優先で辿るが、リンク注釈などで長く連なっていても再帰しないように明示的なスタックを使う
+        """
+        stack = []
+        self._visit(ref, stack)
+        while stack:
+            key, obj, children = stack[-1]
+            for child in children:
+                if self._visit(child, stack):
+                    break
+            else:  # 参照先はすべて番号が決まった
+                stack.pop()
+                self.active.discard(key)
+                self._emit(key, obj)
+        return self.mapping[ref.idnum]
+
+    def _visit(self, ref: IndirectObject, stack: list) -> bool:
+        """まだ写していなければ stack に積んで True。番号がすぐ決まるものは False"""
+        key = ref.idnum
+        if key in self.mapping:
+            return False
+        if key in self.active:  # 自分を参照し返すオブジェクト: 番号だけ先に決める
+            self.pinned[key] = self.mapping[key] = self.out.reserve()
+            return False
+        obj = ref.get_object()
+        if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Pages":
+            self.mapping[key] = self.pages_root  # 入力のページツリーは出力の /Pages に付け替える
+            return False
+        if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page":
+            # 入力のページ一覧にないページ（他のパートへのリンク先など）は写さない
+            self.mapping[key] = NULL
+            return False
+        self.active.add(key)
+        stack.append((key, obj, _indirect_children(obj)))
+        return True
+
+    def _emit(self, key: int, obj):
+        body = self._serialize(obj)
+        if key in self.pinned:
+            self.out.write(self.pinned[key], body)
+            self.written += 1
+            return
+        digest = hashlib.sha256(body).digest()
+        num = self.seen.get(digest)
+        if num is None:
+            num = self.seen[digest] = self.out.add(body)
+            self.written += 1
+        else:
+            self.reused += 1
+        self.mapping[key] = num
+
+    def _dict(self, items) -> bytes:
+        parts = [b"<<"]
+        for k, v in (items.items() if isinstance(items, dict) else items):
+            parts.append(_primitive(NameObject(k)) + b" " + self._value(v))
+        parts.append(b">>")
+        return b"".join(parts)
+
+    def _value(self, v) -> bytes:
+        if isinstance(v, IndirectObject):
+            num = self._ref(v)
+            return b"null" if num == NULL else b"%d 0 R" % num
+        if isinstance(v, StreamObject):
+            raise ValueError("ストリームは間接オブジェクトでなければならない")
+        if isinstance(v, DictionaryObject):
+            return self._dict({k: v.raw_get(k) for k in v})
+        if isinstance(v, ArrayObject):
+            return b"[" + b" ".join(self._value(x) for x in v) + b"]"
+        return _primitive(v)
+
+    def _serialize(self, obj) -> bytes:
+        if isinstance(obj, StreamObject):
+            if isinstance(obj, EncodedStreamObject):
+                data = obj._data  # 圧縮されたまま
+                skip = {"/Length"}
+            else:
+                data = obj.get_data()
+                skip = {"/Length", "/Filter", "/DecodeParms"}
+            entries = [(k, obj.raw_get(k)) for k in obj if k not in skip]
+            head = self._dict(entries)[:-2] + b"/Length %d>>" % len(data)
+            return head + b"\nstream\n" + data + b"\nendstream"
+        if isinstance(obj, DictionaryObject):
+            return self._dict({k: obj.raw_get(k) for k in obj})
+        return self._value(obj)
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % k for k in self.kids)
+        self.out.write(self.pages_root, b"<</Type /Pages /Kids [" + kids + b"] /Count %d>>" % len(self.kids))
+        root = self.out.add(b"<</Type /Catalog /Pages %d 0 R>>" % self.pages_root)
+        self.out.close(root, self.info)
+
+def merge_dedup(input_paths: list[Path], output_path: Path) -> dict:
+    """input_paths を順に結合して output_path に書く。書いた数・使い回した数を返す"""
+    merger = DedupMerger(output_path)
+    try:
+        for ip in input_paths:
+            merger.append(ip)
+    except BaseException:
+        merger.out.f.close()
+        raise
+    merger.close()
+    return {"pages": len(merger.kids), "written": merger.written, "reused": merger.reused}
+
+# --- 画像フォルダ → PDF ---
+A4_PT = (595.27, 841.89)
+COLOR_SPACES = {"RGB": b"/DeviceRGB", "L": b"/DeviceGray"}
+
+def _num(v: float) -> bytes:
+    return (b"%.4f" % v).rstrip(b"0").rstrip(b".") or b"0"
+
+class ImagePdfWriter:
+    """
+    JPEG を1枚ずつページにして書き出す。各ページの画像・内容・ページはその場でディスクに出し、
+    残すのは番号と位置だけ。書いている間は 〜.pdf.part に書き、close() で置き換える
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".part")
+        self.out = StreamingPdfWriter(self.tmp)
+        self.pages_root = self.out.reserve()
+        self.kids: list[int] = []
+
+    def add_jpeg_page(self, jpeg: bytes | Path, size: tuple[int, int], mode: str = "RGB",
+                      matrix: tuple[float, ...] | None = None, page_size: tuple[float, float] = A4_PT):
+        """
+        jpeg（バイト列かファイル）を DCTDecode の画像としてそのまま入れ、1ページ書く。
+        size は画像のピクセル数、matrix は置き場所の cm 行列（省略するとページ全面）
+        """
+        if matrix is None:
+            matrix = (page_size[0], 0, 0, page_size[1], 0, 0)
+        image = self.out.reserve()
+        self.out.write_stream(image, b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s "
+                                     b"/BitsPerComponent 8 /Filter /DCTDecode" % (size[0], size[1], COLOR_SPACES[mode]),
+                              jpeg)
+        content = self.out.reserve()
+        self.out.write_stream(content, b"", b"q " + b" ".join(_num(v) for v in matrix) + b" cm /Im0 Do Q")
+        self.kids.append(self.out.add(
+            b"<</Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Resources <</XObject <</Im0 %d 0 R>>>> "
+            b"/Contents %d 0 R>>" % (self.pages_root, _num(page_size[0]), _num(page_size[1]), image, content)))
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % k for k in self.kids)
+        self.out.write(self.pages_root, b"<</Type /Pages /Kids [" + kids + b"] /Count %d>>" % len(self.kids))
+        root = self.out.add(b"<</Type /Catalog /Pages %d 0 R>>" % self.pages_root)
+        self.out.close(root)
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        """途中でやめる（書きかけのファイルは消す）"""
+        self.out.f.close()
+        self.tmp.unlink(missing_ok=True)
+
+class Progress:
+    """書いたページ数と速さ（ページ/秒）を標準エラーに出す。端末なら1行を上書きして更新する"""
+    def __init__(self, total: int | None = None, interval: float = 0.5, stream=None):
+        self.total, self.count = total, 0
+        self.stream = stream or sys.stderr
+        self.tty = self.stream.isatty()
+        self.interval = interval if self.tty else max(interval, 10.0)
+        self.start = self.last = time.perf_counter()
+
+    def tick(self, n: int = 1):
+        self.count += n
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self._show(now)
+
+    def _show(self, now: float, end: str | None = None):
+        rate = self.count / max(now - self.start, 1e-9)
+        total = f"/{self.total}" if self.total else ""
+        print(f"  {self.count}{total} ページ  {rate:.1f} ページ/秒",
+              end=end or ("\r" if self.tty else "\n"), file=self.stream, flush=True)
+
+    def finish(self):
+        if self.count:
+            self._show(time.perf_counter(), end="\n")
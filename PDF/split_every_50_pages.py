@@ -1,15 +1,32 @@
 # split_every_50_pages_with_history_and_delete.py
 # 50ページごとに分割 → すべて成功したら元PDFを削除
 # 初期フォルダは last_folder.json に保存した前回選択を使う
+# 大きいPDFでもメモリが増えないように、1パートずつ読み直して書き出す。
+# 各パートには実際に使うフォント・画像だけを入れ、同じ内容のオブジェクトは1つにまとめる。
+# リンク注釈はパート内のページを指すように付け直し、パートの外へのリンクは外す
+# （そのまま写すとリンク先のページからページツリーをたどって全ページがパートに入ってしまう）。
+# PARALLEL_WORKERS を 2 以上にすると複数プロセスでパートを同時に書き出す
+# MAX_MB を指定するとページ数ではなくサイズで分割（各パートが MAX_MB 以下になるように、
+# ページごとのバイト数をオブジェクトから見積もって前から詰める。試し書きはしない）
+# 出力名はどちらも「元の名前-開始-終了.pdf」（merge_split_pdfs_multi_folders.py の PART_PATTERN で結合できる）
 
 import json
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from tkinter import Tk, filedialog
 from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
 
 CHUNK = 50
 HISTORY_FILE = Path("last_folder.json")  # スクリプトと同じ場所に作成
 DELETE_ORIGINAL = True                   # 分割後に元ファイルを削除
+PARALLEL_WORKERS = 1                     # 2以上でパートを並列に書き出す（メモリはおよそ×人数）
+MAX_MB = 0                               # >0 ならページ数ではなく、このサイズ（MB）以下を目安に分割
+OBJ_OVERHEAD = 40                        # 見積もり: オブジェクト1つあたりの番号・辞書・xref の分（バイト）
+
+# ページの内容（コンテンツストリーム）に出てくる名前（/Im0 Do の Im0 など）
+NAME_TOKEN = re.compile(rb"/([^\s/\[\]()<>{}%]+)")
+ESCAPED = re.compile(rb"#([0-9A-Fa-f]{2})")
 
 def load_last_folder() -> str | None:
     if HISTORY_FILE.exists():
@@ -23,6 +40,7 @@ def save_last_folder(folder: str):
     HISTORY_FILE.write_text(json.dumps({"last_folder": folder}, ensure_ascii=False, indent=2), encoding="utf-8")
 
 def choose_folder() -> Path:
+    from tkinter import Tk, filedialog  # GUIを使うときだけ読み込む（pdf_batch.py からは使わない）
     root = Tk(); root.withdraw()
     init_dir = load_last_folder() or "/"
     folder = filedialog.askdirectory(title="分割したいPDFフォルダを選んでください", initialdir=init_dir)
@@ -32,66 +50,239 @@ def choose_folder() -> Path:
     save_last_folder(folder)
     return Path(folder)
 
-def split_pdf(pdf_path: Path, chunk: int = CHUNK):
-    # 読み込み
-    try:
-        reader = PdfReader(str(pdf_path))
-    except Exception as e:
-        print(f"読み込み失敗: {pdf_path.name} ({e})")
+def open_reader(pdf_path: Path, fh) -> PdfReader:
+    """ファイル全体をメモリに載せないように、開いたファイルから読む。暗号化は空パスワードだけ試す"""
+    reader = PdfReader(fh)
+    if getattr(reader, "is_encrypted", False):
+        reader.decrypt("")
+    return reader
+
+def used_names(page) -> set[str]:
+    contents = page.get_contents()
+    if contents is None:
+        return set()
+    data = contents.get_data()
+    return {ESCAPED.sub(lambda m: bytes([int(m.group(1), 16)]), t).decode("latin-1")
+            for t in NAME_TOKEN.findall(data)}
+
+def prune_resources(page):
+    """
+    ページの /XObject と /Font から、内容に出てこないものを外す。
+    リソースを全ページで共有しているPDFだと、これをしないと全パートに全画像が入る。
+    """
+    res = page.get("/Resources")
+    if res is None:
         return
+    names = used_names(page)
+    res = DictionaryObject(res.get_object())  # 他のページと共有している辞書は書き換えない
+    for kind in ("/XObject", "/Font"):
+        table = res.get(kind)
+        if table is None:
+            continue
+        table = table.get_object()
+        res[NameObject(kind)] = DictionaryObject({k: v for k, v in table.items() if k[1:] in names})
+    page[NameObject("/Resources")] = res
 
-    # 暗号化PDFはスキップ（必要ならパス対応を追加）
-    if getattr(reader, "is_encrypted", False):
+def link_dest(annot):
+    """リンク注釈の飛び先（/Dest か /A の GoTo の /D）。ページを直接指す配列でなければ None"""
+    dest = annot.get("/Dest")
+    action = annot.get("/A")
+    if dest is None and action is not None and action.get_object().get("/S") == "/GoTo":
+        dest = action.get_object().get("/D")
+    dest = dest.get_object() if dest is not None else None
+    if isinstance(dest, ArrayObject) and dest and isinstance(dest[0], IndirectObject):
+        return dest
+    return None
+
+def detach_annots(page) -> list:
+    """
+    ページから注釈を外して返す。付けたまま PdfWriter に写すと、リンク先のページが
+    /Parent ごと写されてページツリー全体（＝全ページ）がパートに入ってしまう
+    """
+    annots = page.get("/Annots")
+    if annots is None:
+        return []
+    del page["/Annots"]
+    return [ref.get_object() for ref in annots.get_object()]
+
+def attach_annots(writer: PdfWriter, page, annots: list, copied: dict):
+    """
+    detach_annots で外した注釈を、写したページ page に付け直す。copied は元のページ番号 → 写したページ。
+    パート内へのリンクは写したページを指すように書き換え、パートの外へのリンクは捨てる
+    """
+    for annot in annots:
+        dest = link_dest(annot)
+        if dest is not None and dest[0].idnum not in copied:
+            continue
+        drop = ("/P", "/Dest", "/A") if dest is not None else ("/P",)
+        clone = DictionaryObject({k: v for k, v in annot.items() if k not in drop}).clone(writer)
+        if dest is not None:
+            clone[NameObject("/Dest")] = ArrayObject([copied[dest[0].idnum].indirect_reference, *dest[1:]])
+        writer.add_annotation(page, clone)
+
+def iter_write_parts(pdf_path: Path, parts: list[tuple[int, int, Path]]):
+    """
+    parts の (start, end, 出力先) を順に書き出し、書けた出力先を1つずつ返す（start/end は0始まり・end は含まない）。
+    ページの一覧は最初に1回だけ作り、パートを書くたびに読み込んだオブジェクトのキャッシュを捨てるので、
+    メモリはおよそ1パート分で済む
+    """
+    with open(pdf_path, "rb") as fh:
+        reader = open_reader(pdf_path, fh)
         try:
-            reader.decrypt("")  # 空パスワード試行
+            metadata = reader.metadata  # メタデータの引き継ぎは任意
         except Exception:
-            print(f"暗号化のためスキップ: {pdf_path.name}")
-            return
+            metadata = None
+        for start, end, out_path in parts:
+            writer = PdfWriter()
+            copied, annots = {}, []
+            for i in range(start, end):
+                page = reader.pages[i]
+                prune_resources(page)
+                annots.append(detach_annots(page))
+                copied[page.indirect_reference.idnum] = writer.add_page(page)
+            for page, page_annots in zip(copied.values(), annots):
+                attach_annots(writer, page, page_annots, copied)
+            if metadata:
+                try:
+                    writer.add_metadata(metadata)
+                except Exception:
+                    pass
+            writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+            with open(out_path, "wb") as f:
+                writer.write(f)
+            del writer
+            reader.resolved_objects.clear()
+            yield out_path
 
-    n = len(reader.pages)
-    if n <= chunk:
-        print(f"スキップ（{n}ページ ≤ {chunk}）: {pdf_path.name}")
-        return
+def write_parts(pdf_path: Path, parts: list[tuple[int, int, Path]]) -> list[Path]:
+    """ProcessPoolExecutor 用（ジェネレーターは別プロセスから返せないのでリストにする）"""
+    return list(iter_write_parts(pdf_path, parts))
+
+def plan_parts(n: int, chunk: int) -> list[tuple[int, int]]:
+    return [(start, min(start + chunk, n)) for start in range(0, n, chunk)]
+
+# --- サイズで分割 ---
+def page_objects(page) -> dict[int, int]:
+    """ページから辿れる間接オブジェクト → 見積もりバイト数（/Parent 等の親へは戻らない）"""
+    sizes: dict[int, int] = {}
+    stack = [page.raw_get(k) for k in ("/Contents", "/Resources", "/Annots") if k in page]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, IndirectObject):
+            if obj.idnum in sizes:
+                continue
+            target = obj.get_object()
+            if isinstance(target, DictionaryObject) and target.get("/Type") == "/Page":
+                continue  # リンク先のページ（書き出すときは写さない）
+            sizes[obj.idnum] = len(getattr(target, "_data", b"")) + OBJ_OVERHEAD  # ストリームは圧縮されたままの長さ
+            obj = target
+        if isinstance(obj, DictionaryObject):
+            stack.extend(obj.raw_get(k) for k in obj if k not in ("/Parent", "/P"))
+        elif isinstance(obj, ArrayObject):
+            stack.extend(obj)
+    return sizes
+
+def estimate_page_costs(pdf_path: Path) -> list[dict[int, int]]:
+    """全ページの page_objects を1回だけ求める。実際に書き出すときと同じく使わないリソースは外して数える"""
+    costs = []
+    with open(pdf_path, "rb") as fh:
+        reader = open_reader(pdf_path, fh)
+        for i, page in enumerate(reader.pages):
+            prune_resources(page)
+            costs.append(page_objects(page))
+            if i % CHUNK == CHUNK - 1:
+                reader.resolved_objects.clear()  # 画像の中身を持ち続けない
+    return costs
+
+def plan_parts_by_size(costs: list[dict[int, int]], max_bytes: int) -> list[tuple[int, int]]:
+    """
+    前から順にページを詰め、max_bytes を超えるところで次のパートにする。
+    パート内で共有している画像・フォントは1回だけ数える。1ページで超えるときはそのページだけのパート
+    """
+    parts, start, used, total = [], 0, set(), 0
+    for i, objs in enumerate(costs):
+        extra = OBJ_OVERHEAD + sum(size for idnum, size in objs.items() if idnum not in used)
+        if i > start and total + extra > max_bytes:
+            parts.append((start, i))
+            start, used, total = i, set(), 0
+            extra = OBJ_OVERHEAD + sum(objs.values())
+        used.update(objs)
+        total += extra
+    parts.append((start, len(costs)))
+    return parts
+
+def split_pdf(pdf_path: Path, chunk: int = CHUNK, workers: int = PARALLEL_WORKERS, max_mb: float = MAX_MB,
+              delete_original: bool | None = None) -> dict:
+    """
+    1ファイルを分割する。結果を辞書で返す:
+    {"input", "status": split/skipped/failed, "parts": [作ったファイル], "error", "original_deleted"}
+    """
+    if delete_original is None:
+        delete_original = DELETE_ORIGINAL
+    result = {"input": str(pdf_path), "status": "skipped", "parts": [], "error": None, "original_deleted": False}
+    # 読み込み（ページ数を数える、サイズ分割ならページごとの大きさも見積もる）
+    try:
+        if max_mb > 0:
+            ranges = plan_parts_by_size(estimate_page_costs(pdf_path), int(max_mb * 1024 * 1024))
+        else:
+            with open(pdf_path, "rb") as fh:
+                ranges = plan_parts(len(open_reader(pdf_path, fh).pages), chunk)
+    except Exception as e:
+        # 暗号化PDFもここでスキップ（必要ならパス対応を追加）
+        print(f"読み込み失敗または暗号化のためスキップ: {pdf_path.name} ({e})")
+        return {**result, "status": "failed", "error": f"読み込み失敗: {e}"}
+
+    if len(ranges) <= 1:
+        limit = f"{max_mb}MB 以下" if max_mb > 0 else f"{chunk}ページ以下"
+        print(f"スキップ（{limit}）: {pdf_path.name}")
+        return result
 
     stem = pdf_path.stem
     parent = pdf_path.parent
+    parts = [(start, end, parent / f"{stem}-{start+1}-{end}.pdf") for start, end in ranges]
     created = []  # 生成に成功したファイルを記録
 
     # 分割生成
     try:
-        for start in range(0, n, chunk):
-            end = min(start + chunk, n)
-            writer = PdfWriter()
-            for i in range(start, end):
-                writer.add_page(reader.pages[i])
-            # メタデータの引き継ぎは任意
+        if workers > 1:
+            # ページ一覧を作るのは1人1回にしたいので、続きのパートをまとめて1人に渡す
+            size = -(-len(parts) // workers)
+            batches = [parts[i:i + size] for i in range(0, len(parts), size)]
+            ex = ProcessPoolExecutor(max_workers=workers)
             try:
-                if reader.metadata:
-                    writer.add_metadata(reader.metadata)
-            except Exception:
-                pass
-            out_path = parent / f"{stem}-{start+1}-{end}.pdf"
-            with open(out_path, "wb") as f:
-                writer.write(f)
-            created.append(out_path)
-            print(f"作成: {out_path.name}")
+                futures = [ex.submit(write_parts, pdf_path, batch) for batch in batches]
+                for fut in futures:
+                    for out in fut.result():
+                        created.append(out)
+                        print(f"作成: {out.name}")
+            finally:
+                ex.shutdown(cancel_futures=True)  # 失敗したら残りは始めない
+        else:
+            for out in iter_write_parts(pdf_path, parts):
+                created.append(out)
+                print(f"作成: {out.name}")
     except Exception as e:
         print(f"分割中に失敗: {pdf_path.name} ({e})")
-        # 途中まで作ったファイルを削除（クリーンアップ）
+        # 途中まで作ったファイルを削除（クリーンアップ）。並列のときは他の人が書き終えた分も
+        if workers > 1:
+            created = [out for _, _, out in parts if out.exists()]
         for p in created:
             try:
                 p.unlink()
             except Exception:
                 pass
-        return
+        return {**result, "status": "failed", "error": f"分割中に失敗: {e}"}
 
+    result.update(status="split", parts=[str(p) for p in created])
     # ここまで来たら全分割成功 → 原本を削除
-    if DELETE_ORIGINAL:
+    if delete_original:
         try:
             pdf_path.unlink()
+            result["original_deleted"] = True
             print(f"元ファイルを削除: {pdf_path.name}")
         except Exception as e:
             print(f"元ファイル削除に失敗: {pdf_path.name} ({e})")
+    return result
 
 def main():
     folder = choose_folder()
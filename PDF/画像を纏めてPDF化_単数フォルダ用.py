@@ -1,9 +1,17 @@
 from pathlib import Path
 from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+import io
 import json
 
+# PDF はページごとにディスクへ書き出す（同じフォルダの pdf_stream_writer.py）
+from pdf_stream_writer import A4_PT, ImagePdfWriter, Progress
+# 同じフォルダの image_loader.py（JPEG は縮小 decode、HEIC はサムネイル、EXIF の回転を反映）
+from image_loader import jpeg_passthrough_info, load_fitted, placement_matrix
+
+# JPEG（RGB・グレー）は decode せずにそのまま埋め込み、A4 の中央に置く（False で全ページ A4 画像に描き直す）
+JPEG_PASSTHROUGH = True
+JPEG_QUALITY = 90  # A4 画像に描き直したページの JPEG 品質
+
 # ===== 設定ファイル（前回の入出力フォルダを記録）=====
 SETTINGS_PATH = Path.home() / ".img2pdf_settings.json"
 
@@ -81,10 +89,12 @@ def list_images(folder: Path):
     return sorted(files, key=lambda p: natural_key(p.name))
 
 # --- A4に収める（白余白あり・縦） ---
-def fit_to_a4(im: Image.Image, dpi=300) -> Image.Image:
+def a4_pixels(dpi=300) -> tuple[int, int]:
     import math
-    a4_w = int(math.floor(8.27 * dpi))   # 210mm
-    a4_h = int(math.floor(11.69 * dpi))  # 297mm
+    return int(math.floor(8.27 * dpi)), int(math.floor(11.69 * dpi))  # 210mm × 297mm
+
+def fit_to_a4(im: Image.Image, dpi=300) -> Image.Image:
+    a4_w, a4_h = a4_pixels(dpi)
     ratio = min(a4_w / im.width, a4_h / im.height)
     new_w = max(1, int(im.width * ratio))
     new_h = max(1, int(im.height * ratio))
@@ -95,23 +105,35 @@ def fit_to_a4(im: Image.Image, dpi=300) -> Image.Image:
     canvas_img.paste(im_resized, (off_x, off_y))
     return canvas_img
 
-def convert_images_to_single_pdf(image_folder: Path, output_pdf_path, dpi=300):
+def convert_images_to_single_pdf(image_folder: Path, output_pdf_path, dpi=300,
+                                 passthrough: bool = JPEG_PASSTHROUGH) -> int:
+    """フォルダの画像を1つのPDFにする。PDFにできた枚数を返す（0 なら PDF は作らない）"""
     output_pdf_path = Path(output_pdf_path)  # Path型に統一
     images = list_images(image_folder)
     if not images:
         print("対応する画像が見つかりません。")
-        return
+        return 0
 
-    from reportlab.lib.pagesizes import A4
-    a4_pt = (595.27, 841.89)
     output_pdf_path.parent.mkdir(parents=True, exist_ok=True)
 
-    c = canvas.Canvas(str(output_pdf_path), pagesize=A4)
+    writer = ImagePdfWriter(output_pdf_path)
+    progress = Progress(len(images))
     ok, skipped = 0, []
 
-    for img_path in images:
-        try:
-            with Image.open(img_path) as im:
+    try:
+        for img_path in images:
+            progress.tick()
+            try:
+                info = jpeg_passthrough_info(img_path) if passthrough else None
+                if info:
+                    # 元の JPEG をそのまま入れ、EXIF の向きは置き方で直す
+                    w, h, orientation, mode = info
+                    writer.add_jpeg_page(img_path, (w, h), mode,
+                                         placement_matrix((w, h), orientation, (0, 0, *A4_PT)))
+                    ok += 1
+                    continue
+                # A4に収まる大きさに近い解像度で読み込む（EXIFの回転も反映）
+                im = load_fitted(img_path, a4_pixels(dpi))
                 # 透過PNGやCMYKをPDFに適したRGBへ
                 if im.mode in ("RGBA", "LA"):
                     bg = Image.new("RGB", im.size, "white")
@@ -121,20 +143,27 @@ def convert_images_to_single_pdf(image_folder: Path, output_pdf_path, dpi=300):
                     im = im.convert("RGB")
 
                 page_img = fit_to_a4(im, dpi=dpi)
-                c.setPageSize(a4_pt)
-                c.drawImage(ImageReader(page_img), 0, 0,
-                            width=a4_pt[0], height=a4_pt[1])
-                c.showPage()
+                buf = io.BytesIO()
+                page_img.save(buf, "JPEG", quality=JPEG_QUALITY)
+                writer.add_jpeg_page(buf.getvalue(), page_img.size)
                 ok += 1
-        except Exception as e:
-            skipped.append((img_path.name, str(e)))
-
-    c.save()
-    print(f"[完了] {ok} 枚をA4 PDFにしました → {output_pdf_path}")
+            except Exception as e:
+                skipped.append((img_path.name, str(e)))
+    except BaseException:  # 中断したら書きかけの .part を消す
+        writer.abort()
+        raise
+    progress.finish()
+    if ok == 0:  # 1枚も入らなかった: 0ページのPDFは作らない
+        writer.abort()
+        print(f"[失敗] 画像を1枚も読み込めなかったため、PDFは作りませんでした → {output_pdf_path}")
+    else:
+        writer.close()
+        print(f"[完了] {ok} 枚をA4 PDFにしました → {output_pdf_path}")
     if skipped:
         print("[読み込み失敗]")
         for name, err in skipped:
             print(f" - {name}: {err}")
+    return ok
 
 def reveal_in_finder(path: Path):
     import subprocess
@@ -159,8 +188,8 @@ if __name__ == "__main__":
             print("キャンセルされました。")
         else:
             # 3) 変換
-            convert_images_to_single_pdf(src_dir, out_pdf, dpi=300)
-            reveal_in_finder(out_pdf)
+            if convert_images_to_single_pdf(src_dir, out_pdf, dpi=300):
+                reveal_in_finder(out_pdf)
 
             # 4) 今回の入出力フォルダを記憶（次回の初期値に）
             st = load_settings()
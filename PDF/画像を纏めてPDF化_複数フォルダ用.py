@@ -1,8 +1,26 @@
+# 親フォルダ直下のサブフォルダを、それぞれA4のPDFにする。
+# 画像の読み込み・A4化・JPEG化は複数プロセスで行い、ページは元の順番どおりに並べる。
+# 次のフォルダの画像も続けて流すので、小さいフォルダが多くても全コアが埋まる。
+# JPEG（RGB・グレー）は decode せずにファイルの中身をそのまま埋め込み、A4 の中央に置く（JPEG_PASSTHROUGH）。
+# PDF はページごとにディスクへ書き出す（pdf_stream_writer.ImagePdfWriter）ので、枚数が多くてもメモリは増えない。
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+import io
 import json
+import os
+import time
+
+from pdf_stream_writer import A4_PT, ImagePdfWriter, Progress
+# 同じフォルダの image_loader.py（JPEG は縮小 decode、HEIC はサムネイル、EXIF の回転を反映）
+from image_loader import jpeg_passthrough_info, load_fitted, placement_matrix
+
+# ===== 並列処理の設定 =====
+MAX_WORKERS = os.cpu_count() or 1  # 画像を処理するプロセス数
+MEMORY_CAP_MB = 2048               # 処理中の画像（元画像＋A4キャンバス）が使うメモリの合計の目安
+WINDOW_PER_WORKER = 4              # 1プロセスあたり先に投げておく（書き込み待ちを含む）ページ数
+JPEG_QUALITY = 90                  # ページ画像の JPEG 品質
+JPEG_PASSTHROUGH = True            # JPEG は描き直さずそのまま埋め込む（False で全ページ A4 画像に描き直す）
 
 # ===== 設定ファイル（前回選択の保存先）=====
 SETTINGS_PATH = Path.home() / ".img2pdf_settings.json"
@@ -79,10 +97,12 @@ def list_images(folder: Path):
     return sorted(files, key=lambda p: natural_key(p.name))
 
 # --- A4化（白余白・縦） ---
-def fit_to_a4(im: Image.Image, dpi=300) -> Image.Image:
+def a4_pixels(dpi=300) -> tuple[int, int]:
     import math
-    a4_w = int(math.floor(8.27 * dpi))   # 横幅（210mm）
-    a4_h = int(math.floor(11.69 * dpi))  # 縦幅（297mm）
+    return int(math.floor(8.27 * dpi)), int(math.floor(11.69 * dpi))  # 横幅（210mm）, 縦幅（297mm）
+
+def fit_to_a4(im: Image.Image, dpi=300) -> Image.Image:
+    a4_w, a4_h = a4_pixels(dpi)
     ratio = min(a4_w / im.width, a4_h / im.height)
     new_w = max(1, int(im.width * ratio))
     new_h = max(1, int(im.height * ratio))
@@ -94,50 +114,227 @@ def fit_to_a4(im: Image.Image, dpi=300) -> Image.Image:
     return canvas_img
 
 # --- 重複を避けるファイル名 ---
-def unique_path(base_path: Path) -> Path:
-    if not base_path.exists():
+def unique_path(base_path: Path, taken: set[Path] | None = None) -> Path:
+    """既にあるファイルと、taken（今回すでに割り当てた出力先）に重ならない名前"""
+    taken = taken or set()
+    if not base_path.exists() and base_path not in taken:
         return base_path
     stem, suffix = base_path.stem, base_path.suffix
     i = 1
     while True:
         candidate = base_path.with_name(f"{stem} ({i}){suffix}")
-        if not candidate.exists():
+        if not candidate.exists() and candidate not in taken:
             return candidate
         i += 1
 
-# --- 1フォルダを PDF に変換 ---
-def convert_folder_to_pdf(src_dir: Path, out_pdf: Path, dpi=300) -> tuple[int, list]:
-    from reportlab.lib.pagesizes import A4
-    a4_pt = (595.27, 841.89)
+# --- 1ページ分の画像を作る（子プロセスで実行） ---
+def render_page(img_path: Path, dpi: int = 300, quality: int = JPEG_QUALITY) -> bytes:
+    """画像を開いてA4に収め、JPEG のバイト列で返す"""
+    # A4に収まる大きさに近い解像度で読み込む（EXIFの回転も反映）
+    im = load_fitted(img_path, a4_pixels(dpi))
+    if im.mode in ("RGBA", "LA"):
+        bg = Image.new("RGB", im.size, "white")
+        bg.paste(im, mask=im.split()[-1])
+        im = bg
+    elif im.mode in ("P", "CMYK"):
+        im = im.convert("RGB")
+    page_img = fit_to_a4(im, dpi=dpi)
+    buf = io.BytesIO()
+    page_img.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
 
-    images = list_images(src_dir)
-    if not images:
-        return 0, []  # 画像なし
+def estimate_memory(img_path: Path, dpi: int) -> int:
+    """1枚の処理に必要なメモリの目安（ヘッダーだけ読んで、縮小 decode 後の元画像＋A4キャンバス）"""
+    a4_w, a4_h = a4_pixels(dpi)
+    a4 = a4_w * a4_h * 3
+    try:
+        with Image.open(img_path) as im:
+            # JPEG は最大 1/8 まで縮めて decode するが、見積もりは控えめに元の大きさで
+            return min(im.width * im.height, a4_w * a4_h * 4) * 4 + a4
+    except Exception:
+        return a4
 
-    out_pdf.parent.mkdir(parents=True, exist_ok=True)
-    c = canvas.Canvas(str(out_pdf), pagesize=A4)
-    ok, skipped = 0, []
+class FolderJob:
+    """
+    1フォルダ分のPDF。届いたページ（A4 画像の JPEG か、そのまま置く JPEG）を番号順に書き出す。
+    フォルダが読めない・PDF が書けないときは error に理由を入れ、このフォルダだけやめる
+    """
 
-    for img_path in images:
+    def __init__(self, src_dir: Path, out_pdf: Path, dpi=300):
+        self.src_dir, self.out_pdf = src_dir, out_pdf
+        self.page_px = a4_pixels(dpi)
+        self.ready: dict[int, bytes | tuple | Exception] = {}
+        self.next = 0
+        self.ok, self.skipped = 0, []
+        self.writer = None
+        self.error: str | None = None
+        self.started: float | None = None  # 最初のページを投げた時刻
+        self.seconds = 0.0                 # 最初のページから書き終わるまで
         try:
-            with Image.open(img_path) as im:
-                if im.mode in ("RGBA", "LA"):
-                    bg = Image.new("RGB", im.size, "white")
-                    bg.paste(im, mask=im.split()[-1])
-                    im = bg
-                elif im.mode in ("P", "CMYK"):
-                    im = im.convert("RGB")
-
-                page_img = fit_to_a4(im, dpi=dpi)
-                c.setPageSize(a4_pt)
-                c.drawImage(ImageReader(page_img), 0, 0, width=a4_pt[0], height=a4_pt[1])
-                c.showPage()
-                ok += 1
-        except Exception as e:
-            skipped.append((img_path.name, str(e)))
-
-    c.save()
-    return ok, skipped
+            self.images = list_images(src_dir)
+        except OSError as e:
+            self.images = []
+            self.error = str(e)
+
+    def start(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def put(self, idx: int, result: bytes | tuple | Exception) -> int:
+        """結果を受け取り、続きで書けるページを書く。書いたページ数（やめたフォルダでは捨てた数）を返す"""
+        if self.error:
+            return 1
+        self.ready[idx] = result
+        written = 0
+        while self.next in self.ready:
+            result = self.ready.pop(self.next)
+            name = self.images[self.next].name
+            self.next += 1
+            written += 1
+            if isinstance(result, Exception):
+                self.skipped.append((name, str(result)))
+                continue
+            if isinstance(result, tuple):  # (元の JPEG, jpeg_passthrough_info)
+                try:
+                    os.stat(result[0])
+                except OSError as e:  # 調べた後に消された・読めなくなったファイル
+                    self.skipped.append((name, str(e)))
+                    continue
+            try:
+                if self.writer is None:
+                    self.out_pdf.parent.mkdir(parents=True, exist_ok=True)
+                    self.writer = ImagePdfWriter(self.out_pdf)
+                if isinstance(result, tuple):
+                    path, (w, h, orientation, mode) = result
+                    self.writer.add_jpeg_page(path, (w, h), mode,
+                                              placement_matrix((w, h), orientation, (0, 0, *A4_PT)))
+                else:
+                    self.writer.add_jpeg_page(result, self.page_px)
+            except Exception as e:  # 出力側の失敗（保存先に書けない・容量不足など）
+                return written + self.fail(e)
+            self.ok += 1
+        if self.done:
+            self.finish()
+        return written
+
+    def fail(self, e: Exception) -> int:
+        """このフォルダをやめる。書き出し待ちで捨てたページ数を返す"""
+        self.abort()
+        self.error = str(e)
+        dropped = len(self.ready)
+        self.ready.clear()
+        self.next = len(self.images)
+        self.finish()
+        return dropped
+
+    def finish(self):
+        if self.started is not None and not self.seconds:
+            self.seconds = time.perf_counter() - self.started
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception as e:
+                self.abort()
+                self.error = str(e)
+            self.writer = None
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
+
+    @property
+    def done(self) -> bool:
+        return self.next >= len(self.images)
+
+def run_folder_jobs(jobs: list[tuple[Path, Path]], dpi=300, workers: int = MAX_WORKERS,
+                    memory_cap_mb: int = MEMORY_CAP_MB, on_done=None,
+                    passthrough: bool = JPEG_PASSTHROUGH) -> list[FolderJob]:
+    """
+    (画像フォルダ, 出力PDF) の一覧をまとめて変換し、フォルダごとの FolderJob
+    （ok・skipped・error・seconds）を返す。1フォルダの失敗でほかのフォルダは止めない。
+    on_done(番号, FolderJob) はフォルダが書き終わるたびに呼ぶ。
+    passthrough なら、そのまま埋め込める JPEG はプロセスに投げずにここで置く。
+    """
+    folder_jobs = [FolderJob(src, out, dpi) for src, out in jobs]
+    tasks = ((j, i, p) for j, fj in enumerate(folder_jobs) for i, p in enumerate(fj.images))
+    budget = memory_cap_mb * 1024 * 1024
+    window = max(1, workers) * WINDOW_PER_WORKER
+    unwritten = 0  # 投げたが、まだPDFに書いていないページ
+    inflight = {}
+    reported = set()
+    progress = Progress(sum(len(fj.images) for fj in folder_jobs))
+
+    def put(j: int, i: int, result) -> int:
+        written = folder_jobs[j].put(i, result)
+        progress.tick(written)
+        return written
+
+    def report_finished():
+        for j, fj in enumerate(folder_jobs):
+            if fj.done and j not in reported:
+                reported.add(j)
+                fj.finish()
+                if on_done:
+                    on_done(j, fj)
+
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as ex:
+            pending_task = next(tasks, None)
+            while pending_task or inflight:
+                # メモリの目安と先読み数の範囲で投げる（何も動いていなければ大きい画像でも1枚は投げる）
+                while pending_task and unwritten < window:
+                    j, i, path = pending_task
+                    if folder_jobs[j].error:  # やめたフォルダの残りは投げない
+                        pending_task = next(tasks, None)
+                        continue
+                    folder_jobs[j].start()
+                    info = jpeg_passthrough_info(path) if passthrough else None
+                    if info:
+                        unwritten += 1 - put(j, i, (path, info))
+                        pending_task = next(tasks, None)
+                        continue
+                    cost = estimate_memory(path, dpi)
+                    if inflight and cost > budget:
+                        break
+                    budget -= cost
+                    inflight[ex.submit(render_page, path, dpi)] = (j, i, cost)
+                    unwritten += 1
+                    pending_task = next(tasks, None)
+                report_finished()
+                if not inflight:
+                    continue
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    j, i, cost = inflight.pop(fut)
+                    budget += cost
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        result = e
+                    unwritten -= put(j, i, result)
+            report_finished()
+    except BaseException:
+        for fj in folder_jobs:  # 中断したら書きかけの .part を消す
+            fj.abort()
+        raise
+    progress.finish()
+    return folder_jobs
+
+def convert_folders(jobs: list[tuple[Path, Path]], dpi=300, workers: int = MAX_WORKERS,
+                    memory_cap_mb: int = MEMORY_CAP_MB, passthrough: bool = JPEG_PASSTHROUGH
+                    ) -> list[tuple[int, list]]:
+    """run_folder_jobs の結果を (成功枚数, 失敗リスト) にする。失敗したフォルダがあれば最後に例外にする"""
+    folder_jobs = run_folder_jobs(jobs, dpi, workers, memory_cap_mb, passthrough=passthrough)
+    for fj in folder_jobs:
+        if fj.error:
+            raise RuntimeError(f"{fj.src_dir}: {fj.error}")
+    return [(fj.ok, fj.skipped) for fj in folder_jobs]
+
+# --- 1フォルダを PDF に変換 ---
+def convert_folder_to_pdf(src_dir: Path, out_pdf: Path, dpi=300,
+                          passthrough: bool = JPEG_PASSTHROUGH) -> tuple[int, list]:
+    return convert_folders([(src_dir, out_pdf)], dpi, passthrough=passthrough)[0]
 
 # --- Finderで保存先を開く ---
 def reveal_in_finder(path: Path):
@@ -161,12 +358,17 @@ if __name__ == "__main__":
         if not subfolders:
             print("サブフォルダが見つかりません。親フォルダ直下に画像フォルダを作ってください。")
         else:
-            print(f"=== {len(subfolders)} フォルダを処理します ===")
-            for idx, folder in enumerate(sorted(subfolders, key=lambda p: natural_key(p.name)), start=1):
-                out_pdf = unique_path(out_dir / f"{folder.name}.pdf")
-                print(f"[{idx}/{len(subfolders)}] {folder.name} → {out_pdf.name}")
-                ok, skipped = convert_folder_to_pdf(folder, out_pdf, dpi=300)
-                if ok == 0:
+            print(f"=== {len(subfolders)} フォルダを処理します（{MAX_WORKERS} プロセス） ===")
+            subfolders = sorted(subfolders, key=lambda p: natural_key(p.name))
+            jobs = [(folder, unique_path(out_dir / f"{folder.name}.pdf")) for folder in subfolders]
+
+            def on_done(idx, fj):
+                folder, out_pdf = jobs[idx]
+                ok, skipped = fj.ok, fj.skipped
+                print(f"[{idx + 1}/{len(jobs)}] {folder.name} → {out_pdf.name}")
+                if fj.error:
+                    print(f"  - 失敗：{fj.error}")
+                elif ok == 0:
                     print(f"  - 画像なし（スキップ）")
                 else:
                     print(f"  - {ok} 枚をPDF化")
@@ -175,6 +377,8 @@ if __name__ == "__main__":
                         for name, err in skipped:
                             print(f"    * {name}: {err}")
 
+            run_folder_jobs(jobs, dpi=300, on_done=on_done)
+
             reveal_in_finder(out_dir)
             print(f"\n[完了] 出力先を開きました → {out_dir}")
 
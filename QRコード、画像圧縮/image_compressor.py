@@ -1,26 +1,71 @@
+# image_compressor.py
+# フォルダ内の写真を長辺 800px の JPEG に縮めて別フォルダへ保存し、元画像を削除する（引越し用の写真整理）。
+#  - 複数プロセスで並列に処理
+#  - 出力は一時ファイルに書いてから名前を付け替える（途中で止まっても壊れた JPEG は残らない）
+#  - 終わったファイルは出力フォルダのマニフェスト（JSONL）に記録し、再実行時は飛ばす（中断しても続きから）
+# 例:
+#   python image_compressor.py                       # 下の設定のフォルダ
+#   python image_compressor.py 圧縮前 圧縮後 --workers 8 --keep
+#   python image_compressor.py 圧縮前 圧縮後 --max-size 2048 --max-kb 200 --search-size  # 1枚 200KB 以下
+#   from image_compressor import compress_folder
+#   compress_folder("圧縮前", "圧縮後")
+
+import argparse
+import io
+import json
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
 from PIL import Image, ImageOps
 
 # --- HEICをPillowで開けるように登録 ---
 HEIF_OK = False
 try:
-    from pillow_heif import register_heif_opener
-    register_heif_opener()
+    import pillow_heif
+    pillow_heif.register_heif_opener()
     HEIF_OK = True
 except Exception:
     # pillow-heif未導入でも他拡張子は動く。HEICに当たったらエラーにする。
     pass
 
-# フォルダ設定
-input_folder = '/Users/shogo/画像/引越し用/圧縮前'
-output_folder = '/Users/shogo/画像/引越し用/圧縮後'
+# ===== 設定 =====
+INPUT_FOLDER = '/Users/shogo/画像/引越し用/圧縮前'
+OUTPUT_FOLDER = '/Users/shogo/画像/引越し用/圧縮後'
+MAX_WORKERS = os.cpu_count() or 1   # 並列に処理するプロセス数
+DELETE_SOURCE = True                # 圧縮できた元画像を削除する（※心配なら False）
+MANIFEST_NAME = ".compress_manifest.jsonl"  # 出力フォルダに置く処理済みの記録
+
+# ===== 目標サイズ（max_bytes）を指定したとき =====
+MIN_QUALITY = 30  # これより品質は下げない
+MIN_SIDE = 320    # search_size で縮めるときの長辺の下限
 
-# 出力フォルダがなければ作成
-os.makedirs(output_folder, exist_ok=True)
+# JPEG形式で保存（圧縮を少し丁寧に）
+JPEG_OPTIONS = dict(format="JPEG", optimize=True, progressive=True, subsampling=1)  # subsampling=1 は 4:2:2
 
 # 対応する画像拡張子
 valid_exts = ['.jpg', '.jpeg', '.png', '.heic', '.webp', '.bmp']
 
+def load_max_side(path, max_side: int) -> Image.Image:
+    """
+    長辺を max_side 以下にするのに足りる解像度で読み込み、EXIFの回転を反映して返す。
+    JPEG は draft() で 1/2・1/4・1/8 に縮めて decode、HEIC は十分な大きさのサムネイルがあればそれを使う
+    """
+    im = Image.open(path)
+    if max(im.size) > max_side:
+        ratio = max_side / max(im.size)  # 長辺で決まるので、EXIFの向き（縦横の入れ替え）は関係ない
+        need = (max(1, int(im.width * ratio)), max(1, int(im.height * ratio)))
+        if im.format == "JPEG":
+            im.draft(im.mode, need)
+        elif HEIF_OK and im.format == "HEIF":
+            try:
+                im = pillow_heif.thumbnail(im, min_box=max_side)
+            except Exception:
+                pass  # サムネイルが使えない版・ファイルは普通に読む
+    im.load()
+    return ImageOps.exif_transpose(im)
+
 def to_rgb_without_alpha(img: Image.Image) -> Image.Image:
     """アルファ付きは白背景でRGB化、その他は必要に応じてRGBへ"""
     if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
@@ -34,7 +79,64 @@ def to_rgb_without_alpha(img: Image.Image) -> Image.Image:
         return img.convert("RGB")
     return img
 
-def compress_image(file_path, output_path, max_size=800, quality=80):
+def resize_max_side(img: Image.Image, max_size: int) -> Image.Image:
+    """長辺が max_size を超えていれば縮める"""
+    width, height = img.size
+    if max(width, height) > max_size:
+        if width >= height:
+            new_width = max_size
+            new_height = int(height * max_size / width)
+        else:
+            new_height = max_size
+            new_width = int(width * max_size / height)
+        img = img.resize((new_width, new_height), Image.LANCZOS)
+    return img
+
+def encode_jpeg(img: Image.Image, buf: io.BytesIO, quality: int) -> int:
+    """buf を空にして JPEG を書き、そのバイト数を返す（同じ buf を使い回す）"""
+    buf.seek(0)
+    buf.truncate()
+    img.save(buf, **JPEG_OPTIONS, quality=quality)
+    return buf.tell()
+
+def fit_to_bytes(img: Image.Image, max_bytes: int, quality: int, search_size: bool,
+                 buf: io.BytesIO) -> tuple[Image.Image, int]:
+    """
+    max_bytes 以下になる一番高い品質（MIN_QUALITY〜quality）を二分探索で探す。
+    最低品質でも超えるとき、search_size なら長辺を縮めて探し直す（MIN_SIDE まで）。
+    buf に最後の JPEG が入った状態で (使った画像, 品質) を返す
+    """
+    base = img
+    while True:
+        # 品質を二分探索（lo は収まった品質、収まらなければ MIN_QUALITY のまま）
+        lo, hi = min(MIN_QUALITY, quality), quality
+        if encode_jpeg(img, buf, hi) <= max_bytes:
+            return img, hi
+        size = encode_jpeg(img, buf, lo)
+        if size <= max_bytes:
+            hi -= 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if encode_jpeg(img, buf, mid) <= max_bytes:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            encode_jpeg(img, buf, lo)
+            return img, lo
+        side = max(img.size)
+        if not search_size or side <= MIN_SIDE:
+            return img, lo  # 収まらない: できるだけ小さいものを返す
+        # バイト数はおおよそ画素数に比例するので、面積の比から長辺を決める（1回に縮めすぎない）
+        scale = min(0.9, max(0.5, (max_bytes / size) ** 0.5))
+        img = resize_max_side(base, max(MIN_SIDE, int(side * scale)))
+
+def compress_image(file_path, output_path, max_size=800, quality=80,
+                   max_bytes: int | None = None, search_size: bool = False) -> dict:
+    """
+    長辺 max_size の JPEG にする。max_bytes を指定すると、そのバイト数以下に収まる一番高い品質
+    （quality が上限）で保存する。search_size なら長辺も縮めて収める。
+    使った品質・大きさ・バイト数を返す
+    """
     ext = os.path.splitext(file_path)[1].lower()
     if ext == ".heic" and not HEIF_OK:
         raise RuntimeError(
@@ -42,44 +144,159 @@ def compress_image(file_path, output_path, max_size=800, quality=80):
             " 例: python3.12 -m pip install 'pillow-heif'"
         )
 
-    with Image.open(file_path) as img:
-        # EXIFの回転を画像に反映（iPhone写真対策）
-        img = ImageOps.exif_transpose(img)
+    # 長辺max_sizeに近い解像度で直接 decode し、EXIFの回転も反映（iPhone写真対策）
+    img = load_max_side(file_path, max_size)
 
-        # 透過除去＋RGB化
-        img = to_rgb_without_alpha(img)
+    # 透過除去＋RGB化
+    img = to_rgb_without_alpha(img)
 
-        # リサイズ（長辺max_size）
-        width, height = img.size
-        if max(width, height) > max_size:
-            if width >= height:
-                new_width = max_size
-                new_height = int(height * max_size / width)
-            else:
-                new_height = max_size
-                new_width = int(width * max_size / height)
-            img = img.resize((new_width, new_height), Image.LANCZOS)
+    # リサイズ（長辺max_size）
+    img = resize_max_side(img, max_size)
 
+    if max_bytes is None:
         # JPEG形式で保存（圧縮を少し丁寧に）
-        img.save(
-            output_path,
-            'JPEG',
-            quality=quality,
-            optimize=True,
-            progressive=True,
-            subsampling=1  # 4:2:2
-        )
+        img.save(output_path, **JPEG_OPTIONS, quality=quality)
+        return {"quality": quality, "size": img.size, "bytes": os.path.getsize(output_path)}
+
+    # 目標サイズ: 試し書きはメモリ上の1つのバッファで行い、決まったものだけファイルに書く
+    buf = io.BytesIO()
+    img, quality = fit_to_bytes(img, max_bytes, quality, search_size, buf)
+    with open(output_path, "wb") as f:
+        f.write(buf.getbuffer())
+    return {"quality": quality, "size": img.size, "bytes": buf.tell()}
 
-# 処理開始
-for filename in os.listdir(input_folder):
-    name, ext = os.path.splitext(filename)
-    if ext.lower() in valid_exts:
-        input_path = os.path.join(input_folder, filename)
-        output_path = os.path.join(output_folder, f"{name}.jpg")
+# --- 処理済みの記録（1行1件の JSON。追記だけなので途中で止まっても前の行は壊れない） ---
+def source_key(path: Path) -> dict:
+    """同じファイルかどうかの判定用（名前・大きさ・更新時刻）"""
+    st = path.stat()
+    return {"src": path.name, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
 
+def load_manifest(manifest: Path) -> dict[tuple, dict]:
+    done = {}
+    try:
+        with open(manifest, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    done[(rec["src"], rec["size"], rec["mtime_ns"])] = rec
+                except (ValueError, KeyError):
+                    pass  # 書きかけで止まった最後の行など
+    except FileNotFoundError:
+        pass
+    return done
+
+def append_manifest(f, rec: dict):
+    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    f.flush()
+    os.fsync(f.fileno())  # 元画像を消す前に記録をディスクへ
+
+# --- 1枚分（子プロセスで実行） ---
+def compress_to(file_path: Path, output_path: Path, **options) -> dict:
+    """一時ファイルに圧縮してから output_path に付け替える。compress_image の結果を返す"""
+    tmp = output_path.with_name(f".{file_path.name}.part")
+    try:
+        info = compress_image(file_path, tmp, **options)
+        os.replace(tmp, output_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return info
+
+def plan(input_folder: Path, output_folder: Path, owners: dict[str, str]) -> list[tuple[Path, Path]]:
+    """
+    (元画像, 出力先) の一覧。出力名は「元の名前.jpg」。
+    IMG_1.heic と IMG_1.jpg のように名前がぶつかるもの、前回ほかの画像が使った名前（owners: 出力名 → 元画像名）は
+    拡張子を名前に残す（IMG_1_heic.jpg）
+    """
+    sources = sorted(p for p in input_folder.iterdir()
+                     if p.is_file() and p.suffix.lower() in valid_exts)
+    stems = {}
+    for p in sources:
+        stems[p.stem] = stems.get(p.stem, 0) + 1
+    jobs = []
+    for p in sources:
+        name = f"{p.stem}.jpg"
+        if stems[p.stem] > 1 or owners.get(name, p.name) != p.name:
+            name = f"{p.stem}_{p.suffix[1:]}.jpg"
+        jobs.append((p, output_folder / name))
+    return jobs
+
+def compress_folder(input_folder, output_folder, workers: int = MAX_WORKERS,
+                    delete_source: bool = DELETE_SOURCE, max_size=800, quality=80,
+                    max_bytes: int | None = None, search_size: bool = False) -> dict:
+    """
+    input_folder の画像を圧縮して output_folder に保存する（max_bytes・search_size は compress_image と同じ）。
+    マニフェストに記録済み（名前・大きさ・更新時刻が同じ）のものは飛ばす。
+    件数と失敗の一覧を返す。
+    """
+    input_folder, output_folder = Path(input_folder), Path(output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    manifest = output_folder / MANIFEST_NAME
+    done = load_manifest(manifest)
+    result = {"compressed": 0, "skipped": 0, "failed": []}
+
+    todo = []
+    owners = {rec["output"]: rec["src"] for rec in done.values()}
+    for src, out in plan(input_folder, output_folder, owners):
+        key = source_key(src)
+        rec = done.get((key["src"], key["size"], key["mtime_ns"]))
+        if rec and (output_folder / rec["output"]).exists():
+            # 前回は記録まで済んで、元画像を消す前に止まったもの
+            if delete_source:
+                src.unlink(missing_ok=True)
+            result["skipped"] += 1
+        else:
+            todo.append((src, out, key))
+    print(f"=== {len(todo)} 枚を圧縮（済み {result['skipped']} 枚は飛ばす・{workers} プロセス） ===")
+
+    t0 = time.perf_counter()
+    with open(manifest, "a", encoding="utf-8") as mf, \
+            ProcessPoolExecutor(max_workers=max(1, workers)) as ex:
+        options = dict(max_size=max_size, quality=quality, max_bytes=max_bytes, search_size=search_size)
+        futures = {ex.submit(compress_to, src, out, **options): (src, out, key)
+                   for src, out, key in todo}
         try:
-            compress_image(input_path, output_path)
-            os.remove(input_path)  # 元画像を削除（※心配ならここはコメントアウトで）
-            print(f"✅ 圧縮完了：{filename} → {output_path}")
-        except Exception as e:
-            print(f"❌ エラー：{filename} - {e}")
\ No newline at end of file
+            for i, fut in enumerate(as_completed(futures), 1):
+                src, out, key = futures[fut]
+                try:
+                    info = fut.result()
+                except Exception as e:
+                    result["failed"].append((src.name, str(e)))
+                    print(f"❌ エラー：{src.name} - {e}")
+                    continue
+                append_manifest(mf, {**key, "output": out.name, "bytes": info["bytes"], "quality": info["quality"]})
+                if max_bytes and info["bytes"] > max_bytes:
+                    print(f"⚠️ 目標サイズに収まらず：{src.name} {info['bytes'] // 1024} KB（品質 {info['quality']}）")
+                if delete_source:
+                    os.remove(src)  # 記録してから元画像を削除
+                result["compressed"] += 1
+                print(f"✅ 圧縮完了 [{i}/{len(todo)}]：{src.name} → {out}")
+        except KeyboardInterrupt:
+            # 待っている分は捨てて止める（記録済みまでは次回飛ばす）
+            ex.shutdown(wait=True, cancel_futures=True)
+            raise
+    elapsed = time.perf_counter() - t0
+    if result["compressed"]:
+        print(f"[完了] {result['compressed']} 枚 {elapsed:.1f} 秒（{result['compressed'] / elapsed:.1f} 枚/秒）")
+    return result
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="フォルダ内の画像を縮小した JPEG にする")
+    ap.add_argument("input", nargs="?", default=INPUT_FOLDER, help="圧縮前のフォルダ")
+    ap.add_argument("output", nargs="?", default=OUTPUT_FOLDER, help="圧縮後のフォルダ")
+    ap.add_argument("--workers", type=int, default=MAX_WORKERS)
+    ap.add_argument("--keep", action="store_true", help="元画像を削除しない")
+    ap.add_argument("--max-size", type=int, default=800, help="長辺のピクセル数")
+    ap.add_argument("--quality", type=int, default=80, help="品質（--max-kb のときは上限）")
+    ap.add_argument("--max-kb", type=float, help="1枚をこの KB 以下にする（品質を二分探索）")
+    ap.add_argument("--search-size", action="store_true", help="--max-kb に収まらなければ長辺も縮める")
+    args = ap.parse_args(argv)
+    result = compress_folder(args.input, args.output, args.workers,
+                             delete_source=DELETE_SOURCE and not args.keep,
+                             max_size=args.max_size, quality=args.quality,
+                             max_bytes=int(args.max_kb * 1024) if args.max_kb else None,
+                             search_size=args.search_size)
+    return 1 if result["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,10 @@
 import pandas as pd
 import streamlit as st
 import matplotlib.pyplot as plt
-from nf3_scraper import make_url, fetch_nf3_data, TEAM_MAP
+from nf3_scraper import TEAM_MAP
+from nf3_cache import Nf3Cache
+
+CACHE_TTL = 6 * 3600  # 秒。成績表をメモリ/ディスクに保持する時間
 
 st.set_page_config(page_title="NPB成績ビューア", layout="wide")
 st.title("NPB 選手成績ビューア（by アスカ♥）")
@@ -11,10 +14,15 @@ year = st.selectbox("年度", list(range(2025, 2004, -1)))
 mode = st.radio("区分", ['野手', '投手'])
 team = st.selectbox("チーム", TEAM_MAP.keys())
 
-# データ取得
+# データ取得（再実行してもキャッシュ済みなら通信しない）
+@st.cache_resource
+def get_nf3_cache():
+    return Nf3Cache(ttl=CACHE_TTL)
+
 is_pitcher = (mode == '投手')
-url = make_url(year, team, is_pitcher)
-df = fetch_nf3_data(url, is_pitcher)
+nf3_cache = get_nf3_cache()
+df = nf3_cache.get(year, team, is_pitcher)
+nf3_cache.prefetch(year, is_pitcher)  # 他球団を先読みしてチーム切り替えを即時に
 
 ## 🔍 選手名の列を柔軟に探す
 for name_col in ['選手名', '名前', '氏名']:
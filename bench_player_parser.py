@@ -0,0 +1,52 @@
+# bench_player_parser.py
+# 保存済みの選手ページ（fixtures/yahoo_player/*.html）で player_parser の各バックエンドを計測する。
+# python bench_player_parser.py                     # 計測
+# python bench_player_parser.py --save 1000001 ...  # 指定 ID のページを保存してから計測
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from player_parser import BACKENDS, parse_bs4
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "yahoo_player"
+
+def save_fixtures(player_ids, base_url="https://baseball.yahoo.co.jp"):
+    import requests
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    for pid in player_ids:
+        res = requests.get(f"{base_url}/npb/player/{pid}/top", timeout=10)
+        res.raise_for_status()
+        (FIXTURE_DIR / f"{pid}.html").write_text(res.text, encoding="utf-8")
+        print(f"保存: {pid}.html")
+
+def bench(pages: list[str], repeat: int):
+    expected = [parse_bs4(html) for html in pages]
+    print(f"{'backend':<12}{'ms/page(中央値)':>16}{'ms/page(最小)':>14}  一致")
+    for name, parse in BACKENDS.items():
+        per_page = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            results = [parse(html) for html in pages]
+            per_page.append((time.perf_counter() - t0) * 1000 / len(pages))
+        same = "OK" if results == expected else "NG"
+        print(f"{name:<12}{statistics.median(per_page):>16.3f}{min(per_page):>14.3f}  {same}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--save", nargs="*", type=int, default=[], help="先に保存する選手 ID")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    if args.save:
+        save_fixtures(args.save)
+    pages = [p.read_text(encoding="utf-8") for p in sorted(FIXTURE_DIR.glob("*.html"))]
+    if not pages:
+        print(f"{FIXTURE_DIR} に HTML がありません。--save <選手ID> で保存してください。")
+        return
+    print(f"{len(pages)} ページ × {args.repeat} 回")
+    bench(pages, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_sabermetrics.py
+# sabermetrics.compute_metrics と、置き換える前の指標計算（npb_data / nf3_scraper の旧コード）を
+# スクレイピング直後と同じ「文字列の表」で比べる。
+# python bench_sabermetrics.py --rows 300000
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from sabermetrics import compute_metrics
+
+def make_tables(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    pa = rng.integers(1, 700, n)
+    ab = (pa * 0.88).astype(int)
+    h = (ab * rng.uniform(0.15, 0.35, n)).astype(int)
+    bat = pd.DataFrame({
+        '選手名': [f'選手{i}' for i in range(n)],
+        '打席': [f'{v:,}' for v in pa], '打数': ab.astype(str), '安打': h.astype(str),
+        '二塁打': (h // 5).astype(str), '三塁打': (h // 40).astype(str), '本塁打': (h // 8).astype(str),
+        '四球': (pa // 12).astype(str), '死球': (pa // 90).astype(str), '犠飛': (pa // 150).astype(str),
+        '三振': (pa // 5).astype(str),
+        '打率': np.char.mod('%.3f', h / ab.clip(1)), '出塁率': np.char.mod('%.3f', rng.uniform(.25, .42, n)),
+        '長打率': np.char.mod('%.3f', rng.uniform(.3, .6, n)),
+    })
+    outs = rng.integers(1, 600, n)
+    ip = [f'{o // 3}.{o % 3}' for o in outs]
+    pit = pd.DataFrame({
+        '選手名': [f'投手{i}' for i in range(n)], '投球回': ip,
+        '奪三振': (outs // 3).astype(str), '与四球': (outs // 9).astype(str),
+        '被安打': (outs // 3).astype(str), '被本塁打': (outs // 30).astype(str),
+        '与死球': (outs // 80).astype(str),
+    })
+    return bat, pit
+
+# --- 置き換え前のコード（npb_data + nf3_scraper の数値化）---
+def legacy_batter(df):
+    df = df.copy()
+    df.columns = df.columns.str.replace(r'\s+', '', regex=True)
+    df = df.rename(columns={'打率': 'AVG', '出塁率': 'OBP', '長打率': 'SLG', '四球': 'BB', '三振': 'SO', '打席': 'PA'})
+    for col in ['AVG', 'OBP', 'SLG', 'BB', 'SO', 'PA']:
+        df[col] = df[col].astype(str).str.replace(',', '').str.strip()
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['OPS'] = df['OBP'] + df['SLG']
+    df['ISO'] = df['SLG'] - df['AVG']
+    df['BB%'] = (df['BB'] / df['PA']).round(3)
+    df['K%'] = (df['SO'] / df['PA']).round(3)
+    return df
+
+def legacy_pitcher(df):
+    df = df.copy()
+    for col in ['投球回', '奪三振', '与四球', '被安打']:
+        df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '').str.strip(), errors='coerce')
+    df['WHIP'] = (df['与四球'] + df['被安打']) / df['投球回']
+    df['K-BB'] = df['奪三振'] - df['与四球']
+    df['奪三振率'] = df['奪三振'] / df['投球回']
+    df[['WHIP', 'K-BB', '奪三振率']] = df[['WHIP', 'K-BB', '奪三振率']].round(3)
+    return df
+
+def timeit(fn, df, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=300_000)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    bat, pit = make_tables(args.rows)
+    print(f'{args.rows:,} 行 × {args.repeat} 回（最良値）')
+    rows = [
+        ('打者 旧コード (OPS/ISO/BB%/K%)', legacy_batter, bat),
+        ('打者 compute_metrics (+wOBA)', lambda d: compute_metrics(d, False), bat),
+        ('投手 旧コード (WHIP/K-BB/奪三振率)', legacy_pitcher, pit),
+        ('投手 compute_metrics (+K9/FIP, 投球回換算)', lambda d: compute_metrics(d, True), pit),
+    ]
+    for label, fn, df in rows:
+        print(f'{label:<44}{timeit(fn, df, args.repeat) * 1000:10.1f} ms')
+
+if __name__ == '__main__':
+    main()
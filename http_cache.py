@@ -0,0 +1,207 @@
+# http_cache.py
+# スクレイパー共通のディスクHTTPキャッシュ。
+#  - ETag / Last-Modified があれば条件付きGET（304なら本文は再利用）
+#  - URLごとのTTL（TTL_RULES）内なら通信そのものをしない
+#  - 合計サイズが MAX_BYTES を超えたら最後に使った日時が古い順に削除（LRU）
+# 使い方:
+#   import http_cache
+#   res = http_cache.get(url)          # res.text / res.content / res.from_cache
+#   python http_cache.py --stats       # キャッシュの状況
+#   python http_cache.py --clear       # 全削除
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+# ====== 設定 ======
+CACHE_DIR = Path(os.environ.get("HTTP_CACHE_DIR", Path(__file__).resolve().parent / ".http_cache"))
+MAX_BYTES = 500 * 1024 * 1024   # キャッシュ全体の上限
+DEFAULT_TTL = 0                 # 秒。0 = 毎回条件付きGETで確認
+TIMEOUT = 10
+# URL（正規表現）ごとの TTL 秒。上から順に最初に当たったものを使う
+TTL_RULES = [
+    (r"baseball\.yahoo\.co\.jp/npb/player/", 7 * 24 * 3600),  # 選手プロフィール
+    (r"baseball\.yahoo\.co\.jp/npb/teams/", 24 * 3600),       # 球団の選手一覧
+    (r"npb\.jp/bis/", 6 * 3600),                              # NPB公式の成績
+    (r"nf3\.sakura\.ne\.jp/", 6 * 3600),                      # nf3 の成績
+    (r"news\.yahoo\.co\.jp", 10 * 60),                        # ニュース
+]
+# ===================
+
+class CachedResponse:
+    """requests.Response の必要な部分だけを真似た応答"""
+    def __init__(self, url, status_code, content, encoding=None, headers=None, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.headers = headers or {}
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+class HttpCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES, ttl_rules=TTL_RULES,
+                 default_ttl=DEFAULT_TTL, session=None):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_rules = [(re.compile(pat), ttl) for pat, ttl in ttl_rules]
+        self.default_ttl = default_ttl
+        self.session = session or requests.Session()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.dir / "index.sqlite3"), check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY, file TEXT, size INTEGER, encoding TEXT,
+                etag TEXT, last_modified TEXT, fetched_at REAL, accessed_at REAL
+            )""")
+        self.db.commit()
+
+    def ttl_for(self, url: str) -> float:
+        for pat, ttl in self.ttl_rules:
+            if pat.search(url):
+                return ttl
+        return self.default_ttl
+
+    def _lookup(self, url):
+        with self.lock:
+            return self.db.execute(
+                "SELECT file, encoding, etag, last_modified, fetched_at FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+
+    def _read_body(self, file: str) -> bytes | None:
+        try:
+            return (self.dir / file).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _touch(self, url, refreshed: bool):
+        now = time.time()
+        with self.lock:
+            if refreshed:
+                self.db.execute("UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            else:
+                self.db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (now, url))
+            self.db.commit()
+
+    def _store(self, url, res: requests.Response):
+        file = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        path = self.dir / file[:2] / file
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".tmp{threading.get_ident()}")
+        tmp.write_bytes(res.content)
+        os.replace(tmp, path)
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, f"{file[:2]}/{file}", len(res.content), res.encoding,
+                 res.headers.get("ETag"), res.headers.get("Last-Modified"), now, now),
+            )
+            self.db.commit()
+        self.evict()
+
+    def get(self, url, ttl=None, session=None, before_request=None, timeout=TIMEOUT) -> CachedResponse:
+        """
+        キャッシュ経由で GET。TTL 内ならディスクから、期限切れなら条件付きGETで確認する。
+        before_request は実際に通信する直前に呼ばれる（レート制限用）。
+        200 以外の応答は保存せずそのまま返す。
+        """
+        ttl = self.ttl_for(url) if ttl is None else ttl
+        entry = self._lookup(url)
+        body = self._read_body(entry[0]) if entry else None
+        if body is not None:
+            file, encoding, etag, last_modified, fetched_at = entry
+            if time.time() - fetched_at < ttl:
+                self._touch(url, refreshed=False)
+                return CachedResponse(url, 200, body, encoding, from_cache=True)
+
+        headers = {}
+        if body is not None:
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        if before_request:
+            before_request()
+        res = (session or self.session).get(url, headers=headers, timeout=timeout)
+
+        if res.status_code == 304 and body is not None:
+            self._touch(url, refreshed=True)
+            return CachedResponse(url, 200, body, encoding, res.headers, from_cache=True)
+        if res.status_code == 200:
+            self._store(url, res)
+        return CachedResponse(url, res.status_code, res.content, res.encoding, res.headers)
+
+    def evict(self):
+        """合計サイズが上限を超えていたら、最後に使った日時が古いものから消す"""
+        with self.lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for url, file, size in self.db.execute("SELECT url, file, size FROM entries ORDER BY accessed_at"):
+                if total <= self.max_bytes:
+                    break
+                victims.append((url, file))
+                total -= size
+            self.db.executemany("DELETE FROM entries WHERE url = ?", [(u,) for u, _ in victims])
+            self.db.commit()
+        for _, file in victims:
+            (self.dir / file).unlink(missing_ok=True)
+
+    def stats(self) -> tuple[int, int]:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+    def clear(self):
+        with self.lock:
+            files = [f for (f,) in self.db.execute("SELECT file FROM entries")]
+            self.db.execute("DELETE FROM entries")
+            self.db.commit()
+        for file in files:
+            (self.dir / file).unlink(missing_ok=True)
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def default_cache() -> HttpCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = HttpCache()
+        return _default_cache
+
+def get(url, **kwargs) -> CachedResponse:
+    """既定のキャッシュ（CACHE_DIR）で GET"""
+    return default_cache().get(url, **kwargs)
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="HTTPキャッシュの管理")
+    ap.add_argument("--stats", action="store_true")
+    ap.add_argument("--clear", action="store_true")
+    args = ap.parse_args()
+    cache = default_cache()
+    if args.clear:
+        cache.clear()
+        print("キャッシュを削除しました")
+    count, size = cache.stats()
+    print(f"{cache.dir}: {count} 件 / {size / 1024 / 1024:.1f} MB")
@@ -1,4 +1,4 @@
-import requests
+import http_cache
 from bs4 import BeautifulSoup
 import smtplib # メール送信の標準ライブラリ
 from email.mime.text import MIMEText # メールの内容を作成するライブラリ
@@ -15,7 +15,7 @@ RECEIVER_EMAIL = 's.hayakawa1995@gmail.com' # 例: 'shouchan@gmail.com'
 
 # 2. ニュース収集部分（変更なし）
 url = "https://news.yahoo.co.jp/"
-response = requests.get(url)
+response = http_cache.get(url)
 soup = BeautifulSoup(response.text, "html.parser")
 topics = soup.find_all("a", href=lambda href: href and "pickup" in href)
 
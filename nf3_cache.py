@@ -0,0 +1,76 @@
+# nf3_cache.py
+# nf3 の成績表を (年度, チーム, 投手/野手) ごとにキャッシュする。
+#  - まずメモリ、なければ Parquet の warehouse（npb_warehouse.py）、それも期限切れなら取得し直す
+#  - prefetch() で同じ年度の他球団をバックグラウンドで先読み
+# Streamlit では st.cache_resource で1つだけ作って使い回す（app.py 参照）
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+
+from nf3_scraper import TEAM_MAP
+from npb_warehouse import ID_COLUMNS, default_warehouse, nf3_part, refresh_nf3
+
+# ====== 設定 ======
+TTL = 6 * 3600        # 秒。これより古いデータは取得し直す
+PREFETCH_WORKERS = 4
+# ===================
+
+class Nf3Cache:
+    def __init__(self, ttl=TTL, prefetch_workers=PREFETCH_WORKERS):
+        self.ttl = ttl
+        self.warehouse = default_warehouse()
+        self.memory: dict[tuple, tuple[float, pd.DataFrame]] = {}
+        self.inflight: dict[tuple, Future] = {}
+        self.lock = threading.RLock()  # 完了済み Future のコールバックは同じスレッドで即実行される
+        self.pool = ThreadPoolExecutor(max_workers=prefetch_workers)
+
+    def _fresh(self, fetched_at: float) -> bool:
+        return time.time() - fetched_at < self.ttl
+
+    def _load(self, key) -> pd.DataFrame:
+        """warehouse が新しければそこから読み、古ければ取り直して書き込む"""
+        year, team, is_pitcher = key
+        role = 'pitcher' if is_pitcher else 'batter'
+        failures = refresh_nf3([year], [team], [role], max_workers=1, max_age=self.ttl)
+        if failures:
+            raise failures[0][3]
+        df = self.warehouse.read(*nf3_part(year, team, role))
+        if df is None:  # 取得はできたが表が空で、パーティションが書かれなかった
+            raise LookupError(f"nf3 のデータがありません: {year} {team} {role}")
+        df = df.drop(columns=ID_COLUMNS)
+        with self.lock:
+            self.memory[key] = (time.time(), df)
+            self.inflight.pop(key, None)
+        return df
+
+    def _future(self, key) -> Future | pd.DataFrame:
+        """メモリにあれば DataFrame、なければ取得中（または新規）の Future を返す"""
+        with self.lock:
+            hit = self.memory.get(key)
+            if hit and self._fresh(hit[0]):
+                return hit[1]
+            fut = self.inflight.get(key)
+            if fut is None:
+                fut = self.inflight[key] = self.pool.submit(self._load, key)
+                fut.add_done_callback(self._forget_failure(key))
+            return fut
+
+    def get(self, year, team, is_pitcher=False) -> pd.DataFrame:
+        res = self._future((year, team, is_pitcher))
+        return res.result() if isinstance(res, Future) else res
+
+    def prefetch(self, year, is_pitcher=False, teams=None):
+        """同じ年度の他球団を裏で読み込んでおく（失敗しても無視）"""
+        for team in teams or TEAM_MAP:
+            self._future((year, team, is_pitcher))
+
+    def _forget_failure(self, key):
+        """取得に失敗した Future は捨てて、次の get() で取り直せるようにする"""
+        def callback(fut: Future):
+            if fut.exception() is not None:
+                with self.lock:
+                    self.inflight.pop(key, None)
+        return callback
@@ -1,4 +1,8 @@
+import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
+import http_cache
+from sabermetrics import compute_metrics
 
 TEAM_MAP = {
     '巨人': {'leg': 0, 'tm': 'G'},
@@ -22,51 +26,65 @@ def make_url(year, team_name, is_pitcher=False):
     fp = 1 if is_pitcher else 0
     return f"https://nf3.sakura.ne.jp/php/stat_disp/stat_disp.php?y={year}&leg={leg}&tm={tm}&fp={fp}&dn=1&dk=0"
 
-def fetch_nf3_data(url, is_pitcher=False):
-    df = pd.read_html(url, header=0)[0]
-    print("📌 列名一覧：", df.columns.tolist())
+ROLES = {'batter': False, 'pitcher': True}
 
-    df.columns = df.columns.str.replace(r'\s+', '', regex=True)
-
-    if not is_pitcher:
-        # ✅ ここからコピペで上書き！
-        df = df.rename(columns={
-            '打率': 'AVG', '出塁率': 'OBP', '長打率': 'SLG',
-            '四球': 'BB', '三振': 'SO', '打席': 'PA'
-        })
-
-        cols_to_float = ['AVG', 'OBP', 'SLG', 'BB', 'SO', 'PA']
-        for col in cols_to_float:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(',', '').str.strip()
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+def fetch_nf3_data(url, is_pitcher=False, verbose=True):
+    df = pd.read_html(io.BytesIO(http_cache.get(url).content), header=0)[0]
+    if verbose:
+        print("📌 列名一覧：", df.columns.tolist())
 
+    df = compute_metrics(df, is_pitcher)
+    if verbose and not is_pitcher:
         print("✅ AVG型:", df['AVG'].dtype)
         print("✅ SLG型:", df['SLG'].dtype)
+    return df
 
-        df['OPS'] = df['OBP'] + df['SLG']
-        df['ISO'] = df['SLG'] - df['AVG']
-        df['BB%'] = (df['BB'] / df['PA']).round(3)
-        df['K%'] = (df['SO'] / df['PA']).round(3)
-
-    else:
-        df = df.rename(columns={
-            '投球回': 'IP', '奪三振': 'SO', '与四球': 'BB', '被安打': 'H'
-        })
 
-        cols_to_float = ['IP', 'SO', 'BB', 'H']
-        for col in cols_to_float:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.replace(',', '').str.strip()
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+def _tidy(df, year, team_name, role):
+    """繰り返しヘッダー行・合計行を除き、数値列を数値型にして識別列を付ける"""
+    first = df.columns[0]
+    df = df[df[first].astype(str) != first]
+    df = df[~df.apply(lambda col: col.astype(str).eq('合計')).any(axis=1)].copy()
+    for col in [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]:
+        s = df[col].astype(str).str.replace(',', '').str.strip()
+        num = pd.to_numeric(s, errors='coerce')
+        # 空欄・'-' 以外がすべて数値に変換できた列だけ数値型にする
+        if num.notna().sum() == (~s.isin(['', '-', 'nan'])).sum():
+            df[col] = num
+    df.insert(0, 'role', role)
+    df.insert(0, 'league', 'セ' if TEAM_MAP[team_name]['leg'] == 0 else 'パ')
+    df.insert(0, 'team', team_name)
+    df.insert(0, 'year', year)
+    return df
 
-        if all(col in df.columns for col in ['IP', 'BB', 'H', 'SO']):
-            df['WHIP'] = (df['BB'] + df['H']) / df['IP']
-            df['奪三振率'] = df['SO'] / df['IP']
-            df[['WHIP', '奪三振率']] = df[['WHIP', '奪三振率']].round(3)
-        else:
-            df['WHIP'] = None
-            df['奪三振率'] = None
+def fetch_nf3_bulk(years=(), teams=None, roles=('batter', 'pitcher'), max_workers=8, tasks=None):
+    """
+    (年度, チーム, 野手/投手) の全組み合わせを並列に取得して1つの DataFrame にまとめる。
+    tasks に (year, team, role) のリストを渡すと、その組み合わせだけを取得する。
+    失敗したタスクは飛ばし、(year, team, role, エラー) のリストとして一緒に返す。
+    """
+    if tasks is None:
+        tasks = [(y, t, r) for y in years for t in (teams or TEAM_MAP) for r in roles]
+    frames, failures = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {
+            ex.submit(fetch_nf3_data, make_url(y, t, ROLES[r]), ROLES[r], False): (y, t, r)
+            for y, t, r in tasks
+        }
+        for fut in as_completed(futures):
+            y, t, r = futures[fut]
+            try:
+                frames.append(_tidy(fut.result(), y, t, r))
+            except Exception as e:
+                failures.append((y, t, r, e))
+                print(f"❌ 取得失敗: {y} {t} {r} ({e})")
 
-    
-    return df
+    if not frames:
+        return pd.DataFrame(), failures
+    df = pd.concat(frames, ignore_index=True)
+    df['year'] = df['year'].astype('int16')
+    df['team'] = pd.Categorical(df['team'], categories=list(TEAM_MAP))
+    df['league'] = pd.Categorical(df['league'], categories=['セ', 'パ'])
+    df['role'] = pd.Categorical(df['role'], categories=list(ROLES))
+    df = df.sort_values(['year', 'league', 'team', 'role'], kind='stable', ignore_index=True)
+    return df, failures
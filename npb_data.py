@@ -1,17 +1,20 @@
 import pandas as pd
-import requests
 from bs4 import BeautifulSoup
+import http_cache
+from npb_warehouse import default_warehouse
+from sabermetrics import compute_metrics
 
 # NPB 2024 成績ページ
+SEASON = 2024
 URLS = {
-    '打者_セ': 'https://npb.jp/bis/2024/stats/bat_c.html',
-    '打者_パ': 'https://npb.jp/bis/2024/stats/bat_p.html',
-    '投手_セ': 'https://npb.jp/bis/2024/stats/pit_c.html',
-    '投手_パ': 'https://npb.jp/bis/2024/stats/pit_p.html',
+    '打者_セ': f'https://npb.jp/bis/{SEASON}/stats/bat_c.html',
+    '打者_パ': f'https://npb.jp/bis/{SEASON}/stats/bat_p.html',
+    '投手_セ': f'https://npb.jp/bis/{SEASON}/stats/pit_c.html',
+    '投手_パ': f'https://npb.jp/bis/{SEASON}/stats/pit_p.html',
 }
 
 def fetch_table(url):
-    res = requests.get(url)
+    res = http_cache.get(url)
     res.encoding = 'utf-8'
     soup = BeautifulSoup(res.text, 'html.parser')
     table = soup.find('table')
@@ -22,41 +25,29 @@ def fetch_table(url):
 
 
 def add_batter_metrics(df):
-    df = df.copy()
-    df.columns = df.columns.str.replace(r'\s+', '', regex=True)  # 改行・空白を全て除去
-    df = df.rename(columns={
-        '打率': 'AVG',
-        '出塁率': 'OBP',
-        '長打率': 'SLG',
-        '四球': 'BB',
-        '三振': 'SO',
-        '打席': 'PA',
-    })
-
-    df['OPS'] = df['OBP'] + df['SLG']
-    df['ISO'] = df['SLG'] - df['AVG']
-    df['BB%'] = df['BB'] / df['PA']
-    df['K%'] = df['SO'] / df['PA']
-    df[['OPS', 'ISO', 'BB%', 'K%']] = df[['OPS', 'ISO', 'BB%', 'K%']].round(3)
-
-    return df
+    """OPS / ISO / BB% / K% / wOBA を追加（計算は sabermetrics.py）"""
+    return compute_metrics(df, is_pitcher=False)
 
 
 def add_pitcher_metrics(df):
-    df = df.copy()
-    df['WHIP'] = (df['与四球'] + df['被安打']) / df['投球回']
-    df['K-BB'] = df['奪三振'] - df['与四球']
-    df['奪三振率'] = df['奪三振'] / df['投球回']
-    df[['WHIP', 'K-BB', '奪三振率']] = df[['WHIP', 'K-BB', '奪三振率']].round(3)
-    return df
+    """WHIP / K-BB / K9 / 奪三振率 / FIP を追加（投球回の .1/.2 は 1/3・2/3 として扱う）"""
+    return compute_metrics(df, is_pitcher=True)
+
+def load_table(key):
+    """warehouse（Parquet）にあればそこから、なければ取得して保存"""
+    role = 'batter' if key.startswith('打者') else 'pitcher'
+    league = 'C' if key.endswith('セ') else 'P'
+    return default_warehouse().get_or_fetch(
+        lambda: fetch_table(URLS[key]), 'npb', SEASON, league, role, 'ALL'
+    )
 
 def load_all_data():
     batters = pd.concat([
-        add_batter_metrics(fetch_table(URLS['打者_セ'])),
-        add_batter_metrics(fetch_table(URLS['打者_パ']))
+        add_batter_metrics(load_table('打者_セ')),
+        add_batter_metrics(load_table('打者_パ'))
     ])
     pitchers = pd.concat([
-        add_pitcher_metrics(fetch_table(URLS['投手_セ'])),
-        add_pitcher_metrics(fetch_table(URLS['投手_パ']))
+        add_pitcher_metrics(load_table('投手_セ')),
+        add_pitcher_metrics(load_table('投手_パ'))
     ])
     return batters, pitchers
@@ -0,0 +1,158 @@
+# npb_warehouse.py
+# スクレイピングした成績表をローカルの Parquet に貯める。
+#   warehouse/<source>/season=<年>/league=<C|P|ALL>/role=<batter|pitcher>/team=<コード>/part.parquet
+# 1ファイル = 1チーム・1シーズン・投打どちらか。更新はこの単位で差し替える（upsert）。
+#  - 終わったシーズンは一度取れば再取得しない
+#  - 今シーズン（と nf3 の y=0）は max_age 秒を過ぎたら取り直し、中身が変わったときだけ書き換える
+#  - 読み込みは pyarrow の memory_map で、必要な列・パーティションだけ
+# 例:
+#   from npb_warehouse import load_nf3
+#   df = load_nf3(range(2005, 2025))   # 足りない・古い分だけ取得してから読み込む
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ====== 設定 ======
+WAREHOUSE_DIR = Path(__file__).resolve().parent / "warehouse"
+CURRENT_MAX_AGE = 6 * 3600  # 今シーズン分を取り直すまでの秒数
+# ===================
+
+ID_COLUMNS = ['year', 'team', 'league', 'role']
+
+class Warehouse:
+    def __init__(self, root=WAREHOUSE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / "_manifest.json"
+        self.lock = threading.Lock()
+        self.manifest = {}
+        if self.manifest_path.exists():
+            self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+
+    @staticmethod
+    def key(source, season, league, role, team) -> str:
+        return f"{source}/season={season}/league={league}/role={role}/team={team}"
+
+    def path(self, *part) -> Path:
+        return self.root / self.key(*part) / "part.parquet"
+
+    def is_fresh(self, *part, max_age=CURRENT_MAX_AGE) -> bool:
+        entry = self.manifest.get(self.key(*part))
+        if entry is None or not self.path(*part).exists():
+            return False
+        season = part[1]
+        if 0 < season < date.today().year:  # 終わったシーズンは変わらない
+            return True
+        return time.time() - entry["fetched_at"] < max_age
+
+    def _save_manifest(self):
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def write(self, df: pd.DataFrame, *part) -> bool:
+        """1パーティションを差し替える。中身が前回と同じなら書き込まずに False"""
+        digest = hashlib.sha1(
+            pd.util.hash_pandas_object(df, index=False).values.tobytes()
+            + json.dumps([str(c) for c in df.columns], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        key = self.key(*part)
+        with self.lock:
+            old = self.manifest.get(key)
+            changed = old is None or old["digest"] != digest or not self.path(*part).exists()
+            if changed:
+                path = self.path(*part)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                pq.write_table(pa.Table.from_pandas(_arrow_safe(df), preserve_index=False), tmp)
+                os.replace(tmp, path)
+            self.manifest[key] = {"fetched_at": time.time(), "rows": len(df), "digest": digest}
+            self._save_manifest()
+        return changed
+
+    def read(self, *part, columns=None) -> pd.DataFrame | None:
+        path = self.path(*part)
+        if not path.exists():
+            return None
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    def load(self, source, seasons=None, leagues=None, roles=None, teams=None, columns=None) -> pd.DataFrame:
+        """条件に合うパーティションだけを memory_map で読み、縦に連結する"""
+        def pick(values):
+            return {str(v) for v in values} if values is not None else None
+        want = [pick(seasons), pick(leagues), pick(roles), pick(teams)]
+        frames = []
+        for path in sorted((self.root / source).glob("season=*/league=*/role=*/team=*/part.parquet")):
+            parts = [p.split("=", 1)[1] for p in path.parent.relative_to(self.root / source).parts]
+            if all(w is None or v in w for w, v in zip(want, parts)):
+                table = pq.read_table(path, memory_map=True)
+                if columns is not None:
+                    table = table.select([c for c in columns if c in table.column_names])
+                frames.append(table.to_pandas())
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def get_or_fetch(self, fetch, *part, max_age=CURRENT_MAX_AGE) -> pd.DataFrame:
+        """新しければ Parquet から、古ければ fetch() して書き込んでから返す（どちらも Parquet から読んだ同じ形の表）"""
+        if not self.is_fresh(*part, max_age=max_age):
+            self.write(fetch(), *part)
+        return self.read(*part)
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """型が混ざった object 列（数値と文字列など）は文字列にそろえる"""
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for col in df.columns:
+        if df[col].dtype == object and df[col].map(type).nunique() > 1:
+            df[col] = df[col].astype(str)
+    return df
+
+_default = None
+_default_lock = threading.Lock()
+
+def default_warehouse() -> Warehouse:
+    global _default
+    with _default_lock:  # スレッドから同時に呼ばれても Warehouse（とそのロック）は1つだけ
+        if _default is None:
+            _default = Warehouse()
+    return _default
+
+# --- nf3 ---
+def nf3_part(year, team_name, role) -> tuple:
+    from nf3_scraper import TEAM_MAP
+    info = TEAM_MAP[team_name]
+    return ("nf3", year, "C" if info['leg'] == 0 else "P", role, info['tm'])
+
+def refresh_nf3(years, teams=None, roles=('batter', 'pitcher'), max_workers=8, max_age=CURRENT_MAX_AGE):
+    """無い・古いパーティションだけ並列に取り直して書き込む。失敗リストを返す"""
+    from nf3_scraper import TEAM_MAP, fetch_nf3_bulk
+    wh = default_warehouse()
+    stale = [(y, t, r) for y in years for t in (teams or TEAM_MAP) for r in roles
+             if not wh.is_fresh(*nf3_part(y, t, r), max_age=max_age)]
+    if not stale:
+        return []
+    df, failures = fetch_nf3_bulk(tasks=stale, max_workers=max_workers)
+    if df.empty:  # 全部失敗した（または表が空だった）: 書くものがない
+        print(f"📦 warehouse: {len(stale)} パーティション取得 / 0 件更新 / {len(failures)} 件失敗")
+        return failures
+    changed = 0
+    for (y, t, r), part_df in df.groupby(['year', 'team', 'role'], observed=True):
+        part_df = part_df.dropna(axis=1, how='all')  # 投打で列が違うので空列は落とす
+        changed += wh.write(part_df.reset_index(drop=True), *nf3_part(int(y), t, r))
+    print(f"📦 warehouse: {len(stale)} パーティション取得 / {changed} 件更新 / {len(failures)} 件失敗")
+    return failures
+
+def load_nf3(years, teams=None, roles=('batter', 'pitcher'), columns=None, refresh=True) -> pd.DataFrame:
+    from nf3_scraper import TEAM_MAP
+    if refresh:
+        refresh_nf3(years, teams, roles)
+    codes = [TEAM_MAP[t]['tm'] for t in teams] if teams else None
+    return default_warehouse().load("nf3", seasons=years, roles=roles, teams=codes, columns=columns)
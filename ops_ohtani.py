@@ -1,5 +1,9 @@
+import io
 import pandas as pd
 import numpy as np
+import http_cache
+from npb_warehouse import default_warehouse
+from player_identity import PlayerIndex, join_roles
 
 # 全チームのコードリスト
 TM_CODES = {
@@ -8,6 +12,12 @@ TM_CODES = {
     'M': 'ロッテ', 'E': '楽天', 'B': 'オリックス', 'L': '西武'
 }
 
+# 取得した表は warehouse（Parquet）に保存し、新しいうちは再取得しない
+wh = default_warehouse()
+
+def read_last_table(url):
+    return pd.read_html(io.BytesIO(http_cache.get(url).content), header=0)[-1]
+
 # データを格納するためのリストを2つ用意
 all_pitching_data = [] # fp=1
 all_batting_data = []  # fp=0
@@ -24,16 +34,14 @@ for code, team_name in TM_CODES.items():
     
     try:
         # 投手データ取得
-        df_list_p = pd.read_html(url_pitching, header=0)
-        df_p = df_list_p[-1] 
+        df_p = wh.get_or_fetch(lambda: read_last_table(url_pitching), 'nf3_current', 0, 'ALL', 'pitcher', code)
         df_p = df_p[df_p['背番'] != '背番']
         df_p['Team'] = team_name
         df_p['DataType'] = 'P' # 投手であることを示すフラグ
         all_pitching_data.append(df_p)
         
         # 打者データ取得
-        df_list_b = pd.read_html(url_batting, header=0)
-        df_b = df_list_b[-1]
+        df_b = wh.get_or_fetch(lambda: read_last_table(url_batting), 'nf3_current', 0, 'ALL', 'batter', code)
         df_b = df_b[df_b['背番'] != '背番']
         df_b['Team'] = team_name
         df_b['DataType'] = 'B' # 打者であることを示すフラグ
@@ -54,10 +62,6 @@ print("=" * 50)
 print("投手マスター (先頭3行):\n", df_pitching_master[['名前', 'Team', '防御率', '回数', '三振']].head(3))
 print("\n打者マスター (先頭3行):\n", df_batting_master[['名前', 'Team', '打率', '安打', '本塁']].head(3))
 
-# 2. マスターデータの作成 (pd.concatの行はそのまま)
-df_pitching_master = pd.concat(all_pitching_data, ignore_index=True)
-df_batting_master = pd.concat(all_batting_data, ignore_index=True)
-
 # ⭐️⭐️⭐️ 追加するコードはここ！ ⭐️⭐️⭐️
 df_pitching_master = df_pitching_master[df_pitching_master['名前'] != '合計'].copy()
 df_batting_master = df_batting_master[df_batting_master['名前'] != '合計'].copy()
@@ -67,12 +71,14 @@ df_batting_master = df_batting_master[df_batting_master['名前'] != '合計'].c
 
 # ⭐️⭐️⭐️ 投打データの結合に挑戦 ⭐️⭐️⭐️
 
-# 投手と打者の両方のデータが存在する選手を「名前」をキーに結合する
+# 名前だけだと同姓同名がぶつかるので、(正規化した名前, チーム, 背番号) で選手IDを振って結合する
 # how='outer' は、どちらかの表にしか存在しない選手（例：純粋な野手）も残すための指定よ
-df_master_combined = pd.merge(
-    df_pitching_master, 
-    df_batting_master, 
-    on='名前', 
+player_index = PlayerIndex()
+df_master_combined = join_roles(
+    df_pitching_master,
+    df_batting_master,
+    player_index,
+    name='名前', team='Team', number='背番',
     how='outer',
     suffixes=('_P', '_B') # 列名の衝突を防ぐため、サフィックスを付ける
 )
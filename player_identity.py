@@ -0,0 +1,79 @@
+# player_identity.py
+# 選手の名寄せ用インデックス。
+#  - 名前を正規化（NFKC・空白除去・異体字をそろえる・利き腕などの記号を除去）
+#  - (正規化した名前, チーム, 背番号) を1人の選手として player_id を1回だけ振る
+#  - 投手表と打者表は player_id（＋必要なら年度）をインデックスにして結合する
+# 例:
+#   idx = PlayerIndex()
+#   combined = join_roles(df_pitching, df_batting, idx, name='名前', team='Team', number='背番')
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# 表記ゆれしやすい異体字 → 通常の字
+VARIANTS = str.maketrans({"髙": "高", "﨑": "崎", "𠮷": "吉", "濵": "浜", "德": "徳", "邉": "辺", "邊": "辺"})
+# 名前の前後に付く記号（* 左投げ、+ 両打ちなど）と空白
+NAME_NOISE = re.compile(r"[\s*＊+＋・()（）]")
+
+def normalize_name(name) -> str:
+    if name is None or (isinstance(name, float) and np.isnan(name)):
+        return ""
+    s = unicodedata.normalize("NFKC", str(name)).translate(VARIANTS)
+    return NAME_NOISE.sub("", s)
+
+def normalize_number(number) -> str:
+    """背番号は '00' と '0' を区別するため文字列のまま扱う（12.0 のような float は整数に戻す）"""
+    if number is None or (isinstance(number, float) and np.isnan(number)):
+        return ""
+    if isinstance(number, float) and number.is_integer():
+        number = int(number)
+    return unicodedata.normalize("NFKC", str(number)).strip()
+
+class PlayerIndex:
+    """(名前, チーム, 背番号) → player_id の対応表。新しいキーだけ番号を追加していく"""
+    KEY = ["name_key", "team_key", "number_key"]
+
+    def __init__(self):
+        self.table = pd.DataFrame(columns=self.KEY + ["player_id"]).set_index(self.KEY)
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.table)
+
+    def _keys(self, df, name, team, number) -> pd.MultiIndex:
+        # 同じ文字列は1回だけ正規化する
+        names = df[name].map(dict((v, normalize_name(v)) for v in pd.unique(df[name])))
+        teams = df[team].astype(str) if team else pd.Series("", index=df.index)
+        numbers = df[number].map(normalize_number) if number else pd.Series("", index=df.index)
+        return pd.MultiIndex.from_arrays([names, teams, numbers], names=self.KEY)
+
+    def resolve(self, df, name="名前", team="Team", number="背番") -> np.ndarray:
+        """df の各行の player_id を返す。未登録の選手はここで登録する"""
+        keys = self._keys(df, name, team, number)
+        pos = self.table.index.get_indexer(keys)
+        new = keys[pos == -1].unique()
+        if len(new):
+            ids = np.arange(self.next_id, self.next_id + len(new))
+            self.next_id += len(new)
+            self.table = pd.concat([self.table, pd.DataFrame({"player_id": ids}, index=new)])
+            pos = self.table.index.get_indexer(keys)
+        return self.table["player_id"].to_numpy()[pos].astype(np.int64)
+
+def join_roles(pitchers, batters, index: PlayerIndex, name="名前", team="Team", number="背番",
+               on=(), how="outer", suffixes=("_P", "_B")) -> pd.DataFrame:
+    """
+    投手表と打者表を player_id（＋ on に指定した列、例: 'year'）で結合する。
+    名前・チーム・背番号の列は1組だけ残す。
+    """
+    keys = ["player_id", *on]
+    p = pitchers.assign(player_id=index.resolve(pitchers, name, team, number)).set_index(keys)
+    b = batters.assign(player_id=index.resolve(batters, name, team, number)).set_index(keys)
+    ident = [c for c in (name, team, number) if c]
+    # 片方にしかいない選手の名前等も残るように、識別列は両方からまとめて取る
+    people = pd.concat([p[ident], b[ident]])
+    people = people[~people.index.duplicated()]
+    joined = p.drop(columns=ident).join(b.drop(columns=ident), how=how, lsuffix=suffixes[0], rsuffix=suffixes[1])
+    return people.join(joined, how="right").reset_index()
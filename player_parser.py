@@ -0,0 +1,204 @@
+# player_parser.py
+# Yahoo!プロ野球 選手ページ（/npb/player/<id>/top）から
+# プロフィール欄の生テキストを取り出すパーサ。バックエンドを切り替えられる。
+#   stream     : 標準ライブラリ html.parser で1回なめるだけ（追加ライブラリ不要）
+#   lxml       : lxml + 事前コンパイル済み XPath 1本で必要な要素をまとめて取得
+#   selectolax : selectolax(lexbor) の CSS セレクタ（導入済みなら）
+#   bs4        : 従来どおり BeautifulSoup(html.parser) の select
+# どれも同じ形の dict を返す:
+#   {"name", "kana", "position", "number", "texts": [...], "titles": [...]}
+# ルビ（<rt>/<rp>）の中の文字は kana にだけ入れ、外側の name などには含めない
+# （bs4 4.13 以降の .text と同じ。版によって結果が変わらないよう全バックエンドでそろえる）
+
+from html.parser import HTMLParser
+
+LXML_OK = False
+try:
+    import lxml.html
+    from lxml import etree
+    LXML_OK = True
+except Exception:
+    pass
+
+SELECTOLAX_OK = False
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    SELECTOLAX_OK = True
+except Exception:
+    pass
+
+# .bb-profile__xxx のクラス → 返す dict のキー
+PROFILE_CLASSES = {
+    "bb-profile__position": "position",
+    "bb-profile__number": "number",
+    "bb-profile__text": "texts",
+    "bb-profile__title": "titles",
+}
+LIST_KEYS = {"texts", "titles"}
+
+# 閉じタグを持たない要素（子要素の数え方に影響する）
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+             "link", "meta", "param", "source", "track", "wbr"}
+# 中の文字を外側の項目に含めない要素
+RUBY_TAGS = {"rt", "rp"}
+
+def empty_profile() -> dict:
+    return {"name": "", "kana": "", "position": "", "number": "", "texts": [], "titles": []}
+
+def _store(profile: dict, key: str, text: str):
+    if key in LIST_KEYS:
+        profile[key].append(text)
+    elif not profile[key]:  # select_one と同じく最初の1件だけ
+        profile[key] = text
+
+# --- stream: html.parser で1パス ---
+class _ProfileScanner(HTMLParser):
+    """
+    要素の入れ子を追いながら、対象要素（h1:nth-child(4) / rt / .bb-profile__*）の
+    中のテキストだけを貯める。DOM は作らない。
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.profile = empty_profile()
+        self.child_counts = [0]   # 親要素ごとの「何番目の子要素か」カウンタ
+        self.stack = []           # 開いている要素: (tag, 取り出すキー or None)
+        self.capturing = []       # 取り出し中: [キー, テキスト断片リスト, 深さ]
+        self.rp_depth = 0         # 開いている <rp> の数（括弧は読み飛ばす）
+
+    def handle_starttag(self, tag, attrs):
+        self.child_counts[-1] += 1
+        key = None
+        if tag == "h1" and self.child_counts[-1] == 4:
+            key = "name"
+        elif tag == "rt":
+            key = "kana"
+        else:
+            for cls in (dict(attrs).get("class") or "").split():
+                if cls in PROFILE_CLASSES:
+                    key = PROFILE_CLASSES[cls]
+                    break
+        if tag in VOID_TAGS:
+            return
+        self.stack.append((tag, key))
+        self.child_counts.append(0)
+        if tag == "rp":
+            self.rp_depth += 1
+        if key:
+            self.capturing.append([key, [], len(self.stack)])
+
+    def handle_endtag(self, tag):
+        # 閉じ忘れを許容: 対応する開きタグまで巻き戻す
+        for depth in range(len(self.stack), 0, -1):
+            if self.stack[depth - 1][0] == tag:
+                break
+        else:
+            return
+        while len(self.stack) >= depth:
+            popped, _ = self.stack.pop()
+            self.child_counts.pop()
+            if popped == "rp":
+                self.rp_depth -= 1
+            if self.capturing and self.capturing[-1][2] > len(self.stack):
+                key, parts, _ = self.capturing.pop()
+                text = "".join(parts)
+                if key != "kana":  # 入れ子の取り出しにも反映（ルビは外側に含めない）
+                    for outer in self.capturing:
+                        outer[1].append(text)
+                _store(self.profile, key, text)
+
+    def handle_data(self, data):
+        if self.capturing and not self.rp_depth:
+            self.capturing[-1][1].append(data)
+
+def parse_stream(html: str) -> dict:
+    scanner = _ProfileScanner()
+    scanner.feed(html)
+    scanner.close()
+    return scanner.profile
+
+# --- lxml: 事前コンパイル済み XPath 1本 ---
+if LXML_OK:
+    _LXML_TARGETS = etree.XPath(
+        "//h1[count(preceding-sibling::*) = 3] | //rt | "
+        "//*[contains(@class, 'bb-profile__')]"
+    )
+    _LXML_TEXT = etree.XPath(".//text()[not(ancestor::rt) and not(ancestor::rp)]")
+
+def parse_lxml(html: str) -> dict:
+    profile = empty_profile()
+    try:
+        root = lxml.html.fromstring(html)
+    except etree.ParserError:  # 空・空白やコメントだけの本文（"Document is empty"）。他のバックエンドと同じく空で返す
+        return profile
+    for el in _LXML_TARGETS(root):  # 文書順で返る
+        tag = el.tag
+        if tag == "h1":
+            key = "name"
+        elif tag == "rt":
+            key = "kana"
+        else:
+            key = next((PROFILE_CLASSES[c] for c in (el.get("class") or "").split() if c in PROFILE_CLASSES), None)
+        if key:
+            _store(profile, key, el.text_content() if key == "kana" else "".join(_LXML_TEXT(el)))
+    return profile
+
+# --- selectolax ---
+def _lexbor_text(node) -> str:
+    """node.text(deep=True) から <rt>/<rp> の中の文字を除いたもの"""
+    if node.css_first("rt, rp") is None:
+        return node.text(deep=True)
+    parts = []
+    for n in node.traverse(include_text=True):
+        if n.tag != "-text":
+            continue
+        p = n.parent
+        while p.mem_id != node.mem_id and p.tag not in RUBY_TAGS:
+            p = p.parent
+        if p.mem_id == node.mem_id:
+            parts.append(n.text_content)
+    return "".join(parts)
+
+def parse_selectolax(html: str) -> dict:
+    profile = empty_profile()
+    tree = LexborHTMLParser(html)
+    for node in tree.css("h1:nth-child(4), rt, [class*='bb-profile__']"):
+        if node.tag == "h1":
+            key = "name"
+        elif node.tag == "rt":
+            key = "kana"
+        else:
+            classes = (node.attributes.get("class") or "").split()
+            key = next((PROFILE_CLASSES[c] for c in classes if c in PROFILE_CLASSES), None)
+        if key:
+            _store(profile, key, node.text(deep=True) if key == "kana" else _lexbor_text(node))
+    return profile
+
+# --- bs4: 従来の実装（比較用） ---
+def _bs4_text(el) -> str:
+    """el.text から <rt>/<rp> の中の文字を除いたもの（bs4 4.13 より前の版でも同じ結果にする）"""
+    return "".join(s for s in el.find_all(string=True) if s.find_parent(RUBY_TAGS) is None)
+
+def parse_bs4(html: str) -> dict:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    profile = empty_profile()
+    for sel, key in (("h1:nth-child(4)", "name"), ("rt", "kana"),
+                     (".bb-profile__position", "position"), (".bb-profile__number", "number")):
+        el = soup.select_one(sel)
+        if el:
+            profile[key] = el.text if key == "kana" else _bs4_text(el)
+    profile["texts"] = [_bs4_text(item) for item in soup.select(".bb-profile__text")]
+    profile["titles"] = [_bs4_text(item) for item in soup.select(".bb-profile__title")]
+    return profile
+
+BACKENDS = {"stream": parse_stream, "bs4": parse_bs4}
+if LXML_OK:
+    BACKENDS["lxml"] = parse_lxml
+if SELECTOLAX_OK:
+    BACKENDS["selectolax"] = parse_selectolax
+
+DEFAULT_BACKEND = "selectolax" if SELECTOLAX_OK else "lxml" if LXML_OK else "stream"
+
+def parse_profile(html: str, backend: str | None = None) -> dict:
+    """選手ページの HTML からプロフィール欄の生テキストを取り出す"""
+    return BACKENDS[backend or DEFAULT_BACKEND](html)
@@ -0,0 +1,152 @@
+# sabermetrics.py
+# 打者・投手の指標をまとめて計算するエンジン（npb_data / nf3_scraper 共通）。
+#  1) 列名をそろえる（打率→AVG、投球回/回数→IP など。サイトごとの表記ゆれも吸収）
+#  2) 必要な数値列を1回でまとめて数値化（"1,234" や空白も処理）
+#  3) NumPy 配列で全指標を一括計算
+# 使い方:
+#   from sabermetrics import compute_metrics
+#   df = compute_metrics(df, is_pitcher=False)   # OPS, ISO, BB%, K%, wOBA
+#   df = compute_metrics(df, is_pitcher=True)    # WHIP, K-BB, K9, 奪三振率, FIP
+
+import numpy as np
+import pandas as pd
+
+# pyarrow があれば文字列処理を Arrow のカーネルで行う（無ければ pandas の .str で代用）
+ARROW_OK = False
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    ARROW_OK = True
+except Exception:
+    pass
+
+# wOBA の係数（NPB の近年の平均的な値）と FIP 定数
+WOBA_WEIGHTS = {'BB': 0.69, 'HBP': 0.72, '1B': 0.89, '2B': 1.27, '3B': 1.62, 'HR': 2.10}
+FIP_CONSTANT = 3.10
+
+BATTER_COLUMNS = {
+    '打率': 'AVG', '出塁率': 'OBP', '長打率': 'SLG', '打席': 'PA', '打数': 'AB',
+    '安打': 'H', '二塁打': '2B', '二打': '2B', '三塁打': '3B', '三打': '3B',
+    '本塁打': 'HR', '本塁': 'HR', '四球': 'BB', '故意四': 'IBB', '故四': 'IBB',
+    '死球': 'HBP', '犠飛': 'SF', '三振': 'SO',
+}
+PITCHER_COLUMNS = {
+    '投球回': 'IP', '回数': 'IP', '奪三振': 'SO', '三振': 'SO', '与四球': 'BB', '四球': 'BB',
+    '被安打': 'H', '安打': 'H', '与死球': 'HBP', '死球': 'HBP', '被本塁打': 'HR', '本塁': 'HR',
+    '自責点': 'ER',
+}
+BATTER_NUMERIC = ['AVG', 'OBP', 'SLG', 'PA', 'AB', 'H', '2B', '3B', 'HR', 'BB', 'IBB', 'HBP', 'SF', 'SO']
+PITCHER_NUMERIC = ['SO', 'BB', 'H', 'HBP', 'HR', 'ER']
+
+NUMBER = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+INNINGS = r'^(?P<whole>\d+)?(?:[.+\s]*(?P<third>\d)/3|\.(?P<dec>\d))?$'
+
+def normalize_columns(df: pd.DataFrame, is_pitcher: bool) -> pd.DataFrame:
+    """改行・空白を除いた上で、表記ゆれのある列名を英字の略称にそろえる"""
+    df = df.copy()
+    df.columns = df.columns.astype(str).str.replace(r'\s+', '', regex=True)
+    aliases = PITCHER_COLUMNS if is_pitcher else BATTER_COLUMNS
+    rename, taken = {}, set(df.columns)
+    for col in df.columns:
+        new = aliases.get(col)
+        if new and new not in taken:  # 同じ略称に2列が当たるときは先勝ち
+            rename[col] = new
+            taken.add(new)
+    return df.rename(columns=rename)
+
+def _arrow_strings(s: pd.Series):
+    try:
+        return pa.array(s, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):  # 数値と文字列が混ざった列
+        return pa.array(s.astype(str), type=pa.string(), from_pandas=True)
+
+def _strip_commas(cols: list[pd.Series]):
+    """列をつないだ1本の文字列配列にして、カンマ・前後の空白を除く"""
+    if ARROW_OK:
+        arr = pa.chunked_array([_arrow_strings(s) for s in cols], type=pa.string())
+        return pc.utf8_trim_whitespace(pc.replace_substring(arr, ',', ''))
+    flat = pd.concat(cols, ignore_index=True).astype(str)
+    return flat.str.replace(',', '', regex=False).str.strip()
+
+def _to_float(strings) -> np.ndarray:
+    if ARROW_OK:
+        valid = pc.match_substring_regex(strings, NUMBER)
+        return pc.cast(pc.if_else(valid, strings, None), pa.float64()).to_numpy(zero_copy_only=False)
+    return pd.to_numeric(strings, errors='coerce').to_numpy(dtype=float)
+
+def clean_numeric(df: pd.DataFrame, cols) -> pd.DataFrame:
+    """
+    cols を1回の文字列処理でまとめて float にする（カンマ・空白除去、変換できない値は NaN）。
+    すでに数値型の列はそのまま。df はその場で書き換える。
+    """
+    cols = [c for c in cols if c in df.columns]
+    raw = [c for c in cols if not pd.api.types.is_numeric_dtype(df[c])]
+    if raw:
+        values = _to_float(_strip_commas([df[c] for c in raw])).reshape(len(raw), len(df))
+        for i, c in enumerate(raw):
+            df[c] = values[i]
+    for c in cols:
+        if c not in raw:
+            df[c] = df[c].astype(float)
+    return df
+
+def parse_innings(values) -> np.ndarray:
+    """
+    投球回の表記を実数のイニングに直す。
+    123.1 / "123.1" / "123 1/3" / "123+1/3" → 123.333…、"1/3" → 0.333…
+    """
+    s = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(s):
+        x = s.to_numpy(dtype=float)
+        whole = np.floor(x)
+        return whole + np.round((x - whole) * 10) / 3
+    strings = _strip_commas([s])
+    if ARROW_OK:
+        parts = pc.extract_regex(strings, INNINGS).combine_chunks()
+        whole, third, dec = (_to_float(parts.field(k)) for k in ('whole', 'third', 'dec'))
+    else:
+        parts = strings.str.extract(INNINGS)
+        whole, third, dec = (_to_float(parts[k]) for k in ('whole', 'third', 'dec'))
+    thirds = np.nan_to_num(np.where(np.isnan(third), dec, third))
+    whole = np.where(np.isnan(whole) & (thirds > 0), 0.0, whole)
+    return whole + thirds / 3
+
+def _col(df, name, default=np.nan) -> np.ndarray:
+    return df[name].to_numpy(dtype=float) if name in df.columns else np.full(len(df), default)
+
+def compute_metrics(df: pd.DataFrame, is_pitcher: bool = False, decimals: int = 3) -> pd.DataFrame:
+    """列名の正規化・数値化・指標計算を1回で行った新しい DataFrame を返す"""
+    df = normalize_columns(df, is_pitcher)
+    out = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if not is_pitcher:
+            clean_numeric(df, BATTER_NUMERIC)
+            avg, obp, slg = _col(df, 'AVG'), _col(df, 'OBP'), _col(df, 'SLG')
+            plate, so = _col(df, 'PA'), _col(df, 'SO')
+            bb, hbp = _col(df, 'BB'), _col(df, 'HBP', 0)
+            ibb, sf = _col(df, 'IBB', 0), _col(df, 'SF', 0)
+            h, b2, b3, hr, ab = _col(df, 'H'), _col(df, '2B'), _col(df, '3B'), _col(df, 'HR'), _col(df, 'AB')
+            out['OPS'] = obp + slg
+            out['ISO'] = slg - avg
+            out['BB%'] = bb / plate
+            out['K%'] = so / plate
+            w = WOBA_WEIGHTS
+            out['wOBA'] = (
+                w['BB'] * (bb - ibb) + w['HBP'] * hbp + w['1B'] * (h - b2 - b3 - hr)
+                + w['2B'] * b2 + w['3B'] * b3 + w['HR'] * hr
+            ) / (ab + bb - ibb + sf + hbp)
+        else:
+            clean_numeric(df, PITCHER_NUMERIC)
+            if 'IP' in df.columns:
+                df['IP'] = parse_innings(df['IP'])
+            ip, so, bb, h = _col(df, 'IP'), _col(df, 'SO'), _col(df, 'BB'), _col(df, 'H')
+            hbp, hr = _col(df, 'HBP', 0), _col(df, 'HR')
+            out['WHIP'] = (bb + h) / ip
+            out['K-BB'] = so - bb
+            out['K9'] = so * 9 / ip
+            out['奪三振率'] = so / ip  # 従来の列（1イニングあたり）
+            out['FIP'] = (13 * hr + 3 * (bb + hbp) - 2 * so) / ip + FIP_CONSTANT
+    for name, arr in out.items():
+        arr = np.where(np.isfinite(arr), arr, np.nan)
+        df[name] = np.round(arr, decimals)
+    return df
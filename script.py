@@ -1,6 +1,6 @@
-import requests
+import http_cache
 
 url = 'https://news.yahoo.co.jp'
-response = requests.get(url)
+response = http_cache.get(url)
 
 response.text[:500]
\ No newline at end of file
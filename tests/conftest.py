@@ -0,0 +1,8 @@
+# リポジトリ直下と PDF/ のスクリプトを import できるようにする
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, ROOT / "PDF"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,119 @@
+# http_cache.HttpCache をローカルのスタブサーバで確かめる（外部には通信しない）
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_cache import HttpCache
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+class StubHandler(BaseHTTPRequestHandler):
+    """/etag, /lm は条件付きGETに 304 を返す。/status/<n> はその status、/size/<n> は n バイト"""
+    hits = Counter()
+    conditional = []
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        self.conditional.append((self.path, self.headers.get("If-None-Match"),
+                                 self.headers.get("If-Modified-Since")))
+        if self.path == "/etag":
+            if self.headers.get("If-None-Match") == ETAG:
+                return self.reply(304)
+            return self.reply(200, b"etag body", {"ETag": ETAG})
+        if self.path == "/lm":
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                return self.reply(304)
+            return self.reply(200, b"lm body", {"Last-Modified": LAST_MODIFIED})
+        kind, _, arg = self.path.strip("/").partition("/")
+        if kind == "status":
+            return self.reply(int(arg), b"error body")
+        if kind == "size":
+            return self.reply(200, b"x" * int(arg.split("-")[0]))
+        return self.reply(200, f"body of {self.path}".encode())
+
+    def reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    StubHandler.hits = Counter()
+    StubHandler.conditional = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def cache(tmp_path):
+    return HttpCache(tmp_path / "cache", ttl_rules=[])
+
+def test_etag_revalidation_reuses_body(server, cache):
+    first = cache.get(f"{server}/etag")
+    assert (first.status_code, first.content, first.from_cache) == (200, b"etag body", False)
+    second = cache.get(f"{server}/etag")
+    assert (second.status_code, second.content, second.from_cache) == (200, b"etag body", True)
+    assert StubHandler.hits["/etag"] == 2
+    assert StubHandler.conditional[-1] == ("/etag", ETAG, None)
+
+def test_last_modified_revalidation_reuses_body(server, cache):
+    cache.get(f"{server}/lm")
+    res = cache.get(f"{server}/lm")
+    assert (res.status_code, res.text, res.from_cache) == (200, "lm body", True)
+    assert StubHandler.conditional[-1] == ("/lm", None, LAST_MODIFIED)
+
+def test_within_ttl_no_request(server, tmp_path):
+    cache = HttpCache(tmp_path / "cache", ttl_rules=[(r"/page$", 60)])
+    assert cache.ttl_for(f"{server}/page") == 60
+    cache.get(f"{server}/page")
+    res = cache.get(f"{server}/page")
+    assert res.from_cache and res.text == "body of /page"
+    assert StubHandler.hits["/page"] == 1
+
+def test_ttl_expiry_revalidates(server, cache):
+    cache.get(f"{server}/etag", ttl=0.2)
+    assert cache.get(f"{server}/etag", ttl=0.2).from_cache
+    assert StubHandler.hits["/etag"] == 1
+    time.sleep(0.3)
+    res = cache.get(f"{server}/etag", ttl=0.2)
+    assert res.from_cache and res.content == b"etag body"  # 期限切れ → 条件付きGET → 304
+    assert StubHandler.hits["/etag"] == 2
+    assert StubHandler.conditional[-1][1] == ETAG
+
+def test_lru_eviction_past_size_cap(server, tmp_path):
+    cache = HttpCache(tmp_path / "cache", max_bytes=250, ttl_rules=[])
+    a, b, c = (f"{server}/size/100-{name}" for name in "abc")
+    cache.get(a, ttl=60)
+    time.sleep(0.01)
+    cache.get(b, ttl=60)
+    time.sleep(0.01)
+    assert cache.get(a, ttl=60).from_cache  # a を使い直したので一番古いのは b
+    time.sleep(0.01)
+    cache.get(c, ttl=60)
+    assert cache.stats() == (2, 200)
+    assert cache.get(a, ttl=60).from_cache
+    assert cache.get(c, ttl=60).from_cache
+    assert not cache.get(b, ttl=60).from_cache  # 追い出されたので取り直す
+    assert StubHandler.hits["/size/100-b"] == 2
+
+@pytest.mark.parametrize("status", [404, 500])
+def test_non_200_not_stored(server, cache, status):
+    url = f"{server}/status/{status}"
+    res = cache.get(url, ttl=60)
+    assert res.status_code == status and not res.ok and not res.from_cache
+    assert cache.stats() == (0, 0)
+    cache.get(url, ttl=60)
+    assert StubHandler.hits[f"/status/{status}"] == 2
@@ -0,0 +1,111 @@
+# split_every_50_pages で分割 → pdf_stream_writer.merge_dedup で結合し直す往復を、
+# ページ同士がリンク注釈で参照し合うPDFで確かめる
+import sys
+from pathlib import Path
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, NameObject, NumberObject
+
+import split_every_50_pages as splitter
+from pdf_stream_writer import merge_dedup
+
+PAGES = 120
+
+def make_linked_pdf(path: Path, n: int = PAGES):
+    """各ページに「次のページ」「半分先のページ」へのリンク注釈を付けたPDF"""
+    w = PdfWriter()
+    for _ in range(n):
+        w.add_blank_page(200, 200)
+    for i, page in enumerate(w.pages):
+        annots = ArrayObject()
+        for target in ((i + 1) % n, (i + n // 2) % n):
+            annots.append(w._add_object(DictionaryObject({
+                NameObject("/Type"): NameObject("/Annot"),
+                NameObject("/Subtype"): NameObject("/Link"),
+                NameObject("/Rect"): ArrayObject([NumberObject(0), NumberObject(0), NumberObject(10), NumberObject(10)]),
+                NameObject("/Dest"): ArrayObject([w.pages[target].indirect_reference, NameObject("/Fit")]),
+            })))
+        page[NameObject("/Annots")] = annots
+    with open(path, "wb") as f:
+        w.write(f)
+    return path
+
+def page_objects(reader: PdfReader) -> list:
+    """ページツリーに入っているかに関係なく、ファイル中の /Type /Page をすべて返す"""
+    found = []
+    for num in range(1, int(reader.trailer["/Size"])):
+        obj = reader.get_object(num)
+        if isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page":
+            found.append(obj)
+    return found
+
+def link(page, k: int) -> tuple[int, int]:
+    """k 番目の注釈の (飛び先ページの番号, /P の番号)"""
+    annot = page["/Annots"][k].get_object()
+    return annot.raw_get("/Dest")[0].idnum, annot.raw_get("/P").idnum
+
+def test_split_parts_only_contain_their_pages(tmp_path):
+    src = make_linked_pdf(tmp_path / "src.pdf")
+    result = splitter.split_pdf(src, chunk=50, delete_original=False)
+    parts = [Path(p) for p in result["parts"]]
+    assert [p.name for p in parts] == ["src-1-50.pdf", "src-51-100.pdf", "src-101-120.pdf"]
+    for path, n in zip(parts, [50, 50, 20]):
+        part = PdfReader(path)
+        assert len(part.pages) == n
+        assert len(page_objects(part)) == n  # リンク先の他のパートのページは入らない
+        # ページ n・残したリンク n-1（次のページへのもの。最後のページと半分先へのリンクはパートの外）
+        # ・/Pages・/Catalog・/Info
+        assert int(part.trailer["/Size"]) - 1 == n + (n - 1) + 3
+        for k in range(n - 1):
+            page = part.pages[k]
+            assert len(page["/Annots"]) == 1
+            assert link(page, 0) == (part.pages[k + 1].indirect_reference.idnum, page.indirect_reference.idnum)
+        assert "/Annots" not in part.pages[n - 1]
+
+def stack_depth() -> int:
+    frame, depth = sys._getframe(), 0
+    while frame:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+def test_merge_unpruned_part_has_no_recursion_limit(tmp_path):
+    # 従来の PdfWriter でページを写すと、リンク先のページが芋づる式に入ったパートになる
+    # （pypdf 自身も再帰で写すので、ページ数は pypdf が写せる程度にしておく）
+    src = PdfReader(make_linked_pdf(tmp_path / "src.pdf", 60))
+    part = PdfWriter()
+    for i in range(40, 60):
+        part.add_page(src.pages[i])
+    with open(tmp_path / "part.pdf", "wb") as f:
+        part.write(f)
+    assert len(page_objects(PdfReader(tmp_path / "part.pdf"))) > 20
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(stack_depth() + 200)  # 再帰で辿ると連なったページの数だけ深くなる
+    try:
+        stats = merge_dedup([tmp_path / "part.pdf"], tmp_path / "merged.pdf")
+    finally:
+        sys.setrecursionlimit(limit)
+    assert stats["pages"] == 20
+    merged = PdfReader(tmp_path / "merged.pdf")
+    assert len(merged.pages) == 20
+    assert len(page_objects(merged)) == 20  # パート外のページは書かない
+    # パート外へのリンク（最後のページの「次」と、全ページの「半分先」）は null になる
+    for k, page in enumerate(merged.pages):
+        targets = [getattr(a.get_object().raw_get("/Dest")[0], "idnum", None) for a in page["/Annots"]]
+        following = merged.pages[k + 1].indirect_reference.idnum if k < 19 else None
+        assert targets == [following, None]
+
+def test_split_merge_round_trip(tmp_path):
+    src = make_linked_pdf(tmp_path / "src.pdf")
+    parts = [Path(p) for p in splitter.split_pdf(src, chunk=50, delete_original=False)["parts"]]
+    stats = merge_dedup(parts, tmp_path / "merged.pdf")
+    assert stats["pages"] == PAGES
+    merged = PdfReader(tmp_path / "merged.pdf")
+    assert len(merged.pages) == PAGES
+    pages = page_objects(merged)
+    assert len(pages) == PAGES  # ページツリーの外に /Page が残っていない
+    root = merged.trailer["/Root"].raw_get("/Pages").idnum
+    assert all(p.raw_get("/Parent").idnum == root for p in pages)
+    # 同じパート内のリンクは結合後も正しいページを指す
+    for k in (0, 48, 50, 100, 118):
+        page = merged.pages[k]
+        assert link(page, 0) == (merged.pages[k + 1].indirect_reference.idnum, page.indirect_reference.idnum)
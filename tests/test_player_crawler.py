@@ -0,0 +1,171 @@
+# 12球団選手情報 の並列クローラ（crawl / fetch_with_retry / TokenBucket）をローカルのスタブサーバで確かめる
+import importlib
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import http_cache
+
+crawler = importlib.import_module("12球団選手情報")
+
+PAGE = (Path(__file__).resolve().parent.parent / "fixtures" / "yahoo_player" / "1000001.html").read_text(encoding="utf-8")
+PLAYER_PATH = re.compile(r"^/npb/player/(\d+)/top$")
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    /npb/player/<id>/top に選手ページを返す。
+    plans[id] の status を順に返してから 200、missing の ID は 404、blank の ID は本文が空の 200、
+    delays[id] 秒だけ遅らせる
+    """
+    plans = {}
+    missing = set()
+    blank = set()
+    delays = {}
+    requests = defaultdict(list)  # id → 受けた時刻
+
+    def do_GET(self):
+        m = PLAYER_PATH.match(self.path)
+        if not m:
+            return self.reply(404, b"")
+        pid = int(m.group(1))
+        self.requests[pid].append(time.monotonic())
+        time.sleep(self.delays.get(pid, 0))
+        if self.plans.get(pid):
+            return self.reply(self.plans[pid].pop(0), b"busy")
+        if pid in self.missing:
+            return self.reply(404, b"not found")
+        if pid in self.blank:
+            return self.reply(200, b"  \n")
+        self.reply(200, PAGE.replace("山田 太郎", f"選手{pid}").encode("utf-8"))
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    StubHandler.plans, StubHandler.missing, StubHandler.blank, StubHandler.delays = {}, set(), set(), {}
+    StubHandler.requests = defaultdict(list)
+    # キャッシュは一時フォルダに。待ち時間はテスト用に短く
+    monkeypatch.setattr(http_cache, "_default_cache", http_cache.HttpCache(tmp_path / "cache", ttl_rules=[]))
+    monkeypatch.setattr(crawler, "BACKOFF_BASE", 0.05)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_crawl_yields_in_id_order(server):
+    ids = list(range(100, 120))
+    # 若い ID ほど遅く返して、完了順を ID 順と逆にする
+    StubHandler.delays = {pid: (120 - pid) * 0.01 for pid in ids}
+    StubHandler.missing = {105}
+    results = list(crawler.crawl(ids, workers=8, rate=1000, base_url=server))
+    assert [pid for pid, _ in results] == ids
+    for pid, row in results:
+        if pid == 105:
+            assert row is None
+        else:
+            assert row[0] == pid and row[1] == f"選手{pid}"
+
+@pytest.mark.parametrize("parser", ["stream", "lxml", "bs4"])
+def test_blank_page_does_not_stop_crawl(server, monkeypatch, parser):
+    monkeypatch.setattr(crawler, "PARSER_BACKEND", parser)
+    StubHandler.blank = {3}
+    results = dict(crawler.crawl([1, 2, 3, 4], workers=2, rate=1000, base_url=server))
+    assert results[3] is None or not results[3][1]  # 名前が無いので保存されない
+    assert [results[pid][1] for pid in (1, 2, 4)] == ["選手1", "選手2", "選手4"]
+
+def test_retry_on_429_and_5xx_with_backoff(server):
+    StubHandler.plans = {1: [429, 429], 2: [503]}
+    results = dict(crawler.crawl([1, 2], workers=2, rate=1000, base_url=server))
+    assert results[1][1] == "選手1" and results[2][1] == "選手2"
+    assert len(StubHandler.requests[1]) == 3
+    assert len(StubHandler.requests[2]) == 2
+    t = StubHandler.requests[1]
+    # 待ち時間は BACKOFF_BASE * 2**n 以上
+    assert t[1] - t[0] >= 0.05
+    assert t[2] - t[1] >= 0.1
+
+def test_retry_gives_up(server):
+    StubHandler.plans = {7: [500] * 10}
+    assert list(crawler.crawl([7], workers=1, rate=1000, base_url=server)) == [(7, None)]
+    assert len(StubHandler.requests[7]) == crawler.MAX_RETRIES + 1
+
+def test_crawl_respects_rate_limit(server, monkeypatch):
+    monkeypatch.setattr(crawler, "BURST", 1)
+    ids = list(range(1, 12))
+    list(crawler.crawl(ids, workers=8, rate=20, base_url=server))
+    times = sorted(t for pid in ids for t in StubHandler.requests[pid])
+    # 最初の1件はバケットの分。残り10件は毎秒20件 → 0.5 秒以上かかる
+    assert times[-1] - times[0] >= 0.45
+
+def test_token_bucket_burst_then_rate():
+    bucket = crawler.TokenBucket(rate=10, capacity=2)
+    t0 = time.monotonic()
+    for _ in range(2):
+        bucket.acquire()
+    assert time.monotonic() - t0 < 0.05  # 容量ぶんは待たない
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - t0 >= 0.28
+
+def test_rate_limit_is_per_host():
+    limiter = crawler.HostRateLimiter(rate=5, capacity=1)
+    t0 = time.monotonic()
+    limiter.acquire("http://a.example/1")
+    limiter.acquire("http://b.example/1")  # 別ホストは別のバケット
+    assert time.monotonic() - t0 < 0.05
+    limiter.acquire("http://a.example/2")  # 同じホストは補充を待つ
+    assert time.monotonic() - t0 >= 0.18
+
+def crawl_until(stop):
+    """crawl の代わり: stop の ID に来たら落ちる（通信しない）"""
+    def fake_crawl(ids, *args):
+        for pid in ids:
+            if pid == stop:
+                raise KeyboardInterrupt
+            yield pid, [pid, f"選手{pid}"] + [""] * 16
+    return fake_crawl
+
+def test_resume_ignores_previous_runs_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # チェックポイントはカレントに作られる
+    ids = range(0, 100)
+    monkeypatch.setattr(crawler, "crawl", crawl_until(50))  # 1回目: 50 まで進んで落ちる
+    with pytest.raises(KeyboardInterrupt):
+        crawler.run_sweep(ids, output="players.csv", checkpoint_every=10)
+    monkeypatch.setattr(crawler, "crawl", crawl_until(15))  # 2回目（最初から）: 最初のチェックポイント前に落ちる
+    with pytest.raises(KeyboardInterrupt):
+        crawler.run_sweep(ids, output="players.csv", checkpoint_every=20)
+    monkeypatch.setattr(crawler, "crawl", crawl_until(None))
+    crawler.run_sweep(ids, output="players.csv", resume=True)
+    data = (tmp_path / "players.csv").read_bytes()
+    assert b"\0" not in data
+    rows = data.decode("utf-8").splitlines()[1:]
+    assert [int(r.split(",")[0]) for r in rows] == list(ids)
+
+def test_resume_refuses_other_output_or_short_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawler, "crawl", crawl_until(None))
+    crawler.run_sweep(range(0, 30), output="players.csv", checkpoint_every=10)
+    (tmp_path / "other.csv").write_text("keep me", encoding="utf-8")
+    with pytest.raises(ValueError):
+        crawler.run_sweep(range(0, 30), output="other.csv", resume=True)
+    assert (tmp_path / "other.csv").read_text(encoding="utf-8") == "keep me"
+    (tmp_path / "players.csv").write_text("x", encoding="utf-8")  # チェックポイントより短い
+    with pytest.raises(ValueError):
+        crawler.run_sweep(range(0, 30), output="players.csv", resume=True)
+    with pytest.raises(ValueError):
+        crawler.run_sweep(range(0, 40), output="players.csv", resume=True)  # 別の ID 一覧
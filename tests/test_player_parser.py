@@ -0,0 +1,48 @@
+# player_parser の各バックエンドが保存済みの選手ページから同じ結果を返すか
+from pathlib import Path
+
+import pytest
+
+from player_parser import BACKENDS, empty_profile, parse_bs4
+
+FIXTURES = sorted((Path(__file__).resolve().parent.parent / "fixtures" / "yahoo_player").glob("*.html"))
+ALL_BACKENDS = ["stream", "lxml", "selectolax", "bs4"]
+
+def backend(name):
+    if name not in BACKENDS:
+        pytest.skip(f"{name} が導入されていません")
+    return BACKENDS[name]
+
+def test_fixtures_exist():
+    assert len(FIXTURES) >= 2
+
+@pytest.mark.parametrize("name", ALL_BACKENDS)
+@pytest.mark.parametrize("page", FIXTURES, ids=lambda p: p.name)
+def test_backends_match_bs4(name, page):
+    html = page.read_text(encoding="utf-8")
+    assert backend(name)(html) == parse_bs4(html)
+
+@pytest.mark.parametrize("name", ALL_BACKENDS)
+def test_profile_fields(name):
+    html = (FIXTURES[0]).read_text(encoding="utf-8")
+    profile = backend(name)(html)
+    assert profile["name"] == "山田 太郎"  # ヘッダの h1 ではなく4番目の子の h1。ルビは含めない
+    assert profile["kana"] == "（やまだ・たろう）"
+    assert profile["position"] == "投手"
+    assert profile["number"] == "18"
+    assert len(profile["titles"]) == len(profile["texts"]) == 10
+    assert profile["texts"][5] == "右投左打"
+    assert profile["texts"][8] == "架空高（甲） - 架空大 - 東京(2018 - )"  # <br> をまたぐ
+    assert profile["texts"][9] == "最多勝（2022）& 新人王"  # 子要素と文字参照
+
+@pytest.mark.parametrize("name", ALL_BACKENDS)
+def test_ruby_parentheses_are_skipped(name):
+    html = '<div><p>a</p><p>b</p><img><h1><ruby>山田<rp>(</rp><rt>やまだ</rt><rp>)</rp></ruby> 太郎</h1></div>'
+    profile = backend(name)(html)
+    assert (profile["name"], profile["kana"]) == ("山田 太郎", "やまだ")
+
+@pytest.mark.parametrize("name", ALL_BACKENDS)
+@pytest.mark.parametrize("html", ["", "  \n\t", "<!-- empty -->"], ids=["empty", "blank", "comment"])
+def test_empty_body(name, html):
+    # 200 で本文が空のページ: 例外にせず空のプロフィールを返す
+    assert backend(name)(html) == empty_profile()